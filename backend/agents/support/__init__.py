@@ -2,6 +2,7 @@
 Support Agent Package
 Kundenservice Agent
 """
-from .agent import get_response
+from .agent import get_response, warm_up
+from .faq_index import invalidate_faq_cache
 
-__all__ = ["get_response"]
+__all__ = ["get_response", "warm_up", "invalidate_faq_cache"]
@@ -4,38 +4,44 @@ BörsennewsApp Support Agent mit FAQ-basierter Antwortgenerierung
 """
 from __future__ import annotations
 
-import numpy as np
-from shared.database import get_supabase
 from shared.llm_client import (
     create_embedding,
     chat_completion_with_usage,
     parse_json_response
 )
 from shared.debug_tracker import DebugTracker
+from shared.profiling import should_profile
+from shared.tracing import current_span, traced
 from shared.request_logger import log_request
 from shared.chat_memory import build_context_messages
+from shared.text_chunking import estimate_tokens
 from .prompts import SYSTEM_PROMPT
+from .faq_index import load_faq_index, load_passage_index
 from .config import (
-    FAQ_TABLE,
     FAQ_SIMILARITY_THRESHOLD,
     FAQ_RESULT_LIMIT,
+    FAQ_CONTEXT_MODE,
+    FAQ_PASSAGE_CANDIDATES,
+    FAQ_CONTEXT_TOKEN_BUDGET,
     LLM_MODEL,
     LLM_MAX_TOKENS,
     LLM_TEMPERATURE,
 )
 
 
-def cosine_similarity(vec1: list, vec2: list) -> float:
-    """Berechnet Kosinus-Ähnlichkeit zwischen zwei Vektoren"""
-    a = np.array(vec1)
-    b = np.array(vec2)
-    norm_a = np.linalg.norm(a)
-    norm_b = np.linalg.norm(b)
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return float(np.dot(a, b) / (norm_a * norm_b))
+def warm_up(questions: list[str] | None = None) -> dict:
+    """Lädt die FAQs vorab und berechnet Embeddings für häufige Fragen"""
+    faq_index = load_faq_index()
+    stats = {"faqs": len(faq_index.docs)}
+    if FAQ_CONTEXT_MODE == "passages":
+        stats["passages"] = len(load_passage_index().docs)
+    for question in questions or []:
+        create_embedding(question)
+    stats["pre_embedded"] = len(questions or [])
+    return stats
 
 
+@traced("support.search_faqs")
 def search_faqs(question: str, tracker: DebugTracker | None = None) -> list:
     """
     Semantic Search für ähnliche FAQs
@@ -43,53 +49,104 @@ def search_faqs(question: str, tracker: DebugTracker | None = None) -> list:
     step = tracker.start_step("faq_search") if tracker else None
 
     try:
-        supabase = get_supabase()
-
         # 1. Embedding für die Frage erstellen
         query_embedding = create_embedding(question)
 
-        # 2. Alle Dokumente mit Embeddings laden
-        result = supabase.table(FAQ_TABLE).select(
-            "id, question, answer, source_url, embedding"
-        ).execute()
+        # 2. FAQ-Index laden (gecacht)
+        faq_index = load_faq_index()
 
-        if not result.data:
+        if not faq_index.docs:
             if step:
                 step.stop({"matches": 0, "error": "Keine FAQs in Datenbank"})
             return []
 
-        # 3. Similarity berechnen und filtern
-        scored_docs = []
-        for doc in result.data:
-            if doc.get("embedding"):
-                try:
-                    if isinstance(doc["embedding"], str):
-                        emb_str = doc["embedding"].strip("[]")
-                        doc_embedding = [float(x) for x in emb_str.split(",")]
-                    else:
-                        doc_embedding = doc["embedding"]
-
-                    similarity = cosine_similarity(query_embedding, doc_embedding)
-                    if similarity >= FAQ_SIMILARITY_THRESHOLD:
-                        scored_docs.append({
-                            "id": doc["id"],
-                            "question": doc["question"],
-                            "answer": doc["answer"],
-                            "source_url": doc.get("source_url"),
-                            "similarity": round(similarity, 4)
-                        })
-                except (ValueError, TypeError):
-                    continue
-
-        # 4. Nach Similarity sortieren und limitieren
-        scored_docs.sort(key=lambda x: x["similarity"], reverse=True)
-        results = scored_docs[:FAQ_RESULT_LIMIT]
+        # 3. Vektorisierte Suche: Top-k über dem Threshold
+        search = faq_index.search(query_embedding, FAQ_RESULT_LIMIT, FAQ_SIMILARITY_THRESHOLD)
+        results = [
+            {**faq_index.docs[row], "similarity": round(score, 4)}
+            for row, score in search.hits
+        ]
+
+        if step:
+            step.stop({
+                "total_faqs": len(faq_index.docs),
+                "matches_above_threshold": search.above_threshold,
+                "returned": len(results),
+                "top_score": results[0]["similarity"] if results else 0,
+                "threshold": FAQ_SIMILARITY_THRESHOLD
+            })
+
+        return results
+
+    except Exception as e:
+        if step:
+            step.stop({"error": str(e), "matches": 0})
+        return []
+
+
+def select_passages(hits: list[dict], token_budget: int, max_faqs: int) -> list[dict]:
+    """
+    Wählt die besten Passagen unter einem Token-Budget und gruppiert sie nach Eltern-FAQ.
+    Die beste Passage wird immer genommen, auch wenn sie allein über dem Budget liegt.
+    """
+    faqs: dict[int, dict] = {}
+    used = 0
+    for hit in hits:
+        cost = estimate_tokens(hit["content"])
+        if faqs and used + cost > token_budget:
+            continue
+        faq = faqs.get(hit["id"])
+        if faq is None:
+            if len(faqs) >= max_faqs:
+                continue
+            faq = faqs[hit["id"]] = {
+                "id": hit["id"],
+                "question": hit["question"],
+                "source_url": hit.get("source_url"),
+                "similarity": hit["similarity"],
+                "passages": [],
+            }
+        faq["passages"].append(hit["content"])
+        used += cost
+
+    return [
+        {**faq, "answer": "\n[...]\n".join(faq["passages"]), "passages": len(faq["passages"])}
+        for faq in faqs.values()
+    ]
+
+
+@traced("support.search_passages")
+def search_passages(question: str, tracker: DebugTracker | None = None) -> list:
+    """
+    Semantic Search über die Passagen der FAQ-Antworten.
+    Ohne Passage-Index (noch nicht ingested) wird auf search_faqs zurückgefallen.
+    """
+    try:
+        passage_index = load_passage_index()
+    except Exception:
+        passage_index = None
+    if passage_index is None or not passage_index.docs:
+        return search_faqs(question, tracker)
+
+    step = tracker.start_step("faq_search") if tracker else None
+
+    try:
+        query_embedding = create_embedding(question)
+        search = passage_index.search(query_embedding, FAQ_PASSAGE_CANDIDATES, FAQ_SIMILARITY_THRESHOLD)
+        hits = [
+            {**passage_index.docs[row], "similarity": round(score, 4)}
+            for row, score in search.hits
+        ]
+        results = select_passages(hits, FAQ_CONTEXT_TOKEN_BUDGET, FAQ_RESULT_LIMIT)
 
         if step:
             step.stop({
-                "total_faqs": len(result.data),
-                "matches_above_threshold": len(scored_docs),
+                "total_passages": len(passage_index.docs),
+                "matches_above_threshold": search.above_threshold,
                 "returned": len(results),
+                "passages": sum(faq["passages"] for faq in results),
+                "context_tokens": sum(estimate_tokens(faq["answer"]) for faq in results),
+                "token_budget": FAQ_CONTEXT_TOKEN_BUDGET,
                 "top_score": results[0]["similarity"] if results else 0,
                 "threshold": FAQ_SIMILARITY_THRESHOLD
             })
@@ -111,17 +168,20 @@ def format_faq_context(faqs: list) -> str:
     for i, faq in enumerate(faqs, 1):
         context += f"--- FAQ {i} (Relevanz: {faq['similarity']:.0%}) ---\n"
         context += f"Frage: {faq['question']}\n"
-        context += f"Antwort: {faq['answer']}\n"
+        label = "Antwort (Auszug)" if faq.get("passages") else "Antwort"
+        context += f"{label}: {faq['answer']}\n"
         if faq.get('source_url'):
             context += f"Quelle: {faq['source_url']}\n"
         context += "\n"
     return context
 
 
+@traced("support.get_response")
 async def get_response(
     user_question: str,
     chat_history: list[dict] | None = None,
-    debug: bool = False
+    debug: bool = False,
+    profile: bool = False
 ) -> dict:
     """
     Hauptfunktion des Support Agents
@@ -131,10 +191,18 @@ async def get_response(
     3. JSON Response parsen und zurückgeben
     """
     tracker = DebugTracker(agent="support")
+    current_span().set_attribute("request_id", tracker.request_id)
+    if debug:
+        tracker.force_capture()
+    if should_profile(profile):
+        tracker.start_profiling()
 
     try:
         # 1. Relevante FAQs finden
-        faqs = search_faqs(user_question, tracker)
+        if FAQ_CONTEXT_MODE == "passages":
+            faqs = search_passages(user_question, tracker)
+        else:
+            faqs = search_faqs(user_question, tracker)
         faq_context = format_faq_context(faqs)
 
         # Grounding: FAQ-Matches tracken
@@ -176,7 +244,8 @@ async def get_response(
             response=llm_response.content,
             input_tokens=llm_response.input_tokens,
             output_tokens=llm_response.output_tokens,
-            response_time_ms=llm_response.response_time_ms
+            response_time_ms=llm_response.response_time_ms,
+            context=faq_context
         )
 
         # 4. JSON parsen
@@ -188,16 +257,22 @@ async def get_response(
             "escalate": result.get("escalate", False)
         }
 
+        if response["escalate"]:
+            tracker.force_capture()
+        debug_info = tracker.finish()
+
         if debug:
-            response["debug_info"] = tracker.to_dict()
+            response["debug_info"] = debug_info
 
         # Request loggen für Monitoring
-        await log_request(tracker, user_question, response.get("response"))
+        await log_request(tracker, user_question, response.get("response"), response["escalate"])
 
         return response
 
     except Exception as e:
         tracker.add_data("error", str(e))
+        tracker.force_capture()
+        debug_info = tracker.finish()
 
         response = {
             "response": "Es tut mir leid, es ist ein technischer Fehler aufgetreten. "
@@ -211,12 +286,16 @@ async def get_response(
         }
 
         if debug:
-            response["debug_info"] = tracker.to_dict()
+            response["debug_info"] = debug_info
 
-        await log_request(tracker, user_question, response.get("response"))
+        await log_request(tracker, user_question, response.get("response"), response["escalate"])
 
         return response
 
+    finally:
+        # Auch bei CancelledError/BaseException: Sampler-Thread und tracemalloc freigeben
+        tracker.stop_profiling()
+
 
 # Für direktes Testen
 if __name__ == "__main__":
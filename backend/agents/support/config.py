@@ -1,11 +1,37 @@
 """
 Support Agent - Konfiguration
 """
+from shared.config import FAQ_TABLE  # per Umgebungsvariable FAQ_TABLE, Default "documents"
 
 # FAQ Search
-FAQ_TABLE = "documents"
 FAQ_SIMILARITY_THRESHOLD = 0.5
 FAQ_RESULT_LIMIT = 3
+FAQ_CACHE_TTL_SECONDS = 300
+# Anteil geänderter Zeilen seit dem letzten Neubau, ab dem der Index komplett neu gebaut
+# statt per add/delete aktualisiert wird (nur IVF, siehe faq_index.apply_changes)
+FAQ_REBUILD_FRACTION = 0.2
+
+# FAQ-Kontext im Prompt: "faq" (ganze Antworten) oder "passages" (nur die passendsten Absätze).
+# Passagen werden von ingest_faqs.py erzeugt, ohne Passagen wird auf ganze FAQs zurückgefallen.
+FAQ_CONTEXT_MODE = "faq"
+FAQ_PASSAGE_TABLE = "faq_passages"
+FAQ_PASSAGE_CANDIDATES = 12
+FAQ_CONTEXT_TOKEN_BUDGET = 600
+
+# FAQ Embedding Index: "float32" (exakt, am schnellsten), "float16" oder "int8"
+# (kompakter Scan, exakt nachbewertet aus einer memmap - lohnt sich erst bei großen Indizes)
+FAQ_EMBEDDING_PRECISION = "float32"
+FAQ_RESCORE_FACTOR = 4
+
+# Zweistufige Suche: Grob-Scan über die ersten N Dimensionen, dann volle Dimension.
+# None = Scan über alle 1536 Dimensionen. Lohnt sich ab ~50k Vektoren (z.B. 256, Rescore-Faktor 10),
+# aber nur bei kürzbaren Embeddings (text-embedding-3) - Recall vorher mit echten Daten prüfen.
+FAQ_COARSE_DIM = None
+
+# Index-Typ: "flat" (exakter bzw. quantisierter Scan) oder "ivf" (approximativ, für >100k Vektoren)
+FAQ_INDEX_TYPE = "flat"
+# Synthetisch bei 50k Vektoren (python -m shared.ann_index): recall@3 0.85 mit 8, 0.96 mit 16
+FAQ_IVF_NPROBE = 8
 
 # LLM Settings
 LLM_MODEL = "gpt-4o"
@@ -0,0 +1,445 @@
+"""
+Support Agent - FAQ Index
+Lädt die FAQs einmal aus der Datenbank und hält die Embeddings als kompakte Matrix.
+Daneben gibt es einen Passage-Index über die Absätze der Antworten (siehe ingest_faqs.py).
+
+Nach dem ersten Laden wird nur noch im Hintergrund aktualisiert: ändert sich der
+Fingerprint, werden die Revisionen aller Zeilen verglichen und nur geänderte Zeilen
+nachgeladen (IVF: add/delete, sonst Neubau). Bis dahin wird der alte Index verwendet.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING
+
+from shared.config import settings
+from shared.database import execute_query, use_primary
+from shared.logger import agent_logger
+from .config import (
+    FAQ_TABLE,
+    FAQ_PASSAGE_TABLE,
+    FAQ_CACHE_TTL_SECONDS,
+    FAQ_REBUILD_FRACTION,
+    FAQ_EMBEDDING_PRECISION,
+    FAQ_RESCORE_FACTOR,
+    FAQ_COARSE_DIM,
+    FAQ_INDEX_TYPE,
+    FAQ_IVF_NPROBE,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+    from shared.ann_index import IVFIndex
+    from shared.vector_index import VectorIndex, SearchResult
+    from shared.vector_snapshot import VectorSnapshotStore
+
+# Metadaten-Felder im Snapshot (neben der id). `revision` ändert sich mit der Zeile,
+# gelöschte bzw. ersetzte Zeilen bleiben bis zum nächsten Neubau mit revision None stehen.
+FAQ_FIELDS = ["question", "answer", "source_url", "revision"]
+# Passagen: id ist die id der Eltern-FAQ, revision gilt für alle Passagen einer FAQ
+PASSAGE_FIELDS = ["question", "content", "source_url", "revision"]
+
+# Revision einer FAQ-Zeile (ändert sich mit Inhalt, Quelle und jedem neuen Embedding)
+FAQ_REVISION = "md5(concat_ws('|', question, answer, source_url, embedding_model, embedded_at::text))"
+
+
+@dataclass
+class FaqIndex:
+    """
+    FAQ-Metadaten und Embedding-Index (Zeile i in `docs` <-> Vektor i im Index).
+    `docs` ist eine Liste oder - bei Snapshots - ein lazy SnapshotRecords.
+    """
+    docs: list[dict] = field(default_factory=list)
+    index: VectorIndex | IVFIndex | None = None
+    loaded_at: float = 0.0
+    version: str | None = None
+    fingerprint: str | None = None
+
+    def search(self, query_embedding, k: int, threshold: float) -> SearchResult:
+        from shared.vector_index import SearchResult
+
+        if self.index is None:
+            return SearchResult()
+        return self.index.search(query_embedding, k, threshold)
+
+
+def parse_embedding(row: dict) -> np.ndarray | None:
+    """
+    Embedding einer DB-Zeile als float32 Array.
+    Bevorzugt `embedding_bin` (BYTEA, ohne Kopie dekodiert), sonst das alte Textformat.
+    """
+    from shared.config import EMBEDDING_MODEL
+    from shared.database import decode_embedding
+
+    vector, model = decode_embedding(row.get("embedding_bin"))
+    if vector is None:
+        vector, model = decode_embedding(row.get("embedding"))
+    if vector is None or (model and model != EMBEDDING_MODEL):
+        return None
+    return vector
+
+
+def _parse_rows(rows: list[dict], fields: list[str], dim: int | None = None) -> tuple[list[dict], list]:
+    """(docs, Vektoren) der Zeilen mit gültigem Embedding derselben Dimension"""
+    docs = []
+    vectors = []
+    for row in rows:
+        embedding = parse_embedding(row)
+        if embedding is None:
+            continue
+        if dim is None:
+            dim = embedding.shape[0]
+        if embedding.shape != (dim,):
+            continue
+        vectors.append(embedding)
+        docs.append({"id": row["id"], **{name: row.get(name) for name in fields}})
+    return docs, vectors
+
+
+def build_index(rows: list[dict], fields: list[str]) -> FaqIndex:
+    """Baut den Index aus DB-Zeilen (id, `fields`, embedding_bin/embedding)"""
+    import numpy as np
+    from shared.vector_index import VectorIndex
+
+    docs, vectors = _parse_rows(rows, fields)
+
+    index = None
+    if vectors and FAQ_INDEX_TYPE == "ivf":
+        from shared.ann_index import IVFIndex
+
+        index = IVFIndex.build(np.arange(len(vectors)), np.vstack(vectors), nprobe=FAQ_IVF_NPROBE)
+    elif vectors:
+        index = VectorIndex(
+            np.vstack(vectors),
+            precision=FAQ_EMBEDDING_PRECISION,
+            rescore_factor=FAQ_RESCORE_FACTOR,
+            coarse_dim=FAQ_COARSE_DIM
+        )
+    return FaqIndex(docs=docs, index=index, loaded_at=time.monotonic())
+
+
+def apply_changes(
+    current: FaqIndex,
+    revisions: dict[int, str],
+    fetch_rows,
+    fields: list[str]
+) -> FaqIndex | None:
+    """
+    Aktualisiert eine Kopie von `current` anhand der Revisionen aus der DB: geänderte
+    und gelöschte Zeilen werden aus dem Index entfernt, geänderte und neue nachgeladen
+    und hinzugefügt. None wenn neu gebaut werden muss (kein IVF-Index oder zu viele
+    Änderungen seit dem letzten Neubau).
+    """
+    import numpy as np
+    from shared.ann_index import IVFIndex
+
+    index = current.index
+    if not isinstance(index, IVFIndex):
+        return None
+
+    # Positionen und Revisionen der lebenden Zeilen
+    positions: dict[int, list[int]] = {}
+    known: dict[int, str] = {}
+    for row, doc in enumerate(current.docs):
+        if doc.get("revision") is not None:
+            positions.setdefault(doc["id"], []).append(row)
+            known[doc["id"]] = doc["revision"]
+
+    changed = [doc_id for doc_id, revision in revisions.items() if known.get(doc_id) != revision]
+    removed = [doc_id for doc_id in known if doc_id not in revisions]
+    if not changed and not removed:
+        return current
+
+    index = index.copy()
+    docs = list(current.docs)
+    for doc_id in changed + removed:
+        rows = positions.get(doc_id, [])
+        index.delete(rows)
+        for row in rows:
+            docs[row] = {"id": doc_id, "revision": None}
+
+    added, vectors = _parse_rows(fetch_rows(changed) if changed else [], fields, index.dim)
+    if added:
+        index.add(np.arange(len(docs), len(docs) + len(added)), np.vstack(vectors))
+        docs.extend(added)
+
+    if index.pending + len(docs) - len(index) > FAQ_REBUILD_FRACTION * len(docs):
+        return None
+    return FaqIndex(docs=docs, index=index, loaded_at=time.monotonic())
+
+
+def fetch_faq_rows(ids: list[int] | None = None) -> list[dict]:
+    """FAQs mit Embedding und Revision (alle oder nur `ids`)"""
+    # Text-Embedding nur übertragen wenn noch kein Binär-Embedding existiert
+    return execute_query(
+        f"""
+        SELECT id, question, answer, source_url, embedding_bin,
+               CASE WHEN embedding_bin IS NULL THEN embedding::text END AS embedding,
+               {FAQ_REVISION} AS revision
+        FROM {FAQ_TABLE}
+        {"WHERE id = ANY(%s)" if ids is not None else ""}
+        """,
+        (ids,) if ids is not None else None,
+        replica=True
+    ) or []
+
+
+def fetch_faq_revisions() -> dict[int, str]:
+    """id -> Revision aller FAQs mit Embedding (ohne die Embeddings selbst)"""
+    rows = execute_query(
+        f"""
+        SELECT id, {FAQ_REVISION} AS revision
+        FROM {FAQ_TABLE}
+        WHERE embedding_bin IS NOT NULL OR embedding IS NOT NULL
+        """,
+        replica=True
+    ) or []
+    return {row["id"]: row["revision"] for row in rows}
+
+
+def _table_fingerprint(tables: list[str]) -> str | None:
+    """
+    Fingerprint aus den Änderungszählern in faq_versions (per Trigger gepflegt, siehe
+    schema.sql und ingest_faqs.py) - zwei Zeilen lesen statt die ganze Tabelle zu hashen.
+    changed_at unterscheidet gleiche Zählerstände nach einem Neuaufsetzen der DB.
+    None wenn für eine der Tabellen kein Zähler existiert.
+    """
+    rows = execute_query(
+        """
+        SELECT count(*) AS found, md5(COALESCE(string_agg(
+            name || ':' || version || ':' || extract(epoch FROM changed_at),
+            ',' ORDER BY name
+        ), '')) AS fingerprint
+        FROM faq_versions
+        WHERE name = ANY(%s)
+        """,
+        (tables,)
+    )
+    return rows[0]["fingerprint"] if rows[0]["found"] == len(set(tables)) else None
+
+
+def fetch_faq_fingerprint() -> str | None:
+    """Ändert sich mit jedem schreibenden Statement auf der FAQ-Tabelle"""
+    return _table_fingerprint([FAQ_TABLE])
+
+
+# Revision pro FAQ über alle Passagen: write_passages ersetzt sie immer zusammen (neue ids)
+_PASSAGE_REVISIONS = f"""
+    SELECT p.document_id AS id,
+           md5(concat_ws('|', d.question, d.source_url, count(*), max(p.id))) AS revision
+    FROM {FAQ_PASSAGE_TABLE} p
+    JOIN {FAQ_TABLE} d ON d.id = p.document_id
+    GROUP BY p.document_id, d.question, d.source_url
+"""
+
+
+def fetch_passage_rows(ids: list[int] | None = None) -> list[dict]:
+    """Passagen inkl. Frage und Quelle der Eltern-FAQ (alle oder nur die der FAQs `ids`)"""
+    return execute_query(
+        f"""
+        WITH revisions AS ({_PASSAGE_REVISIONS})
+        SELECT p.document_id AS id, d.question, p.content, d.source_url, p.embedding_bin, r.revision
+        FROM {FAQ_PASSAGE_TABLE} p
+        JOIN {FAQ_TABLE} d ON d.id = p.document_id
+        JOIN revisions r ON r.id = p.document_id
+        {"WHERE p.document_id = ANY(%s)" if ids is not None else ""}
+        ORDER BY p.document_id, p.passage_no
+        """,
+        (ids,) if ids is not None else None,
+        replica=True
+    ) or []
+
+
+def fetch_passage_revisions() -> dict[int, str]:
+    """FAQ-id -> Revision ihrer Passagen"""
+    rows = execute_query(_PASSAGE_REVISIONS, replica=True) or []
+    return {row["id"]: row["revision"] for row in rows}
+
+
+def fetch_passage_fingerprint() -> str | None:
+    """Wie fetch_faq_fingerprint, über Passagen und die FAQ-Tabelle (Frage, Quelle)"""
+    return _table_fingerprint([FAQ_TABLE, FAQ_PASSAGE_TABLE])
+
+
+def _index_variant() -> str:
+    """Suffix der Snapshot-Version: ändert sich mit der Index-Konfiguration und dem Snapshot-Format"""
+    from shared.vector_snapshot import FORMAT_VERSION
+
+    if FAQ_INDEX_TYPE == "ivf":
+        return f"ivf-{FAQ_IVF_NPROBE}-f{FORMAT_VERSION}"
+    return f"{FAQ_EMBEDDING_PRECISION}-{FAQ_COARSE_DIM or 'full'}-f{FORMAT_VERSION}"
+
+
+class CachedIndex:
+    """
+    Prozess-Cache für einen Index (FAQs bzw. Passagen).
+    Nur der erste Zugriff lädt synchron. Danach wird nach FAQ_CACHE_TTL_SECONDS (oder
+    invalidate()) im Hintergrund der Fingerprint geprüft und nur bei einer Änderung
+    aktualisiert - die Requests suchen solange im bisherigen Index.
+    Mit FAQ_SNAPSHOT_DIR wird der Index als Snapshot auf Disk geteilt und atomar getauscht.
+    """
+
+    def __init__(self, fetch_rows, fetch_revisions, fingerprint, fields: list[str], snapshot_subdir: str = ""):
+        self.fetch_rows = fetch_rows
+        self.fetch_revisions = fetch_revisions
+        self.fingerprint = fingerprint
+        self.fields = fields
+        self.snapshot_subdir = snapshot_subdir
+        self.current: FaqIndex | None = None
+        self._refreshing = threading.Lock()
+        self._invalidated_at = 0.0
+        self._warned = False
+
+    def load(self, force: bool = False) -> FaqIndex:
+        current = self.current
+        if current is None or force:
+            with self._refreshing:
+                if self.current is None or force:
+                    self.current = self._refresh(force)
+            return self.current
+
+        if (
+            time.monotonic() - current.loaded_at >= FAQ_CACHE_TTL_SECONDS
+            and self._refreshing.acquire(blocking=False)
+        ):
+            threading.Thread(target=self._refresh_in_background, name="faq-index-refresh", daemon=True).start()
+        return current
+
+    def invalidate(self) -> None:
+        """Markiert den Index als abgelaufen - der nächste Zugriff prüft im Hintergrund den Fingerprint"""
+        self._invalidated_at = time.monotonic()
+        if self.current is not None:
+            self.current.loaded_at = 0.0
+
+    def _refresh_in_background(self) -> None:
+        started = time.monotonic()
+        try:
+            fresh = self._refresh(False)
+            if self._invalidated_at >= started:
+                # Während des Ladens geändert - gleich nochmal prüfen
+                fresh.loaded_at = 0.0
+            self.current = fresh
+        except Exception as e:
+            # Alten Index behalten, nächster Versuch nach Ablauf der TTL
+            agent_logger.warning("FAQ index refresh failed: %s", e)
+            if self.current is not None:
+                self.current.loaded_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def _refresh(self, force: bool) -> FaqIndex:
+        if settings.faq_snapshot_dir:
+            return self._load_snapshot(force)
+
+        fingerprint = self._fingerprint()
+        if not force and self.current is not None and self.current.fingerprint == fingerprint:
+            self.current.loaded_at = time.monotonic()
+            return self.current
+        return self._update(None if force else self.current, fingerprint)
+
+    def _fingerprint(self) -> str:
+        """
+        Fingerprint aus faq_versions. Ohne Zähler (eigene FAQ_TABLE ohne Trigger) ein Hash
+        über die Revisionen aller Zeilen - teurer, wird aber auch nur nach der TTL geprüft.
+        """
+        fingerprint = self.fingerprint()
+        if fingerprint is not None:
+            return fingerprint
+        if not self._warned:
+            self._warned = True
+            agent_logger.warning(
+                "No faq_versions counter for %s - comparing row revisions on every refresh "
+                "(ingest_faqs.py installs the version trigger)", FAQ_TABLE
+            )
+        revisions = sorted(self.fetch_revisions().items())
+        return hashlib.md5(repr(revisions).encode()).hexdigest()
+
+    def _update(self, current: FaqIndex | None, fingerprint: str) -> FaqIndex:
+        """Inkrementell über apply_changes, sonst (oder ohne `current`) komplett neu"""
+        fresh = None
+        if current is not None:
+            fresh = apply_changes(current, self.fetch_revisions(), self.fetch_rows, self.fields)
+        if fresh is None:
+            fresh = build_index(self.fetch_rows(), self.fields)
+        elif fresh is current:
+            fresh = replace(current)
+        fresh.fingerprint = fingerprint
+        fresh.loaded_at = time.monotonic()
+        return fresh
+
+    def _open_snapshot(self, store: VectorSnapshotStore, version: str) -> FaqIndex:
+        index, records, _ = store.open(version, rescore_factor=FAQ_RESCORE_FACTOR)
+        return FaqIndex(docs=records, index=index, loaded_at=time.monotonic(), version=version)
+
+    def _load_snapshot(self, force: bool) -> FaqIndex:
+        """
+        Index über einen memory-mapped Snapshot den sich alle Worker teilen.
+        Nur der Worker der den Lock hält lädt aus der DB und veröffentlicht eine neue Version
+        (ausgehend vom aktuellen Snapshot, siehe _update).
+        """
+        from pathlib import Path
+        from shared.vector_snapshot import VectorSnapshotStore, SnapshotFormatError
+
+        store = VectorSnapshotStore(Path(settings.faq_snapshot_dir) / self.snapshot_subdir)
+        current = store.current_version()
+
+        # Schneller Start: vorhandenen Snapshot sofort mappen, geprüft wird nach Ablauf der TTL
+        if self.current is None and not force and current and current.endswith(f"-{_index_variant()}"):
+            try:
+                return self._open_snapshot(store, current)
+            except (SnapshotFormatError, FileNotFoundError):
+                # Altes Format oder unvollständig - unten neu bauen
+                force = True
+
+        fingerprint = self._fingerprint()
+        version = f"{fingerprint[:16]}-{_index_variant()}"
+        if not force and self.current is not None and self.current.version == version:
+            self.current.loaded_at = time.monotonic()
+            return self.current
+
+        if force or current != version:
+            with store.lock():
+                latest = store.current_version()
+                if force or latest != version:
+                    base = None
+                    if not force and latest and latest.endswith(f"-{_index_variant()}"):
+                        try:
+                            base = self._open_snapshot(store, latest)
+                        except (SnapshotFormatError, FileNotFoundError):
+                            base = None
+                    # Daten vom Primary, damit sie zum Fingerprint passen
+                    with use_primary():
+                        fresh = self._update(base, fingerprint)
+                    if fresh.index is None:
+                        return fresh
+                    store.publish(version, fresh.index, list(fresh.docs), self.fields)
+
+        return self._open_snapshot(store, version)
+
+
+_faq_cache = CachedIndex(fetch_faq_rows, fetch_faq_revisions, fetch_faq_fingerprint, FAQ_FIELDS)
+_passage_cache = CachedIndex(
+    fetch_passage_rows, fetch_passage_revisions, fetch_passage_fingerprint, PASSAGE_FIELDS, "passages"
+)
+
+
+def load_faq_index(force: bool = False) -> FaqIndex:
+    """Gibt den FAQ-Index zurück (gecacht, siehe CachedIndex)"""
+    return _faq_cache.load(force)
+
+
+def load_passage_index(force: bool = False) -> FaqIndex:
+    """Gibt den Passage-Index zurück (gecacht, siehe CachedIndex)"""
+    return _passage_cache.load(force)
+
+
+def invalidate_faq_cache(_payload: str = "") -> None:
+    """
+    Markiert FAQ- und Passage-Index als abgelaufen, der nächste Zugriff prüft im Hintergrund
+    den Fingerprint und übernimmt die Änderungen. Wird auch als NOTIFY-Callback verwendet.
+    """
+    _faq_cache.invalidate()
+    _passage_cache.invalidate()
@@ -4,16 +4,37 @@ FastAPI Backend - Support Agent
 """
 from __future__ import annotations
 
-import os
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import threading
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from typing import Any, AsyncIterator, Iterator
+
+import anyio
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 # Shared imports
-from shared.config import validate_config
-from shared.logger import api_logger
-from shared.database import get_supabase
+from shared import fast_json, tracing
+from shared.admission import AdmissionRejected, admission
+from shared.analytics import GRANULARITIES, query_rollups, rollups
+from shared.config import settings, validate_config, FAQ_CHANGED_CHANNEL, TICKETS_CHANGED_CHANNEL
+from shared.logger import api_logger, stop_logging
+from shared.database import get_supabase, get_replica_router, notify, warm_up_connection
+from shared.event_stream import EventBroadcaster
+from shared.response_cache import CachedResponse, ResponseCache, etag_matches
+from shared.export import EXPORT_COLUMNS, EXPORT_FORMATS, export_stream
+from shared.llm_client import warm_up_client
+from shared.partitions import request_partitions
+from shared.profiling import MAX_PROCESS_PROFILE_SECONDS, capture_process_profile
+from shared.pg_listener import pg_listener
+from shared.request_logger import get_frequent_questions
+from shared.text_chunking import estimate_tokens
+from shared.warmup import WarmupState, run_warmup
 from shared.models import (
     ChatRequest,
     ChatResponse,
@@ -26,26 +47,29 @@ from shared.models import (
 
 # Agent imports
 from agents.support import get_response as get_support_response
+from agents.support import warm_up as warm_up_support
+from agents.support import invalidate_faq_cache
+
+class FastJSONResponse(JSONResponse):
+    """JSON Response die mit orjson rendert (Fallback: stdlib json)"""
+
+    def render(self, content: Any) -> bytes:
+        return fast_json.dumps_bytes(content)
 
-load_dotenv()
 
 app = FastAPI(
     title="Financial Agents API",
     description="AI-basierte Support Agent",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 # CORS für Frontend
-frontend_urls = os.getenv("FRONTEND_URL", "")
 allowed_origins = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
+    *settings.frontend_urls,
 ]
-if frontend_urls:
-    for url in frontend_urls.split(","):
-        url = url.strip()
-        if url:
-            allowed_origins.append(url)
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,13 +81,75 @@ app.add_middleware(
 )
 
 
+# Tracing: Root-Span pro HTTP-Request, setzt einen eingehenden traceparent fort
+if tracing.enabled():
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        route = f"{request.method} {request.url.path}"
+        with tracing.span(route, kind="server", traceparent=request.headers.get("traceparent")) as span:
+            span.set_attributes({"http.method": request.method, "http.target": request.url.path})
+            response = await call_next(request)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.record_exception(HTTPException(status_code=response.status_code))
+            response.headers["traceparent"] = span.traceparent
+            return response
+
+
 # ============== Startup Event ==============
 
+warmup_state = WarmupState()
+ticket_events = EventBroadcaster()
+ticket_cache = ResponseCache(ttl_seconds=settings.ticket_cache_ttl_seconds)
+
+
+def _warm_up_support_agent() -> dict:
+    """FAQs laden und optional die häufigsten Fragen vorab embedden"""
+    questions = []
+    if settings.warmup_top_questions > 0:
+        questions = get_frequent_questions(settings.warmup_top_questions)
+    return warm_up_support(questions)
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Validiert Konfiguration beim Server-Start"""
+    """Validiert Konfiguration, startet den NOTIFY-Listener und den Warm-up"""
     validate_config()
-    api_logger.info("Config validated successfully - Server ready")
+    ticket_events.bind_loop(asyncio.get_running_loop())
+    rollups.start()
+    request_partitions.start()
+    # Startet den Replica-Health-Check, damit die ersten Requests schon Replicas nutzen
+    get_replica_router()
+
+    if settings.pg_listen_enabled:
+        pg_listener.subscribe(FAQ_CHANGED_CHANNEL, invalidate_faq_cache)
+        pg_listener.subscribe(TICKETS_CHANGED_CHANNEL, _on_ticket_changed)
+        pg_listener.start()
+
+    if not settings.warmup_enabled:
+        warmup_state.mark_ready()
+        api_logger.info("Config validated successfully - Server ready")
+        return
+
+    steps = [
+        ("database", warm_up_connection),
+        ("openai", warm_up_client),
+        ("support_agent", _warm_up_support_agent),
+    ]
+    warmup_state.task = asyncio.create_task(run_warmup(steps, warmup_state))
+    api_logger.info("Config validated successfully - Warm-up started")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Schreibt die restlichen Analytics-Zähler, Spans und Logs, beendet die Hintergrund-Threads"""
+    request_partitions.stop()
+    router = get_replica_router()
+    if router is not None:
+        router.stop()
+    await run_in_threadpool(rollups.stop)
+    await run_in_threadpool(tracing.shutdown)
+    stop_logging()
 
 
 # ============== Root & Health ==============
@@ -79,6 +165,10 @@ async def root():
             "/chat": "POST - Chat mit Support Agent",
             "/escalate": "POST - Support-Ticket erstellen",
             "/tickets": "GET - Alle Tickets abrufen",
+            "/tickets/stream": "GET - Ticket-Updates als Server-Sent Events",
+            "/export/{table}": "GET - Tabelle als NDJSON/CSV streamen",
+            "/analytics": "GET - Aggregierte Kennzahlen pro Minute/Stunde",
+            "/admin/profile": "POST - Prozess-Profil aufzeichnen (X-Admin-Token)",
             "/health": "GET - Health Check",
         }
     }
@@ -86,14 +176,79 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health Check"""
-    return {"status": "ok", "version": "1.0.0"}
+    """Health Check - 503 solange der Warm-up läuft"""
+    if not warmup_state.ready:
+        return FastJSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "version": "1.0.0", "warmup": warmup_state.to_dict()}
+        )
+    result = {"status": "ok", "version": "1.0.0"}
+    router = get_replica_router()
+    if router is not None:
+        result["replicas"] = router.status()
+    if settings.admission_enabled:
+        result["admission"] = admission.stats()
+    return result
 
 
 # ============== Chat Endpoint ==============
 
+def is_admin(request: Request) -> bool:
+    """Prüft den X-Admin-Token Header (ohne ADMIN_TOKEN ist niemand Admin)"""
+    token = request.headers.get("x-admin-token", "")
+    return bool(settings.admin_token) and hmac.compare_digest(token, settings.admin_token)
+
+
+# Tokens Kontext pro zusätzlicher Kosteneinheit im Fair Queuing
+ADMISSION_TOKENS_PER_UNIT = 2000
+
+
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies]
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return any(ip in network for network in _trusted_proxies)
+
+
+def client_ip(http_request: Request) -> str | None:
+    """
+    IP des Clients. X-Forwarded-For zählt nur, wenn die Verbindung von einem der
+    TRUSTED_PROXIES kommt - dann ist es die letzte Adresse, die kein Proxy ist.
+    """
+    ip = http_request.client.host if http_request.client else None
+    try:
+        if ip is None or not _is_trusted_proxy(ip):
+            return ip
+        for hop in reversed(http_request.headers.get("x-forwarded-for", "").split(",")):
+            hop = hop.strip()
+            if hop and not _is_trusted_proxy(hop):
+                return hop
+    except ValueError:
+        # Keine gültige Adresse im Header - dann zählt der Proxy selbst
+        pass
+    return ip
+
+
+def _admission_key(request: ChatRequest, http_request: Request) -> tuple[str, str | None]:
+    """(Client-Key, IP): API-Key vor sessionId vor IP"""
+    ip = client_ip(http_request)
+    api_key = http_request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest(), ip
+    if request.sessionId:
+        return "session:" + request.sessionId[:128], ip
+    return f"ip:{ip}", ip
+
+
+def _admission_cost(request: ChatRequest) -> float:
+    """Große Requests (lange History) verbrauchen mehr vom Anteil ihres Clients"""
+    text = request.message + "".join(str(m.get("content", "")) for m in request.chat_history or [])
+    return 1 + estimate_tokens(text) / ADMISSION_TOKENS_PER_UNIT
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat Endpoint für Support Agent
 
@@ -102,18 +257,39 @@ async def chat(request: ChatRequest):
         request.agent: Muss "support" sein
         request.chat_history: Bisheriger Chatverlauf für Memory
         request.debug: Wenn True, werden Debug-Infos zurückgegeben
+                       (mit X-Admin-Token zusätzlich ein CPU-/Allokations-Profil)
+
+    Pro Client begrenzt (429) und bei Überlast fair eingereiht oder abgelehnt (503).
     """
+    if request.agent != "support":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Agent '{request.agent}' nicht verfügbar. Nur 'support' ist aktiviert."
+        )
+
+    if not settings.admission_enabled:
+        return await _chat(request, http_request)
+
+    key, ip = _admission_key(request, http_request)
     try:
-        if request.agent != "support":
-            raise HTTPException(
-                status_code=400,
-                detail=f"Agent '{request.agent}' nicht verfügbar. Nur 'support' ist aktiviert."
-            )
+        async with admission.slot(key, ip, _admission_cost(request)):
+            return await _chat(request, http_request)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
+
+async def _chat(request: ChatRequest, http_request: Request) -> ChatResponse:
+    """Agent-Aufruf und Response (innerhalb des Admission-Slots)"""
+    try:
         result = await get_support_response(
             request.message,
             request.chat_history,
-            debug=request.debug
+            debug=request.debug,
+            profile=request.debug and is_admin(http_request)
         )
 
         return ChatResponse(
@@ -126,7 +302,7 @@ async def chat(request: ChatRequest):
     except HTTPException:
         raise
     except Exception as e:
-        api_logger.error(f"Error in chat endpoint: {e}")
+        api_logger.error("Error in chat endpoint: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Es gab einen Fehler bei der Verarbeitung deiner Anfrage."
@@ -135,6 +311,60 @@ async def chat(request: ChatRequest):
 
 # ============== Ticket Endpoints ==============
 
+# Maximale Länge von Texten in Ticket-Deltas (NOTIFY-Payload ist auf 8000 Bytes begrenzt)
+TICKET_EVENT_PREVIEW_CHARS = 200
+
+
+def _invalidate_ticket_cache(ticket_id: int | None) -> None:
+    """Entfernt das Ticket und alle Listen-Varianten aus dem Response-Cache"""
+    ticket_cache.invalidate(("ticket", ticket_id), groups=("tickets",))
+
+
+def _on_ticket_changed(payload: str) -> None:
+    """NOTIFY-Callback: Cache invalidieren (auch für Writes anderer Worker) und Delta verteilen"""
+    try:
+        ticket_id = fast_json.loads(payload).get("id")
+    except ValueError:
+        ticket_id = None
+    if ticket_id is None:
+        ticket_cache.invalidate()
+    else:
+        _invalidate_ticket_cache(ticket_id)
+    ticket_events.publish(payload)
+
+
+def _cached_json_response(request: Request, cached: CachedResponse) -> Response:
+    """200 mit ETag bzw. 304 wenn der Client den Stand schon hat"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+def _publish_ticket_event(event: str, ticket: dict, **extra) -> None:
+    """
+    Invalidiert den Ticket-Cache und schickt ein kleines Delta an alle Dashboards
+    (/tickets/stream). Per NOTIFY erreicht es alle Worker, ohne Listener nur den eigenen.
+    """
+    _invalidate_ticket_cache(ticket.get("id"))
+    delta = {
+        "event": event,
+        "id": ticket.get("id"),
+        "status": ticket.get("status"),
+        "created_at": ticket.get("created_at"),
+        "resolved_at": ticket.get("resolved_at"),
+        **extra,
+    }
+    try:
+        payload = fast_json.dumps(delta)
+        if settings.pg_listen_enabled:
+            notify(TICKETS_CHANGED_CHANNEL, payload)
+        else:
+            ticket_events.publish(payload)
+    except Exception as e:
+        api_logger.warning("Ticket event could not be published: %s", e)
+
+
 @app.post("/escalate", response_model=EscalateResponse)
 async def escalate(request: EscalateRequest):
     """Erstellt ein Support-Ticket"""
@@ -147,12 +377,17 @@ async def escalate(request: EscalateRequest):
         }).execute()
 
         ticket_id = result.data[0]["id"]
+        _publish_ticket_event(
+            "created",
+            result.data[0],
+            user_message=request.message[:TICKET_EVENT_PREVIEW_CHARS]
+        )
         return EscalateResponse(
             ticket_id=ticket_id,
             message=f"Ticket #{ticket_id} wurde erstellt. Unser Support-Team meldet sich bei dir!"
         )
     except Exception as e:
-        api_logger.error(f"Error creating ticket: {e}")
+        api_logger.error("Error creating ticket: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Ticket konnte nicht erstellt werden."
@@ -160,35 +395,61 @@ async def escalate(request: EscalateRequest):
 
 
 @app.get("/tickets")
-async def get_tickets(status: str | None = None):
-    """Alle Tickets abrufen (optional gefiltert nach Status)"""
+async def get_tickets(request: Request, status: str | None = None):
+    """Alle Tickets abrufen (optional gefiltert nach Status), gecacht mit ETag"""
     try:
-        supabase = get_supabase()
-        query = supabase.table("support_tickets").select("*").order("created_at", desc=True)
-
-        if status:
-            query = query.eq("status", status)
-
-        result = query.execute()
-        return {"tickets": result.data, "count": len(result.data)}
+        key = ("tickets", status)
+        cached = ticket_cache.get(key)
+        if cached is None:
+            generation = ticket_cache.generation
+            supabase = get_supabase()
+            # Vom Primary: der Cache soll nach einer Invalidierung keinen Replica-Stand übernehmen
+            query = supabase.table("support_tickets").select("*").order("created_at", desc=True).primary()
+
+            if status:
+                query = query.eq("status", status)
+
+            result = query.execute()
+            # Direkt rendern, ohne jsonable_encoder über alle Zeilen
+            body = fast_json.dumps_bytes({"tickets": result.data, "count": len(result.data)})
+            cached = ticket_cache.put(key, body, generation)
+        return _cached_json_response(request, cached)
     except Exception as e:
-        api_logger.error(f"Error fetching tickets: {e}")
+        api_logger.error("Error fetching tickets: %s", e)
         raise HTTPException(status_code=500, detail="Tickets konnten nicht geladen werden.")
 
 
+@app.get("/tickets/stream")
+async def stream_tickets(request: Request):
+    """
+    Server-Sent Events mit Ticket-Deltas (created, updated, responded) statt Polling.
+    Nach einem Reconnect sollte das Dashboard einmal GET /tickets laden.
+    """
+    return StreamingResponse(
+        ticket_events.stream(event="ticket", is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/tickets/{ticket_id}")
-async def get_ticket(ticket_id: int):
-    """Einzelnes Ticket abrufen"""
+async def get_ticket(ticket_id: int, request: Request):
+    """Einzelnes Ticket abrufen, gecacht mit ETag"""
     try:
-        supabase = get_supabase()
-        result = supabase.table("support_tickets").select("*").eq("id", ticket_id).single().execute()
-        if not result.data:
-            raise HTTPException(status_code=404, detail="Ticket nicht gefunden")
-        return result.data
+        key = ("ticket", ticket_id)
+        cached = ticket_cache.get(key)
+        if cached is None:
+            generation = ticket_cache.generation
+            supabase = get_supabase()
+            result = supabase.table("support_tickets").select("*").eq("id", ticket_id).primary().single().execute()
+            if not result.data:
+                raise HTTPException(status_code=404, detail="Ticket nicht gefunden")
+            cached = ticket_cache.put(key, fast_json.dumps_bytes(result.data), generation)
+        return _cached_json_response(request, cached)
     except HTTPException:
         raise
     except Exception as e:
-        api_logger.error(f"Error fetching ticket: {e}")
+        api_logger.error("Error fetching ticket: %s", e)
         raise HTTPException(status_code=500, detail="Ticket konnte nicht geladen werden.")
 
 
@@ -206,11 +467,12 @@ async def update_ticket(ticket_id: int, status: str):
         if not result.data:
             raise HTTPException(status_code=404, detail="Ticket nicht gefunden")
 
+        _publish_ticket_event("updated", result.data[0])
         return {"message": f"Ticket #{ticket_id} wurde auf '{status}' gesetzt"}
     except HTTPException:
         raise
     except Exception as e:
-        api_logger.error(f"Error updating ticket: {e}")
+        api_logger.error("Error updating ticket: %s", e)
         raise HTTPException(status_code=500, detail="Ticket konnte nicht aktualisiert werden.")
 
 
@@ -221,7 +483,8 @@ async def respond_to_ticket(ticket_id: int, request: SupportResponseRequest):
         supabase = get_supabase()
 
         # Ticket laden
-        ticket_result = supabase.table("support_tickets").select("*").eq("id", ticket_id).single().execute()
+        # Vom Primary lesen, sonst kann eine verzögerte Replica frühere Antworten verlieren
+        ticket_result = supabase.table("support_tickets").select("*").eq("id", ticket_id).primary().single().execute()
         if not ticket_result.data:
             raise HTTPException(status_code=404, detail="Ticket nicht gefunden")
 
@@ -236,16 +499,27 @@ async def respond_to_ticket(ticket_id: int, request: SupportResponseRequest):
         })
 
         # Ticket updaten
-        supabase.table("support_tickets").update({
+        updated = supabase.table("support_tickets").update({
             "chat_history": chat_history,
             "status": "in_progress"
         }).eq("id", ticket_id).execute()
 
+        _publish_ticket_event(
+            "responded",
+            updated.data[0] if updated.data else {**ticket, "status": "in_progress"},
+            message={
+                "role": "support",
+                "support_name": request.support_name,
+                "content": request.message[:TICKET_EVENT_PREVIEW_CHARS],
+            },
+            message_count=len(chat_history)
+        )
+
         return {"message": "Antwort gesendet", "chat_history": chat_history}
     except HTTPException:
         raise
     except Exception as e:
-        api_logger.error(f"Error responding to ticket: {e}")
+        api_logger.error("Error responding to ticket: %s", e)
         raise HTTPException(status_code=500, detail="Antwort konnte nicht gesendet werden.")
 
 
@@ -274,7 +548,8 @@ async def submit_feedback(request: FeedbackRequest):
         }).execute()
 
         feedback_id = result.data[0]["id"] if result.data else None
-        api_logger.info(f"Feedback saved: {request.feedback_type} for {request.agent_slug}")
+        rollups.add_feedback(request.agent_slug, request.feedback_type)
+        api_logger.info("Feedback saved: %s for %s", request.feedback_type, request.agent_slug)
 
         return FeedbackResponse(
             success=True,
@@ -284,16 +559,117 @@ async def submit_feedback(request: FeedbackRequest):
     except HTTPException:
         raise
     except Exception as e:
-        api_logger.error(f"Error saving feedback: {e}")
+        api_logger.error("Error saving feedback: %s", e)
         return FeedbackResponse(
             success=False,
             message="Feedback konnte nicht gespeichert werden"
         )
 
 
+# ============== Export Endpoint ==============
+
+async def _stream_and_close(first: bytes, stream: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Liefert den Export blockweise aus dem Threadpool. Endet der Response vorzeitig
+    (Client trennt), wird der Generator sofort geschlossen - damit geben Server-Side
+    Cursor und eigene Connection frei, statt auf die Garbage Collection zu warten.
+    """
+    try:
+        yield first
+        while True:
+            chunk = await run_in_threadpool(next, stream, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(stream.close)
+
+
+@app.get("/export/{table}")
+async def export_table(
+    request: Request,
+    table: str,
+    format: str = "ndjson",
+    since: datetime | None = None,
+    until: datetime | None = None
+):
+    """
+    Streamt agent_requests, message_feedback oder support_tickets als NDJSON oder CSV
+    (nur mit X-Admin-Token). Optional gefiltert nach created_at (since inklusive, until exklusive).
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin-Token fehlt oder ist ungültig")
+    if table not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Export für '{table}' nicht verfügbar")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format muss 'ndjson' oder 'csv' sein")
+
+    stream = export_stream(table, format, since, until)
+    try:
+        # Ersten Block vorab holen: DB-Fehler werden so noch ein 500 statt eines abgebrochenen Streams
+        first = await run_in_threadpool(next, stream, b"")
+    except Exception as e:
+        await run_in_threadpool(stream.close)
+        api_logger.error("Error exporting %s: %s", table, e)
+        raise HTTPException(status_code=500, detail="Export konnte nicht gestartet werden.")
+
+    filename = f"{table}_{datetime.utcnow():%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        _stream_and_close(first, stream),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# ============== Analytics Endpoint ==============
+
+@app.get("/analytics")
+async def analytics(
+    granularity: str = "hour",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    agent: str | None = None
+):
+    """
+    Requests, Latenz-Perzentile, Tokens, Kosten, Eskalationen und Feedback pro
+    Minute oder Stunde - gelesen aus den Rollups, nie aus agent_requests.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity muss 'minute' oder 'hour' sein")
+
+    try:
+        return await run_in_threadpool(query_rollups, granularity, since, until, agent)
+    except Exception as e:
+        api_logger.error("Error loading analytics: %s", e)
+        raise HTTPException(status_code=500, detail="Analytics konnten nicht geladen werden.")
+
+
+# ============== Admin Endpoints ==============
+
+@app.post("/admin/profile")
+async def admin_profile(request: Request, seconds: float = 10.0):
+    """
+    Sampelt alle Threads für `seconds` Sekunden (max. 60) und schreibt die Stacks
+    im collapsed-Format nach PROFILE_DIR. Antwortet mit Pfad und Top-Funktionen.
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin-Token fehlt oder ist ungültig")
+    if not 0 < seconds <= MAX_PROCESS_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds muss zwischen 0 und {MAX_PROCESS_PROFILE_SECONDS} liegen")
+
+    stop = threading.Event()
+    try:
+        return await run_in_threadpool(capture_process_profile, seconds, stop)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        # Bricht die Aufzeichnung ab, falls der Client vorher trennt
+        stop.set()
+
+
 # ============== Server Start ==============
 
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=settings.port)
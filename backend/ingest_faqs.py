@@ -0,0 +1,364 @@
+"""
+FAQ Ingestion
+Berechnet Embeddings nur für FAQs deren Inhalt oder Embedding-Modell sich geändert hat.
+
+    python ingest_faqs.py                  # geänderte FAQs neu embedden
+    python ingest_faqs.py --dry-run        # nur anzeigen was sich geändert hat
+    python ingest_faqs.py --force          # alle FAQs neu embedden
+    python ingest_faqs.py --migrate-binary # Text-Embeddings nach embedding_bin konvertieren
+    python ingest_faqs.py --no-passages    # Passage-Index nicht aktualisieren
+
+Geänderte Antworten werden außerdem in Passagen zerlegt (shared/text_chunking.py), die
+einzeln embedded und in faq_passages gespeichert werden.
+Die Embedding-Requests laufen in Batches mit begrenzter Parallelität und Rate Limit.
+Danach bekommen laufende Server per NOTIFY Bescheid, dass ihr FAQ-Index veraltet ist.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agents.support.config import FAQ_PASSAGE_TABLE
+from shared.config import settings, EMBEDDING_MODEL, FAQ_CHANGED_CHANNEL
+from shared.database import execute_query, get_connection, notify, encode_embedding
+from shared.llm_client import create_embeddings
+from shared.logger import setup_logger
+from shared.text_chunking import split_passages
+
+MAX_RETRIES = 5
+
+logger = setup_logger("ingest")
+
+
+class RateLimiter:
+    """Token Bucket: erlaubt `per_minute` Einheiten pro Minute (thread-safe)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def embedding_text(question: str, answer: str) -> str:
+    """Text der für eine FAQ embedded wird"""
+    return f"{question}\n{answer}"
+
+
+def content_hash(question: str, answer: str) -> str:
+    return hashlib.sha256(embedding_text(question, answer).encode("utf-8")).hexdigest()
+
+
+def find_stale(rows: list[dict], model: str, force: bool = False) -> list[dict]:
+    """FAQs ohne Embedding, mit geändertem Inhalt oder anderem Modell"""
+    stale = []
+    for row in rows:
+        digest = content_hash(row["question"], row["answer"])
+        if force or not row["has_embedding"] or row["content_hash"] != digest or row["embedding_model"] != model:
+            stale.append({**row, "content_hash": digest})
+    return stale
+
+
+def _result_row(doc_id: int, embedding, digest: str | None, model: str) -> tuple:
+    """Zeile für das Bulk-Update: Text-Embedding (pgvector) und Binär-Embedding"""
+    from psycopg2 import Binary
+
+    text = "[" + ",".join(map(str, embedding)) + "]"
+    return (doc_id, text, Binary(encode_embedding(embedding, model)), digest, model)
+
+
+def embed_texts(texts: list[str], model: str, requests: RateLimiter, tokens: RateLimiter) -> list[list[float]]:
+    """Ein embeddings.create Call für einen Batch, mit Retry und Backoff"""
+    requests.acquire()
+    tokens.acquire(sum(len(text) for text in texts) / 4)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            return create_embeddings(texts, model=model)
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt
+            logger.warning("Embedding batch failed (%s), retry in %ss", e, delay)
+            time.sleep(delay)
+    return []
+
+
+def embed_batch(batch: list[dict], model: str, requests: RateLimiter, tokens: RateLimiter) -> list[tuple]:
+    """Embeddings für einen Batch FAQs als Zeilen für write_embeddings"""
+    texts = [embedding_text(row["question"], row["answer"]) for row in batch]
+    embeddings = embed_texts(texts, model, requests, tokens)
+    return [
+        _result_row(row["id"], embedding, row["content_hash"], model)
+        for row, embedding in zip(batch, embeddings)
+    ]
+
+
+def write_embeddings(results: list[tuple], table: str) -> None:
+    """Bulk-Update aller Ergebnisse eines Batches in einem Statement"""
+    from psycopg2.extras import execute_values
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                f"""
+                UPDATE {table} AS d
+                SET embedding = v.embedding::vector,
+                    embedding_bin = v.embedding_bin,
+                    content_hash = COALESCE(v.content_hash, d.content_hash),
+                    embedding_model = v.model,
+                    embedded_at = NOW()
+                FROM (VALUES %s) AS v(id, embedding, embedding_bin, content_hash, model)
+                WHERE d.id = v.id
+                """,
+                results,
+                page_size=len(results)
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def find_stale_passages(rows: list[dict], model: str, force: bool = False) -> list[dict]:
+    """FAQs deren Passagen fehlen, zu einem alten Inhalt gehören oder ein anderes Modell haben"""
+    stale = []
+    for row in rows:
+        digest = content_hash(row["question"], row["answer"])
+        if force or row["passage_state"] != f"{digest}:{model}":
+            stale.append({**row, "content_hash": digest})
+    return stale
+
+
+def passage_batches(rows: list[dict], batch_size: int) -> list[list[dict]]:
+    """
+    Zerlegt die Antworten in Passagen und packt sie in Batches.
+    Die Passagen einer FAQ bleiben im selben Batch, damit sie zusammen ersetzt werden.
+    """
+    batches: list[list[dict]] = []
+    current: list[dict] = []
+    for row in rows:
+        passages = [
+            {
+                "document_id": row["id"],
+                "passage_no": number,
+                "content": passage,
+                "content_hash": row["content_hash"],
+                "text": embedding_text(row["question"], passage),
+            }
+            for number, passage in enumerate(split_passages(row["answer"]))
+        ]
+        if current and len(current) + len(passages) > batch_size:
+            batches.append(current)
+            current = []
+        current.extend(passages)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_passage_batch(batch: list[dict], model: str, requests: RateLimiter, tokens: RateLimiter) -> list[tuple]:
+    """Embeddings für einen Batch Passagen als Zeilen für write_passages"""
+    from psycopg2 import Binary
+
+    embeddings = embed_texts([passage["text"] for passage in batch], model, requests, tokens)
+    return [
+        (
+            passage["document_id"], passage["passage_no"], passage["content"],
+            passage["content_hash"], Binary(encode_embedding(embedding, model)), model
+        )
+        for passage, embedding in zip(batch, embeddings)
+    ]
+
+
+def write_passages(results: list[tuple], table: str = FAQ_PASSAGE_TABLE) -> None:
+    """Ersetzt alle Passagen der betroffenen FAQs in einer Transaktion"""
+    from psycopg2.extras import execute_values
+
+    document_ids = sorted({row[0] for row in results})
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {table} WHERE document_id = ANY(%s)", (document_ids,))
+            execute_values(
+                cur,
+                f"""
+                INSERT INTO {table}
+                    (document_id, passage_no, content, content_hash, embedding_bin, embedding_model)
+                VALUES %s
+                """,
+                results,
+                page_size=len(results)
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def ensure_version_trigger(table: str) -> None:
+    """
+    Zähler in faq_versions samt Trigger für `table` (schema.sql legt sie nur für documents
+    und faq_passages an). Ohne Zähler prüfen die Server die Revisionen aller Zeilen.
+    """
+    execute_query("INSERT INTO faq_versions (name) VALUES (%s) ON CONFLICT DO NOTHING", (table,), fetch=False)
+    exists = execute_query(
+        "SELECT 1 FROM pg_trigger WHERE tgrelid = %s::regclass AND tgname = %s",
+        (table, f"{table}_version")
+    )
+    if not exists:
+        execute_query(
+            f"""
+            CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_faq_version()
+            """,
+            fetch=False
+        )
+        logger.info("faq_versions trigger installed on %s", table)
+
+
+def run_batches(batches: list[list[dict]], embed, write, args, label: str) -> tuple[int, int]:
+    """Embedded Batches parallel und schreibt sie im Hauptthread, gibt (geschrieben, fehlgeschlagen) zurück"""
+    requests = RateLimiter(args.requests_per_minute)
+    tokens = RateLimiter(args.tokens_per_minute)
+    total = sum(len(batch) for batch in batches)
+
+    written = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(embed, batch, args.model, requests, tokens) for batch in batches]
+        # DB-Writes im Hauptthread, sobald ein Batch fertig ist
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error("Embedding batch failed permanently: %s", e)
+                continue
+            write(results)
+            written += len(results)
+            logger.info("%d/%d %s aktualisiert", written, total, label)
+    return written, failed
+
+
+def migrate_binary(table: str, model: str, chunk_size: int = 1000) -> int:
+    """Konvertiert vorhandene Text-Embeddings nach embedding_bin (Textspalte bleibt lesbar)"""
+    from shared.database import decode_embedding
+
+    migrated = 0
+    while True:
+        rows = execute_query(
+            f"""
+            SELECT id, embedding::text AS embedding, embedding_model
+            FROM {table}
+            WHERE embedding_bin IS NULL AND embedding IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+            """,
+            (chunk_size,)
+        )
+        if not rows:
+            return migrated
+
+        results = []
+        for row in rows:
+            vector, _ = decode_embedding(row["embedding"])
+            if vector is not None:
+                results.append(_result_row(row["id"], vector.tolist(), None, row["embedding_model"] or model))
+        if not results:
+            return migrated
+        write_embeddings(results, table)
+        migrated += len(results)
+        logger.info("%d Embeddings nach embedding_bin migriert", migrated)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="FAQ Embeddings inkrementell aktualisieren")
+    parser.add_argument("--table", default=settings.faq_table)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=int, default=500)
+    parser.add_argument("--tokens-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--migrate-binary", action="store_true")
+    parser.add_argument("--no-passages", dest="passages", action="store_false")
+    args = parser.parse_args(argv)
+
+    if not args.dry_run:
+        try:
+            ensure_version_trigger(args.table)
+        except Exception as e:
+            logger.warning("Could not install the faq_versions trigger on %s: %s", args.table, e)
+
+    if args.migrate_binary:
+        if migrate_binary(args.table, args.model):
+            notify(FAQ_CHANGED_CHANNEL, "migrate-binary")
+        return 0
+
+    passage_state = (
+        f"""(
+            SELECT string_agg(DISTINCT p.content_hash || ':' || p.embedding_model, ',')
+            FROM {FAQ_PASSAGE_TABLE} p WHERE p.document_id = d.id
+        ) AS passage_state"""
+        if args.passages else "NULL AS passage_state"
+    )
+    rows = execute_query(
+        f"""
+        SELECT id, question, answer, content_hash, embedding_model,
+               embedding IS NOT NULL AS has_embedding, {passage_state}
+        FROM {args.table} d
+        ORDER BY id
+        """
+    ) or []
+    stale = find_stale(rows, args.model, args.force)
+    stale_passages = find_stale_passages(rows, args.model, args.force) if args.passages else []
+    logger.info("%d von %d FAQs brauchen ein neues Embedding", len(stale), len(rows))
+    if args.passages:
+        logger.info("%d von %d FAQs brauchen neue Passagen", len(stale_passages), len(rows))
+    if args.dry_run or not (stale or stale_passages):
+        return 0
+
+    updated, failed = 0, 0
+    if stale:
+        batches = [stale[i:i + args.batch_size] for i in range(0, len(stale), args.batch_size)]
+        updated, failed = run_batches(
+            batches, embed_batch, lambda results: write_embeddings(results, args.table), args, "FAQs"
+        )
+
+    passages, passages_failed = 0, 0
+    if stale_passages:
+        passages, passages_failed = run_batches(
+            passage_batches(stale_passages, args.batch_size), embed_passage_batch, write_passages, args, "Passagen"
+        )
+
+    if updated or passages:
+        notify(FAQ_CHANGED_CHANNEL, str(updated + passages))
+        logger.info("Server benachrichtigt (%s)", FAQ_CHANGED_CHANNEL)
+
+    return 1 if failed or passages_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,9 +11,56 @@ CREATE TABLE IF NOT EXISTS documents (
     answer TEXT NOT NULL,
     source_url TEXT,
     embedding vector(1536),
+    embedding_bin BYTEA,  -- float32 little-endian mit Header, siehe shared/database.encode_embedding
+    content_hash TEXT,
+    embedding_model TEXT,
+    embedded_at TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Migration für bestehende Installationen (Inkrementelles Re-Embedding, siehe ingest_faqs.py)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedded_at TIMESTAMPTZ;
+-- Binäre Embeddings (python ingest_faqs.py --migrate-binary füllt bestehende Zeilen)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_bin BYTEA;
+
+-- Passagen der FAQ-Antworten mit eigenem Embedding (ingest_faqs.py, FAQ_CONTEXT_MODE = "passages")
+CREATE TABLE IF NOT EXISTS faq_passages (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    passage_no INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT,  -- content_hash der Eltern-FAQ beim Erzeugen
+    embedding_bin BYTEA,
+    embedding_model TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (document_id, passage_no)
+);
+
+-- Änderungszähler pro FAQ-Tabelle, per Trigger bei jedem schreibenden Statement erhöht.
+-- Billiger Fingerprint für den FAQ-Index-Cache (agents/support/faq_index.py).
+CREATE TABLE IF NOT EXISTS faq_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO faq_versions (name) VALUES ('documents'), ('faq_passages') ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_faq_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE faq_versions SET version = version + 1, changed_at = NOW() WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_version ON documents;
+CREATE TRIGGER documents_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON documents
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_faq_version();
+DROP TRIGGER IF EXISTS faq_passages_version ON faq_passages;
+CREATE TRIGGER faq_passages_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON faq_passages
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_faq_version();
+
 -- Support Tickets
 CREATE TABLE IF NOT EXISTS support_tickets (
     id SERIAL PRIMARY KEY,
@@ -25,8 +72,9 @@ CREATE TABLE IF NOT EXISTS support_tickets (
 );
 
 -- Request Logging für Monitoring
+-- Range-partitioniert nach created_at, die Partitionen legt die App an (shared/partitions.py)
 CREATE TABLE IF NOT EXISTS agent_requests (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     request_id TEXT,
     agent TEXT,
     user_message TEXT,
@@ -40,6 +88,27 @@ CREATE TABLE IF NOT EXISTS agent_requests (
     hallucination_risk TEXT,
     data_points_count INTEGER,
     debug_info JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Auffangbecken falls für einen Zeitraum (noch) keine Partition existiert.
+-- Nur wenn agent_requests schon partitioniert ist - bestehende, unpartitionierte
+-- Installationen bekommen sie per python -m shared.partitions --migrate.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'agent_requests'::regclass) THEN
+        CREATE TABLE IF NOT EXISTS agent_requests_default PARTITION OF agent_requests DEFAULT;
+    ELSE
+        RAISE NOTICE 'agent_requests is not partitioned - run: python -m shared.partitions --migrate';
+    END IF;
+END
+$$;
+
+-- Deduplizierte Prompt-Texte (System-Prompt, FAQ-Kontext), referenziert aus agent_requests.debug_info
+CREATE TABLE IF NOT EXISTS prompt_blobs (
+    hash TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -55,8 +124,31 @@ CREATE TABLE IF NOT EXISTS message_feedback (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Analytics-Rollups pro Minute/Stunde, inkrementell befüllt (shared/analytics.py)
+CREATE TABLE IF NOT EXISTS analytics_rollups (
+    granularity TEXT NOT NULL,  -- 'minute' | 'hour'
+    bucket_start TIMESTAMPTZ NOT NULL,
+    agent TEXT NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    errors BIGINT NOT NULL DEFAULT 0,
+    escalations BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+    latency_max_ms INTEGER NOT NULL DEFAULT 0,
+    latency_buckets BIGINT[] NOT NULL,  -- Histogramm, Grenzen siehe LATENCY_BUCKETS_MS
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(14,6) NOT NULL DEFAULT 0,
+    risk_low BIGINT NOT NULL DEFAULT 0,
+    risk_medium BIGINT NOT NULL DEFAULT 0,
+    risk_high BIGINT NOT NULL DEFAULT 0,
+    feedback_positive BIGINT NOT NULL DEFAULT 0,
+    feedback_negative BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket_start, agent)
+);
+
 -- Index für schnellere Suche
 CREATE INDEX IF NOT EXISTS idx_documents_embedding ON documents USING ivfflat (embedding vector_cosine_ops);
 CREATE INDEX IF NOT EXISTS idx_support_tickets_status ON support_tickets(status);
 CREATE INDEX IF NOT EXISTS idx_agent_requests_agent ON agent_requests(agent);
 CREATE INDEX IF NOT EXISTS idx_agent_requests_created ON agent_requests(created_at);
+CREATE INDEX IF NOT EXISTS idx_agent_requests_request_id ON agent_requests(request_id);
@@ -0,0 +1,254 @@
+"""
+Admission Control
+Begrenzt /chat pro Client und insgesamt, damit ein einzelner Client (oder Script)
+weder die OpenAI-Kapazität noch den Event Loop für alle anderen belegt.
+
+1. Token Bucket pro Client-Key (API-Key, sonst sessionId, sonst IP) und optional
+   pro IP - wechselnde sessionIds umgehen das Limit so nicht. Leer -> sofort 429.
+2. Globales Limit gleichzeitiger Requests (max in flight). Ist es erreicht, wartet
+   der Request in der Queue seines Keys (begrenzt pro Key und gesamt, sonst 503).
+3. Freie Slots werden per Deficit Round Robin über die Keys verteilt: jeder Key
+   bekommt pro Runde ein Quantum, große Requests (viel Kontext) kosten mehr.
+
+Alles läuft im Event Loop, daher ohne Locks.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from .config import settings
+
+# Ab so vielen Buckets werden volle (= länger inaktive) Buckets entfernt
+MAX_BUCKETS = 10_000
+DRR_QUANTUM = 1.0
+
+
+class AdmissionRejected(Exception):
+    """Request abgelehnt - `status_code` 429 (Rate Limit) oder 503 (überlastet)"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Sekunden bis ein Token verfügbar ist (0 = sofort)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    """Token Buckets, globales In-Flight-Limit und DRR-Queues pro Key"""
+
+    def __init__(
+        self,
+        rate_per_second: float = 1.0,
+        burst: float = 5,
+        ip_rate_per_second: float = 0.0,
+        ip_burst: float = 20,
+        max_in_flight: int = 32,
+        max_queue: int = 256,
+        max_queue_per_key: int = 4,
+        queue_timeout: float = 10.0
+    ):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.ip_rate_per_second = ip_rate_per_second
+        self.ip_burst = ip_burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_per_key = max_queue_per_key
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = 0
+        self._buckets: dict[str, TokenBucket] = {}
+        self._queues: dict[str, deque[tuple[asyncio.Future, float]]] = {}
+        self._active: deque[str] = deque()
+        self._deficit: dict[str, float] = {}
+        self._queued = 0
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_rate_limit": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+        }
+
+    # ============== Token Buckets ==============
+
+    def _bucket(self, key: str, rate: float, capacity: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                for stale in [k for k, b in self._buckets.items() if b.is_full(now)]:
+                    del self._buckets[stale]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _check_rate(self, key: str, ip: str | None) -> None:
+        now = time.monotonic()
+        buckets = [self._bucket(key, self.rate_per_second, self.burst, now)]
+        if ip and self.ip_rate_per_second > 0 and f"ip:{ip}" != key:
+            buckets.append(self._bucket(f"ip:{ip}", self.ip_rate_per_second, self.ip_burst, now))
+
+        # Erst prüfen, dann abbuchen - ein abgelehnter Request verbraucht kein Token
+        wait = max(bucket.wait_time(now) for bucket in buckets)
+        if wait > 0:
+            self.counters["rejected_rate_limit"] += 1
+            raise AdmissionRejected(429, "Zu viele Anfragen, bitte kurz warten.", wait)
+        for bucket in buckets:
+            bucket.take()
+
+    # ============== Slots ==============
+
+    async def acquire(self, key: str, ip: str | None = None, cost: float = 1.0) -> None:
+        """Wartet auf einen Slot oder wirft AdmissionRejected. Danach release() aufrufen."""
+        self._check_rate(key, ip)
+
+        if self.in_flight < self.max_in_flight and not self._queued:
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return
+
+        queue = self._queues.get(key)
+        if self._queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_key):
+            self.counters["rejected_queue_full"] += 1
+            raise AdmissionRejected(503, "Der Service ist gerade ausgelastet.", 1)
+
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._active.append(key)
+            self._deficit[key] = 0.0
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, max(cost, DRR_QUANTUM))
+        queue.append(entry)
+        self._queued += 1
+        self.counters["queued"] += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot wurde gleichzeitig zugeteilt - zurückgeben
+                self.release()
+            else:
+                future.cancel()
+                self._remove(key, entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.counters["rejected_timeout"] += 1
+            raise AdmissionRejected(503, "Der Service ist gerade ausgelastet.", 1)
+        self.counters["admitted"] += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: str, ip: str | None = None, cost: float = 1.0) -> AsyncIterator[None]:
+        await self.acquire(key, ip, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ============== Deficit Round Robin ==============
+
+    def _remove(self, key: str, entry: tuple) -> None:
+        queue = self._queues.get(key)
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            self._queued -= 1
+            if not queue:
+                self._drop_key(key)
+
+    def _drop_key(self, key: str) -> None:
+        del self._queues[key]
+        del self._deficit[key]
+        self._active.remove(key)
+
+    def _dispatch(self) -> None:
+        """Verteilt freie Slots: der Key vorne bedient solange sein Defizit reicht, dann der nächste"""
+        while self.in_flight < self.max_in_flight and self._active:
+            key = self._active[0]
+            queue = self._queues[key]
+            future, cost = queue[0]
+            if self._deficit[key] < cost:
+                self._deficit[key] += DRR_QUANTUM
+                self._active.rotate(-1)
+                continue
+
+            queue.popleft()
+            self._queued -= 1
+            self._deficit[key] -= cost
+            self.in_flight += 1
+            future.set_result(None)
+            if not queue:
+                # Leere Queues behalten kein Defizit (Standard-DRR)
+                self._drop_key(key)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self._queued,
+            "waiting_keys": len(self._active),
+            "tracked_buckets": len(self._buckets),
+        }
+
+
+admission = AdmissionController(
+    rate_per_second=settings.admission_rate_per_second,
+    burst=settings.admission_burst,
+    ip_rate_per_second=settings.admission_ip_rate_per_second,
+    ip_burst=settings.admission_ip_burst,
+    max_in_flight=settings.admission_max_in_flight,
+    max_queue=settings.admission_max_queue,
+    max_queue_per_key=settings.admission_max_queue_per_key,
+    queue_timeout=settings.admission_queue_timeout_seconds
+)
+
+
+# Für direktes Testen: ein lauter und zwei leise Clients bei 2 Slots
+if __name__ == "__main__":
+    async def main():
+        controller = AdmissionController(rate_per_second=100, burst=100, max_in_flight=2, max_queue_per_key=50)
+        order = []
+
+        async def request(key: str):
+            async with controller.slot(key):
+                order.append(key)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[request("noisy") for _ in range(20)], request("a"), request("b"), request("a"))
+        print(" ".join(order))
+        print(controller.stats())
+
+    asyncio.run(main())
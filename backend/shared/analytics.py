@@ -0,0 +1,282 @@
+"""
+Analytics Rollups
+Aggregiert Requests und Feedback inkrementell in `analytics_rollups` (pro Minute
+und Stunde), damit Auswertungen nie über agent_requests laufen müssen.
+
+Die Zähler werden im Prozess gesammelt und alle ANALYTICS_FLUSH_SECONDS per Upsert
+addiert - ein Statement pro Flush statt einem Write pro Request, und keine
+Lock-Konkurrenz mehrerer Worker auf derselben Minuten-Zeile bei jedem Request.
+Latenzen landen in festen Histogramm-Buckets, Perzentile werden daraus geschätzt.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from datetime import datetime, timezone
+
+from .config import settings
+from .database import execute_query, open_connection
+from .logger import db_logger
+
+ROLLUP_TABLE = "analytics_rollups"
+GRANULARITIES = ("minute", "hour")
+
+# Obergrenzen der Latenz-Buckets in ms, der letzte Bucket ist offen (> 20000)
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000)
+RISK_LEVELS = ("low", "medium", "high")
+
+_COUNTERS = (
+    "requests", "errors", "escalations", "latency_sum_ms", "input_tokens", "output_tokens",
+    "risk_low", "risk_medium", "risk_high", "feedback_positive", "feedback_negative",
+)
+
+
+def _bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+
+def _empty_row() -> dict:
+    row = {name: 0 for name in _COUNTERS}
+    row["cost_usd"] = 0.0
+    row["latency_max_ms"] = 0
+    row["latency_buckets"] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    return row
+
+
+class RollupAggregator:
+    """Sammelt Zähler pro (Granularität, Bucket, Agent) bis zum nächsten Flush"""
+
+    def __init__(self, flush_seconds: float = 10.0):
+        self.flush_seconds = flush_seconds
+        self._pending: dict[tuple[str, datetime, str], dict] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._conn = None
+
+    def _rows(self, agent: str, moment: datetime | None = None) -> list[dict]:
+        moment = moment or datetime.now(timezone.utc)
+        rows = []
+        for granularity in GRANULARITIES:
+            key = (granularity, _bucket_start(moment, granularity), agent or "unknown")
+            row = self._pending.get(key)
+            if row is None:
+                row = self._pending[key] = _empty_row()
+            rows.append(row)
+        return rows
+
+    def add_request(
+        self,
+        agent: str,
+        latency_ms: int | None,
+        input_tokens: int | None = None,
+        output_tokens: int | None = None,
+        cost_usd: float | None = None,
+        hallucination_risk: str | None = None,
+        escalated: bool = False,
+        error: bool = False
+    ) -> None:
+        latency_ms = int(latency_ms or 0)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+        with self._lock:
+            for row in self._rows(agent):
+                row["requests"] += 1
+                row["errors"] += int(error)
+                row["escalations"] += int(escalated)
+                row["latency_sum_ms"] += latency_ms
+                row["latency_max_ms"] = max(row["latency_max_ms"], latency_ms)
+                row["latency_buckets"][bucket] += 1
+                row["input_tokens"] += input_tokens or 0
+                row["output_tokens"] += output_tokens or 0
+                row["cost_usd"] += float(cost_usd or 0)
+                if hallucination_risk in RISK_LEVELS:
+                    row[f"risk_{hallucination_risk}"] += 1
+        self._flush_if_synchronous()
+
+    def add_feedback(self, agent: str, feedback_type: str) -> None:
+        if feedback_type not in ("positive", "negative"):
+            return
+        with self._lock:
+            for row in self._rows(agent):
+                row[f"feedback_{feedback_type}"] += 1
+        self._flush_if_synchronous()
+
+    def _flush_if_synchronous(self) -> None:
+        if self.flush_seconds <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """Addiert alle gesammelten Zähler in die Rollup-Tabelle, gibt die Anzahl Zeilen zurück"""
+        from psycopg2.extras import execute_values
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        columns = (*_COUNTERS, "cost_usd", "latency_max_ms", "latency_buckets")
+        values = [
+            (granularity, bucket, agent, *(row[name] for name in columns))
+            for (granularity, bucket, agent), row in pending.items()
+        ]
+        updates = ", ".join(
+            [f"{name} = r.{name} + EXCLUDED.{name}" for name in (*_COUNTERS, "cost_usd")]
+            + [
+                "latency_max_ms = GREATEST(r.latency_max_ms, EXCLUDED.latency_max_ms)",
+                "latency_buckets = ARRAY(SELECT a + b FROM unnest(r.latency_buckets, EXCLUDED.latency_buckets) AS t(a, b))",
+            ]
+        )
+
+        try:
+            # Eigene Connection: der Flush-Thread soll keine fremden Transaktionen committen
+            if self._conn is None or self._conn.closed:
+                self._conn = open_connection()
+            conn = self._conn
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    f"""
+                    INSERT INTO {ROLLUP_TABLE} AS r (granularity, bucket_start, agent, {", ".join(columns)})
+                    VALUES %s
+                    ON CONFLICT (granularity, bucket_start, agent) DO UPDATE SET {updates}
+                    """,
+                    values,
+                    page_size=len(values)
+                )
+            conn.commit()
+        except Exception as e:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.rollback()
+            # Zähler zurücklegen, beim nächsten Flush erneut versuchen
+            with self._lock:
+                for key, row in pending.items():
+                    self._merge(key, row)
+            db_logger.warning("Analytics flush failed: %s", e)
+            return 0
+        return len(values)
+
+    def _merge(self, key: tuple, row: dict) -> None:
+        target = self._pending.get(key)
+        if target is None:
+            self._pending[key] = row
+            return
+        for name in (*_COUNTERS, "cost_usd"):
+            target[name] += row[name]
+        target["latency_max_ms"] = max(target["latency_max_ms"], row["latency_max_ms"])
+        target["latency_buckets"] = [a + b for a, b in zip(target["latency_buckets"], row["latency_buckets"])]
+
+    def start(self) -> None:
+        if self._thread is None and self.flush_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stoppt den Flush-Thread und schreibt den Rest"""
+        self._stop.set()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+
+rollups = RollupAggregator(flush_seconds=settings.analytics_flush_seconds)
+
+
+# ============== Abfragen ==============
+
+def estimate_percentile(buckets: list[int], percentile: float, max_ms: int) -> int | None:
+    """Schätzt ein Perzentil aus den Histogramm-Buckets (linear innerhalb des Buckets)"""
+    total = sum(buckets)
+    if total == 0:
+        return None
+    target = total * percentile
+    seen = 0
+    lower = 0
+    for i, count in enumerate(buckets):
+        upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else max(max_ms, lower)
+        if count and seen + count >= target:
+            return int(lower + (upper - lower) * (target - seen) / count)
+        seen += count
+        lower = upper
+    return max_ms
+
+
+def _summarize(row: dict) -> dict:
+    buckets = list(row["latency_buckets"] or [])
+    requests = row["requests"] or 0
+    feedback = (row["feedback_positive"] or 0) + (row["feedback_negative"] or 0)
+    return {
+        "requests": requests,
+        "errors": row["errors"],
+        "escalations": row["escalations"],
+        "latency_ms": {
+            "avg": round(row["latency_sum_ms"] / requests) if requests else None,
+            "p50": estimate_percentile(buckets, 0.50, row["latency_max_ms"]),
+            "p95": estimate_percentile(buckets, 0.95, row["latency_max_ms"]),
+            "p99": estimate_percentile(buckets, 0.99, row["latency_max_ms"]),
+            "max": row["latency_max_ms"],
+        },
+        "input_tokens": row["input_tokens"],
+        "output_tokens": row["output_tokens"],
+        "cost_usd": round(float(row["cost_usd"] or 0), 6),
+        "hallucination_risk": {level: row[f"risk_{level}"] for level in RISK_LEVELS},
+        "feedback": {
+            "positive": row["feedback_positive"],
+            "negative": row["feedback_negative"],
+            "negative_rate": round(row["feedback_negative"] / feedback, 4) if feedback else None,
+        },
+    }
+
+
+def query_rollups(
+    granularity: str = "hour",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    agent: str | None = None
+) -> dict:
+    """Zeitreihe und Summen aus den Rollups (liest nie agent_requests)"""
+    clauses = ["granularity = %s"]
+    params: list = [granularity]
+    if since is not None:
+        clauses.append("bucket_start >= %s")
+        params.append(since)
+    if until is not None:
+        clauses.append("bucket_start < %s")
+        params.append(until)
+    if agent:
+        clauses.append("agent = %s")
+        params.append(agent)
+
+    columns = ", ".join((*_COUNTERS, "cost_usd", "latency_max_ms", "latency_buckets"))
+    rows = execute_query(
+        f"""
+        SELECT bucket_start, {columns}
+        FROM {ROLLUP_TABLE}
+        WHERE {" AND ".join(clauses)}
+        ORDER BY bucket_start
+        """,
+        tuple(params),
+        replica=True
+    ) or []
+
+    # Zeilen mehrerer Agents pro Bucket zusammenfassen
+    buckets: dict[datetime, dict] = {}
+    total = _empty_row()
+    for row in rows:
+        merged = buckets.setdefault(row["bucket_start"], _empty_row())
+        for target in (merged, total):
+            for name in _COUNTERS:
+                target[name] += row[name] or 0
+            target["cost_usd"] += float(row["cost_usd"] or 0)
+            target["latency_max_ms"] = max(target["latency_max_ms"], row["latency_max_ms"] or 0)
+            target["latency_buckets"] = [a + b for a, b in zip(target["latency_buckets"], row["latency_buckets"])]
+
+    return {
+        "granularity": granularity,
+        "agent": agent,
+        "totals": _summarize(total),
+        "series": [{"bucket_start": start, **_summarize(row)} for start, row in buckets.items()],
+    }
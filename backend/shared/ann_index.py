@@ -0,0 +1,329 @@
+"""
+Approximate Nearest Neighbour Index
+IVF-Flat (Inverted File) in reinem NumPy für große Wissensbasen.
+
+Die Vektoren werden per sphärischem k-Means in `nlist` Listen eingeteilt.
+Eine Suche bewertet nur die Vektoren der `nprobe` ähnlichsten Listen exakt.
+Die Listen liegen nach Liste sortiert in einem zusammenhängenden Array, jede Liste
+ist ein Slice davon - bei Snapshots also eine Sicht auf die memmap, ohne Kopie.
+
+add() und delete() ändern diese Basis nicht: gelöschte Zeilen werden in einer Maske
+markiert, neue Vektoren landen in einem kleinen Zusatz-Array mit ihrer Liste.
+compact() bzw. state() führen beides wieder zusammen, ohne neu zu trainieren.
+Die Treffer sind (id, Score) - die ids werden beim Bauen bzw. Hinzufügen übergeben.
+"""
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+from .vector_index import SearchResult, normalize_rows
+
+KMEANS_ITERATIONS = 12
+KMEANS_MAX_TRAINING_POINTS = 50_000
+# Zeilen pro Block beim Zuordnen zu den Centroids (begrenzt die Score-Matrix)
+ASSIGN_BLOCK_ROWS = 8192
+
+
+def default_nlist(n: int) -> int:
+    """Faustregel: ~4 * sqrt(n) Listen"""
+    return max(1, min(n, int(4 * np.sqrt(max(n, 1)))))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nächster Centroid pro Vektor, blockweise berechnet"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Sphärisches k-Means (Kosinus) auf einer Stichprobe der Vektoren"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_MAX_TRAINING_POINTS:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_MAX_TRAINING_POINTS, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = assign_lists(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Leere Listen mit zufälligen Punkten neu starten
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """IVF-Flat Index, Liste i = Zeilen list_offsets[i]:list_offsets[i + 1]"""
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_ids: np.ndarray,
+        list_vectors: np.ndarray,
+        nprobe: int = 8
+    ):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.list_vectors = list_vectors
+        self.nprobe = max(1, nprobe)
+        # Änderungen seit dem Bauen bzw. Laden (siehe add/delete)
+        self._deleted: np.ndarray | None = None
+        self._base_rows: dict[int, int] | None = None
+        self._added_ids = np.empty(0, dtype=np.int64)
+        self._added_lists = np.empty(0, dtype=np.int64)
+        self._added_vectors = np.empty((0, self.centroids.shape[1]), dtype=np.float32)
+
+    @classmethod
+    def build(
+        cls,
+        ids,
+        vectors: np.ndarray,
+        nlist: int | None = None,
+        nprobe: int = 8,
+        normalized: bool = False
+    ) -> "IVFIndex":
+        """Trainiert die Centroids und sortiert die Vektoren nach Liste"""
+        vectors = vectors if normalized else normalize_rows(vectors)
+        centroids = train_centroids(vectors, nlist or default_nlist(len(vectors)))
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=len(centroids))
+        return cls(
+            centroids,
+            list_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            list_ids=np.asarray(ids, dtype=np.int64)[order],
+            list_vectors=vectors[order],
+            nprobe=nprobe
+        )
+
+    def __len__(self) -> int:
+        deleted = int(self._deleted.sum()) if self._deleted is not None else 0
+        return len(self.list_ids) - deleted + len(self._added_ids)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def pending(self) -> int:
+        """Gelöschte und hinzugefügte Vektoren seit dem letzten compact()"""
+        deleted = int(self._deleted.sum()) if self._deleted is not None else 0
+        return deleted + len(self._added_ids)
+
+    @property
+    def scan_nbytes(self) -> int:
+        return self.centroids.nbytes + self.list_vectors.nbytes + self._added_vectors.nbytes
+
+    @property
+    def rescore_nbytes(self) -> int:
+        return 0
+
+    def _list(self, list_no: int) -> slice:
+        return slice(int(self.list_offsets[list_no]), int(self.list_offsets[list_no + 1]))
+
+    # ============== Änderungen ==============
+
+    def copy(self) -> "IVFIndex":
+        """Kopie mit eigenen Änderungen, die Basis-Arrays (ggf. memmaps) werden geteilt"""
+        index = IVFIndex(self.centroids, self.list_offsets, self.list_ids, self.list_vectors, self.nprobe)
+        if self._deleted is not None:
+            index._deleted = self._deleted.copy()
+            index._base_rows = self._base_rows
+        index._added_ids = self._added_ids
+        index._added_lists = self._added_lists
+        index._added_vectors = self._added_vectors
+        return index
+
+    def add(self, ids, vectors: np.ndarray, normalized: bool = False) -> None:
+        """Fügt Vektoren ihrer nächsten Liste hinzu (vorhandene ids werden ersetzt)"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if not len(ids):
+            return
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        vectors = vectors if normalized else normalize_rows(vectors)
+        self.delete(ids)
+        self._added_ids = np.concatenate([self._added_ids, ids])
+        self._added_lists = np.concatenate([self._added_lists, assign_lists(vectors, self.centroids)])
+        self._added_vectors = np.vstack([self._added_vectors, vectors])
+
+    def delete(self, ids) -> int:
+        """Entfernt Vektoren per id, gibt die Anzahl gelöschter zurück"""
+        ids = [int(vector_id) for vector_id in ids]
+        if not ids:
+            return 0
+        if self._base_rows is None:
+            self._base_rows = {int(vector_id): row for row, vector_id in enumerate(self.list_ids.tolist())}
+        if self._deleted is None:
+            self._deleted = np.zeros(len(self.list_ids), dtype=bool)
+
+        removed = 0
+        for vector_id in ids:
+            row = self._base_rows.get(vector_id)
+            if row is not None and not self._deleted[row]:
+                self._deleted[row] = True
+                removed += 1
+
+        keep = ~np.isin(self._added_ids, ids)
+        if not keep.all():
+            removed += int((~keep).sum())
+            self._added_ids = self._added_ids[keep]
+            self._added_lists = self._added_lists[keep]
+            self._added_vectors = self._added_vectors[keep]
+        return removed
+
+    def compact(self) -> "IVFIndex":
+        """Neuer Index mit Basis und Änderungen in einem Array (dieselben Centroids)"""
+        if not self.pending:
+            return self
+        alive = np.ones(len(self.list_ids), dtype=bool) if self._deleted is None else ~self._deleted
+        lengths = np.diff(self.list_offsets)
+        base_lists = np.repeat(np.arange(self.nlist), lengths)[alive]
+
+        lists = np.concatenate([base_lists, self._added_lists])
+        order = np.argsort(lists, kind="stable")
+        counts = np.bincount(lists, minlength=self.nlist)
+        return IVFIndex(
+            self.centroids,
+            list_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            list_ids=np.concatenate([self.list_ids[alive], self._added_ids])[order],
+            list_vectors=np.vstack([self.list_vectors[alive], self._added_vectors])[order],
+            nprobe=self.nprobe
+        )
+
+    def search(self, query, k: int, threshold: float | None = None) -> SearchResult:
+        """Findet die k ähnlichsten Vektoren in den nprobe nächsten Listen"""
+        if len(self) == 0 or k <= 0:
+            return SearchResult()
+
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return SearchResult()
+        query = query / norm
+
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        lists = [self._list(p) for p in probes]
+        lists = [rows for rows in lists if rows.stop > rows.start]
+        id_parts = [self.list_ids[rows] for rows in lists]
+        score_parts = [self.list_vectors[rows] @ query for rows in lists]
+        if self._deleted is not None:
+            alive = [~self._deleted[rows] for rows in lists]
+            id_parts = [part[mask] for part, mask in zip(id_parts, alive)]
+            score_parts = [part[mask] for part, mask in zip(score_parts, alive)]
+        if len(self._added_ids):
+            added = np.isin(self._added_lists, probes)
+            id_parts.append(self._added_ids[added])
+            score_parts.append(self._added_vectors[added] @ query)
+
+        ids = np.concatenate(id_parts) if id_parts else np.empty(0, dtype=np.int64)
+        if not len(ids):
+            return SearchResult()
+        scores = np.concatenate(score_parts)
+
+        top = min(k, len(scores))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        hits = [(int(ids[i]), float(scores[i])) for i in best]
+
+        if threshold is not None:
+            hits = [(vector_id, score) for vector_id, score in hits if score >= threshold]
+            above = int(np.count_nonzero(scores >= threshold))
+        else:
+            above = len(scores)
+        return SearchResult(hits=hits, above_threshold=above)
+
+    # ============== Persistenz ==============
+
+    def state(self) -> tuple[dict, dict[str, np.ndarray]]:
+        """Parameter und Arrays zum Speichern (Änderungen werden vorher zusammengeführt)"""
+        index = self.compact()
+        arrays = {
+            "centroids": index.centroids,
+            "list_offsets": index.list_offsets,
+            "list_ids": index.list_ids,
+            "list_vectors": index.list_vectors,
+        }
+        return {"kind": self.kind, "nprobe": self.nprobe, "dim": self.dim}, arrays
+
+    @classmethod
+    def from_state(cls, params: dict, arrays: dict[str, np.ndarray], **_) -> "IVFIndex":
+        """Übernimmt die Arrays unverändert (bei Snapshots bleiben es geteilte memmaps)"""
+        return cls(
+            arrays["centroids"],
+            list_offsets=arrays["list_offsets"],
+            list_ids=arrays["list_ids"],
+            list_vectors=arrays["list_vectors"],
+            nprobe=params.get("nprobe", 8)
+        )
+
+    def save(self, path: str) -> None:
+        """Speichert den Index als .npz Datei"""
+        params, arrays = self.state()
+        np.savez(path, __params__=np.array(json.dumps(params)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Lädt einen mit save() gespeicherten Index"""
+        with np.load(path) as data:
+            params = json.loads(str(data["__params__"]))
+            arrays = {name: data[name] for name in data.files if name != "__params__"}
+        return cls.from_state(params, arrays)
+
+
+# Benchmark: python -m shared.ann_index --sizes 50000,200000 --nprobe 4,8,16
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from .vector_index import VectorIndex, synthetic_embeddings, recall_at_k
+
+    parser = argparse.ArgumentParser(description="IVF vs. exakte Suche")
+    parser.add_argument("--sizes", default="50000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nprobe", default="4,8,16")
+    # Wie in shared.vector_index: bei 0.03 sind die Queries fast Kopien gespeicherter Vektoren
+    parser.add_argument("--query-noise", type=float, default=0.3)
+    args = parser.parse_args()
+
+    def measure(index, queries) -> float:
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, args.k)
+        return (time.perf_counter() - start) / len(queries) * 1000
+
+    for n in [int(size) for size in args.sizes.split(",")]:
+        vectors = synthetic_embeddings(n, dim=args.dim, clusters=max(64, n // 500))
+        noise = np.random.default_rng(1).standard_normal((args.queries, args.dim), dtype=np.float32)
+        queries = normalize_rows(vectors[:args.queries] + noise * args.query_noise)
+
+        exact = VectorIndex(vectors, normalized=True)
+        print(f"{n} Vektoren x {args.dim} dim, k={args.k}, Query-Rauschen {args.query_noise}")
+        print(f"  exakt            {measure(exact, queries):7.2f} ms/query | recall@{args.k} 1.000")
+
+        start = time.perf_counter()
+        ivf = IVFIndex.build(np.arange(n), vectors, normalized=True)
+        print(f"  IVF build nlist={ivf.nlist}: {time.perf_counter() - start:.1f} s")
+        for nprobe in [int(p) for p in args.nprobe.split(",")]:
+            ivf.nprobe = nprobe
+            latency = measure(ivf, queries)
+            recall = recall_at_k(ivf, vectors, queries, args.k)
+            print(f"  IVF nprobe={nprobe:<4d} {latency:7.2f} ms/query | recall@{args.k} {recall:.3f}")
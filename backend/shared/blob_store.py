@@ -0,0 +1,53 @@
+"""
+Content-Addressed Blob Storage
+Große, sich wiederholende Texte (System-Prompt, FAQ-Kontext) werden nur einmal
+in `prompt_blobs` gespeichert und per Hash referenziert.
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+
+from .database import execute_query
+
+BLOB_TABLE = "prompt_blobs"
+_STORED_CACHE_SIZE = 4096
+
+# Hashes die dieser Prozess bereits geschrieben hat (spart den Upsert-Roundtrip)
+_stored_hashes: OrderedDict[str, None] = OrderedDict()
+
+
+def content_hash(text: str) -> str:
+    """Stabiler Hash eines Textes (BLAKE2b, 128 bit, hex)"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def store_blob(text: str) -> str:
+    """Speichert einen Text einmalig und gibt seinen Hash zurück"""
+    digest = content_hash(text)
+    if digest in _stored_hashes:
+        _stored_hashes.move_to_end(digest)
+        return digest
+
+    execute_query(
+        f"INSERT INTO {BLOB_TABLE} (hash, content) VALUES (%s, %s) ON CONFLICT (hash) DO NOTHING",
+        (digest, text),
+        fetch=False
+    )
+
+    _stored_hashes[digest] = None
+    if len(_stored_hashes) > _STORED_CACHE_SIZE:
+        _stored_hashes.popitem(last=False)
+    return digest
+
+
+def load_blobs(hashes: list[str]) -> dict[str, str]:
+    """Lädt mehrere Blobs auf einmal: {hash: content}"""
+    hashes = list({h for h in hashes if h})
+    if not hashes:
+        return {}
+    rows = execute_query(
+        f"SELECT hash, content FROM {BLOB_TABLE} WHERE hash = ANY(%s)",
+        (hashes,)
+    )
+    return {row["hash"]: row["content"] for row in rows or []}
@@ -3,7 +3,8 @@ Chat Memory Utilities
 """
 from __future__ import annotations
 
-from .config import MAX_RECENT_MESSAGES, MAX_OLDER_MESSAGES
+from .config import settings, MAX_RECENT_MESSAGES, MAX_OLDER_MESSAGES
+from .history_summarizer import lookup_summary, schedule_summary
 
 
 def build_context_messages(
@@ -13,6 +14,10 @@ def build_context_messages(
 ) -> tuple[list[dict], list[dict]]:
     """
     Builds context messages from chat history with smart summarization.
+
+    Older messages are replaced by a cached LLM summary (see history_summarizer),
+    which is refreshed in the background. Messages not yet covered by a summary
+    fall back to keyword topics.
     """
     if not chat_history:
         return [], []
@@ -27,7 +32,27 @@ def build_context_messages(
         older = []
     else:
         recent = chat_history[-max_recent:]
-        older = chat_history[:-max_recent][-max_older:]
+        older = [
+            msg for msg in chat_history[:-max_recent]
+            if msg.get("role") in ("user", "assistant") and msg.get("content")
+        ]
+
+    summary, covered = None, 0
+    if older and settings.history_summary_enabled:
+        summary, covered = lookup_summary(older)
+        schedule_summary(older)
+        older = older[covered:]
+    older = older[-max_older:]
+
+    if summary:
+        messages.append({
+            "role": "system",
+            "content": f"[Zusammenfassung des bisherigen Gesprächs]\n{summary}"
+        })
+        history_summary.append({
+            "role": "system",
+            "content": f"Zusammenfassung: {summary}"
+        })
 
     if older:
         topics = extract_topics(older)
@@ -1,7 +1,11 @@
 """
 Zentrale Konfiguration
+
+Die .env Datei wird genau einmal beim Import dieses Moduls geladen.
+Alle anderen Module lesen ihre Einstellungen aus `settings`.
 """
 import os
+from dataclasses import dataclass, field
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -9,15 +13,170 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _env_int(key: str, default: int) -> int:
+    return int(os.getenv(key, str(default)))
+
+
+def _env_float(key: str, default: float) -> float:
+    return float(os.getenv(key, str(default)))
+
+
+def _env_bool(key: str, default: bool) -> bool:
+    value = os.getenv(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(key: str) -> list[str]:
+    return [item.strip() for item in os.getenv(key, "").split(",") if item.strip()]
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Alle Einstellungen der Anwendung, einmalig aus der Umgebung gelesen"""
+    # LLM
+    default_model: str = "gpt-4o"
+    fast_model: str = "gpt-4o-mini"
+    embedding_model: str = "text-embedding-3-small"
+    llm_timeout_seconds: int = 30
+    openai_api_key: Optional[str] = None
+    embedding_cache_size: int = 1024
+
+    # Zusammenfassung älterer Chat-Nachrichten (FAST_MODEL, im Hintergrund)
+    history_summary_enabled: bool = True
+    history_summary_max_tokens: int = 200
+    history_summary_cache_size: int = 2048
+
+    # Observability
+    log_format: str = "json"
+    log_rate_limit_per_minute: float = 10.0
+    debug_prompt_sample_rate: float = 0.1
+    analytics_flush_seconds: float = 10.0
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "profiles"
+    tracing_exporter: str = ""
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_file: str = "traces.ndjson"
+    trace_sample_rate: float = 1.0
+    tracing_service_name: str = "financial-agents-api"
+
+    # Database
+    database_url: Optional[str] = None
+    database_replica_urls: list[str] = field(default_factory=list)
+    replica_max_lag_seconds: float = 5.0
+    replica_health_check_seconds: float = 10.0
+    replica_check_timeout_seconds: float = 2.0
+    db_connect_timeout_seconds: int = 5
+    db_stream_itersize: int = 2000
+    faq_table: str = "documents"
+    faq_snapshot_dir: str = ""
+    pg_listen_enabled: bool = True
+
+    # Partitionierung und Retention von agent_requests (shared/partitions.py)
+    request_partition_interval: str = "month"
+    request_partitions_ahead: int = 2
+    # Retention ist aus (0), gelöscht wird nur mit absolutem REQUEST_ARCHIVE_DIR
+    request_retention_days: int = 0
+    request_archive_dir: str = ""
+    partition_maintenance_seconds: float = 3600.0
+
+    # Server
+    frontend_urls: list[str] = field(default_factory=list)
+    port: int = 8080
+    startup_import_budget_ms: int = 1000
+    ticket_cache_ttl_seconds: float = 30.0
+    admin_token: str = ""
+    trusted_proxies: list[str] = field(default_factory=list)
+
+    # Admission Control für /chat (shared/admission.py)
+    admission_enabled: bool = True
+    admission_rate_per_second: float = 1.0
+    admission_burst: float = 5
+    # Limit pro IP: aus, solange nicht TRUSTED_PROXIES gesetzt ist (hinter einem Load
+    # Balancer hätten sonst alle Clients dieselbe IP)
+    admission_ip_rate_per_second: float = 0.0
+    admission_ip_burst: float = 20
+    admission_max_in_flight: int = 32
+    admission_max_queue: int = 256
+    admission_max_queue_per_key: int = 4
+    admission_queue_timeout_seconds: float = 10.0
+
+    # Warm-up vor dem ersten Request
+    warmup_enabled: bool = True
+    warmup_top_questions: int = 0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            default_model=os.getenv("DEFAULT_LLM_MODEL", "gpt-4o"),
+            fast_model=os.getenv("FAST_LLM_MODEL", "gpt-4o-mini"),
+            llm_timeout_seconds=_env_int("LLM_TIMEOUT_SECONDS", 30),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            embedding_cache_size=_env_int("EMBEDDING_CACHE_SIZE", 1024),
+            history_summary_enabled=_env_bool("HISTORY_SUMMARY_ENABLED", True),
+            history_summary_max_tokens=_env_int("HISTORY_SUMMARY_MAX_TOKENS", 200),
+            history_summary_cache_size=_env_int("HISTORY_SUMMARY_CACHE_SIZE", 2048),
+            log_format=os.getenv("LOG_FORMAT", "json").strip().lower(),
+            log_rate_limit_per_minute=_env_float("LOG_RATE_LIMIT_PER_MINUTE", 10.0),
+            debug_prompt_sample_rate=_env_float("DEBUG_PROMPT_SAMPLE_RATE", 0.1),
+            analytics_flush_seconds=_env_float("ANALYTICS_FLUSH_SECONDS", 10.0),
+            profile_sample_rate=_env_float("PROFILE_SAMPLE_RATE", 0.0),
+            profile_interval_ms=_env_float("PROFILE_INTERVAL_MS", 5.0),
+            profile_dir=os.getenv("PROFILE_DIR", "profiles"),
+            tracing_exporter=os.getenv("TRACING_EXPORTER", "").strip().lower(),
+            otlp_endpoint=os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+            tracing_file=os.getenv("TRACING_FILE", "traces.ndjson"),
+            trace_sample_rate=_env_float("TRACE_SAMPLE_RATE", 1.0),
+            tracing_service_name=os.getenv("TRACING_SERVICE_NAME", "financial-agents-api"),
+            database_url=os.getenv("DATABASE_URL"),
+            database_replica_urls=_env_list("DATABASE_REPLICA_URLS"),
+            replica_max_lag_seconds=_env_float("REPLICA_MAX_LAG_SECONDS", 5.0),
+            replica_health_check_seconds=_env_float("REPLICA_HEALTH_CHECK_SECONDS", 10.0),
+            replica_check_timeout_seconds=_env_float("REPLICA_CHECK_TIMEOUT_SECONDS", 2.0),
+            db_connect_timeout_seconds=_env_int("DB_CONNECT_TIMEOUT_SECONDS", 5),
+            db_stream_itersize=_env_int("DB_STREAM_ITERSIZE", 2000),
+            faq_table=os.getenv("FAQ_TABLE", "documents"),
+            faq_snapshot_dir=os.getenv("FAQ_SNAPSHOT_DIR", ""),
+            pg_listen_enabled=_env_bool("PG_LISTEN_ENABLED", True),
+            request_partition_interval=os.getenv("REQUEST_PARTITION_INTERVAL", "month"),
+            request_partitions_ahead=_env_int("REQUEST_PARTITIONS_AHEAD", 2),
+            request_retention_days=_env_int("REQUEST_RETENTION_DAYS", 0),
+            request_archive_dir=os.getenv("REQUEST_ARCHIVE_DIR", ""),
+            partition_maintenance_seconds=_env_float("PARTITION_MAINTENANCE_SECONDS", 3600.0),
+            frontend_urls=_env_list("FRONTEND_URL"),
+            port=_env_int("PORT", 8080),
+            startup_import_budget_ms=_env_int("STARTUP_IMPORT_BUDGET_MS", 1000),
+            ticket_cache_ttl_seconds=_env_float("TICKET_CACHE_TTL_SECONDS", 30.0),
+            admin_token=os.getenv("ADMIN_TOKEN", ""),
+            trusted_proxies=_env_list("TRUSTED_PROXIES"),
+            admission_enabled=_env_bool("ADMISSION_ENABLED", True),
+            admission_rate_per_second=_env_float("ADMISSION_RATE_PER_SECOND", 1.0),
+            admission_burst=_env_float("ADMISSION_BURST", 5),
+            admission_ip_rate_per_second=_env_float("ADMISSION_IP_RATE_PER_SECOND", 0.0),
+            admission_ip_burst=_env_float("ADMISSION_IP_BURST", 20),
+            admission_max_in_flight=_env_int("ADMISSION_MAX_IN_FLIGHT", 32),
+            admission_max_queue=_env_int("ADMISSION_MAX_QUEUE", 256),
+            admission_max_queue_per_key=_env_int("ADMISSION_MAX_QUEUE_PER_KEY", 4),
+            admission_queue_timeout_seconds=_env_float("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10.0),
+            warmup_enabled=_env_bool("WARMUP_ENABLED", True),
+            warmup_top_questions=_env_int("WARMUP_TOP_QUESTIONS", 0),
+        )
+
+
+settings = Settings.from_env()
+
+
 # =============================================================================
 # LLM Models
 # =============================================================================
-DEFAULT_MODEL = os.getenv("DEFAULT_LLM_MODEL", "gpt-4o")
-FAST_MODEL = os.getenv("FAST_LLM_MODEL", "gpt-4o-mini")
-EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_MODEL = settings.default_model
+FAST_MODEL = settings.fast_model
+EMBEDDING_MODEL = settings.embedding_model
 
 # LLM Request Timeout (Sekunden)
-LLM_TIMEOUT_SECONDS = int(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_TIMEOUT_SECONDS = settings.llm_timeout_seconds
 
 # Chat History / Memory Settings
 MAX_RECENT_MESSAGES = 4
@@ -37,14 +196,19 @@ PRICING = {
 # =============================================================================
 # Database Configuration
 # =============================================================================
-DATABASE_URL = os.getenv("DATABASE_URL")
-FAQ_TABLE = os.getenv("FAQ_TABLE", "documents")
+DATABASE_URL = settings.database_url
+FAQ_TABLE = settings.faq_table
+
+# NOTIFY-Channel: FAQ-Daten haben sich geändert (ingest_faqs.py -> laufende Server)
+FAQ_CHANGED_CHANNEL = "faq_changed"
+# NOTIFY-Channel: Ticket erstellt/geändert (Payload: kleines JSON-Delta für /tickets/stream)
+TICKETS_CHANGED_CHANNEL = "tickets_changed"
 
 
 # =============================================================================
 # API Keys
 # =============================================================================
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = settings.openai_api_key
 
 
 # =============================================================================
@@ -54,8 +218,11 @@ def validate_config() -> None:
     """
     Prüft ob alle erforderlichen Umgebungsvariablen gesetzt sind.
     """
-    required = ["OPENAI_API_KEY", "DATABASE_URL"]
-    missing = [var for var in required if not os.getenv(var)]
+    required = {
+        "OPENAI_API_KEY": settings.openai_api_key,
+        "DATABASE_URL": settings.database_url,
+    }
+    missing = [var for var, value in required.items() if not value]
 
     if missing:
         raise EnvironmentError(
@@ -3,30 +3,315 @@ PostgreSQL Database Client
 """
 from __future__ import annotations
 
-import os
-import json
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from dotenv import load_dotenv
-
-load_dotenv()
-
+import contextvars
+import itertools
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+from .config import settings
+from .logger import db_logger
+from .query_compiler import (
+    CompiledStatement,
+    compile_bulk_insert,
+    compile_insert,
+    compile_select,
+    compile_update,
+    forget_prepared,
+    mark_prepared,
+)
+from . import fast_json
+from . import tracing
+
+# psycopg2 wird erst beim ersten DB-Zugriff importiert (schnellerer Server-Start)
 _connection = None
 
+# Zeilen pro INSERT-Statement bei Bulk-Inserts
+BULK_CHUNK_SIZE = 1000
+
+
+def open_connection(
+    url: str | None = None,
+    autocommit: bool = False,
+    statement_timeout_ms: int | None = None
+):
+    """
+    Neue, eigene Connection (Default: Primary) - z.B. für Hintergrund-Threads.
+    Der Verbindungsaufbau bricht nach DB_CONNECT_TIMEOUT_SECONDS ab.
+    """
+    import psycopg2
+    from psycopg2.extras import register_default_json, register_default_jsonb
+
+    url = url or settings.database_url
+    if not url:
+        raise ValueError("DATABASE_URL muss in .env gesetzt sein")
+    options = {"connect_timeout": settings.db_connect_timeout_seconds}
+    if statement_timeout_ms:
+        options["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    conn = psycopg2.connect(url, **options)
+    conn.autocommit = autocommit
+    register_default_json(conn, loads=fast_json.loads)
+    register_default_jsonb(conn, loads=fast_json.loads)
+    return conn
+
 
 def get_connection():
-    """Gibt die PostgreSQL Connection zurück (Singleton Pattern)"""
+    """Gibt die PostgreSQL Connection zum Primary zurück (Singleton Pattern)"""
     global _connection
     if _connection is None or _connection.closed:
-        database_url = os.getenv("DATABASE_URL")
-        if not database_url:
-            raise ValueError("DATABASE_URL muss in .env gesetzt sein")
-        _connection = psycopg2.connect(database_url)
+        _connection = open_connection()
     return _connection
 
 
-def execute_query(query: str, params: tuple = None, fetch: bool = True) -> list[dict] | None:
-    """Führt eine SQL-Query aus und gibt Ergebnisse als Liste von Dicts zurück"""
+# ============== Read Replicas ==============
+#
+# SELECTs aus SupabaseCompatTable laufen round-robin über DATABASE_REPLICA_URLS.
+# Ein Hintergrund-Thread prüft jede Replica alle REPLICA_HEALTH_CHECK_SECONDS über
+# eine eigene Connection (mit connect_timeout und statement_timeout); ist sie nicht
+# erreichbar oder hängt sie mehr als REPLICA_MAX_LAG_SECONDS hinterher, wird sie
+# übersprungen. Requests lesen nur den gecachten Status und warten nie auf einen Check.
+# Ohne gesunde Replica wird vom Primary gelesen.
+
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag
+"""
+
+# Read-your-writes: True = Lesezugriffe im aktuellen Kontext gehen an den Primary
+_force_primary: contextvars.ContextVar[bool] = contextvars.ContextVar("force_primary", default=False)
+
+
+def _close_quietly(conn) -> None:
+    if conn is not None and not conn.closed:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class _Replica:
+    def __init__(self, url: str):
+        self.url = url
+        # Connection für Lesezugriffe und eine eigene für den Health Check
+        self.connection = None
+        self.check_connection = None
+        self.healthy = False
+        self.lag: float | None = None
+        self.checked_at = 0.0
+        self.error: str | None = None
+
+
+class ReplicaRouter:
+    """Verteilt Lesezugriffe auf gesunde Read-Replicas (round-robin), Health Checks im Hintergrund"""
+
+    def __init__(self, urls: list[str], max_lag: float, check_interval: float, check_timeout: float = 2.0):
+        self.replicas = [_Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ============== Health Checks (Hintergrund-Thread) ==============
+
+    def start(self) -> None:
+        """Startet den Health-Check-Thread (erster Check sofort)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            self.check_all()
+            if self._stop.wait(self.check_interval):
+                return
+
+    def check_all(self) -> None:
+        """Prüft alle Replicas nacheinander (blockiert, nur aus dem Health-Check-Thread)"""
+        for replica in self.replicas:
+            self._check(replica)
+
+    def _check(self, replica: _Replica) -> None:
+        replica.checked_at = time.monotonic()
+        try:
+            if replica.check_connection is None or replica.check_connection.closed:
+                replica.check_connection = open_connection(
+                    replica.url,
+                    autocommit=True,
+                    statement_timeout_ms=int(self.check_timeout * 1000)
+                )
+            with replica.check_connection.cursor() as cur:
+                cur.execute(REPLICA_LAG_QUERY)
+                lag = float(cur.fetchone()[0])
+            replica.lag = lag
+            if lag > self.max_lag:
+                self._disable(replica, f"lag {lag:.1f}s")
+                return
+            # Die Lese-Connection wird hier aufgebaut, nicht im Request
+            if replica.connection is None or replica.connection.closed:
+                replica.connection = open_connection(replica.url, autocommit=True)
+            with self._lock:
+                replica.healthy = True
+                replica.error = None
+        except Exception as e:
+            _close_quietly(replica.check_connection)
+            replica.check_connection = None
+            self._disable(replica, str(e))
+
+    def _disable(self, replica: _Replica, error: str) -> None:
+        with self._lock:
+            if replica.healthy:
+                db_logger.warning("Read replica disabled: %s", error)
+            replica.healthy = False
+            replica.error = error
+            conn, replica.connection = replica.connection, None
+        _close_quietly(conn)
+
+    # ============== Routing (Requests) ==============
+
+    def _next_healthy(self) -> _Replica | None:
+        """Nächste gesunde Replica laut letztem Check - ohne I/O"""
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy and replica.connection is not None:
+                    return replica
+        return None
+
+    def connection(self):
+        """Connection zur nächsten gesunden Replica, None wenn keine verfügbar ist"""
+        replica = self._next_healthy()
+        return replica.connection if replica else None
+
+    def url(self) -> str | None:
+        """URL der nächsten gesunden Replica (für eigene Connections, z.B. Streaming)"""
+        replica = self._next_healthy()
+        return replica.url if replica else None
+
+    def mark_failed(self, conn, error: str) -> None:
+        """Nimmt die Replica einer fehlgeschlagenen Connection bis zum nächsten Check raus"""
+        for replica in self.replicas:
+            if replica.connection is conn:
+                self._disable(replica, error)
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "healthy": r.healthy,
+                "lag_seconds": r.lag,
+                "error": r.error,
+                "checked_seconds_ago": round(now - r.checked_at, 1) if r.checked_at else None,
+            }
+            for r in self.replicas
+        ]
+
+
+_router: ReplicaRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_replica_router() -> ReplicaRouter | None:
+    """Router für DATABASE_REPLICA_URLS (startet beim ersten Aufruf den Health Check), sonst None"""
+    global _router
+    if _router is not None or not settings.database_replica_urls:
+        return _router
+    with _router_lock:
+        if _router is None:
+            _router = ReplicaRouter(
+                settings.database_replica_urls,
+                max_lag=settings.replica_max_lag_seconds,
+                check_interval=settings.replica_health_check_seconds,
+                check_timeout=settings.replica_check_timeout_seconds
+            )
+            _router.start()
+    return _router
+
+
+@contextmanager
+def use_primary():
+    """
+    Read-your-writes: alle Lesezugriffe im Block gehen an den Primary.
+
+        with use_primary():
+            ticket = supabase.table("support_tickets").select("*").eq("id", 1).single().execute()
+    """
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+def _execute_on_replica(query: str, params: tuple | None) -> list[dict] | None:
+    """Führt einen SELECT auf einer Replica aus, None wenn keine verfügbar ist bzw. sie ausfällt"""
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    router = get_replica_router()
+    if router is None or _force_primary.get():
+        return None
+    conn = router.connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            return [dict(row) for row in cur.fetchall()]
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        router.mark_failed(conn, str(e))
+        return None
+
+
+def _adapt_params(values) -> tuple:
+    """Wrappt dicts/lists als JSON (für JSONB-Spalten) mit dem schnellen Serializer"""
+    from psycopg2.extras import Json
+
+    return tuple(
+        Json(v, dumps=fast_json.dumps) if isinstance(v, (dict, list)) else v
+        for v in values
+    )
+
+
+def warm_up_connection() -> None:
+    """Öffnet die DB-Verbindung vorab und prüft sie mit einem Roundtrip"""
+    execute_query("SELECT 1")
+
+
+def notify(channel: str, payload: str = "") -> None:
+    """Sendet eine Postgres NOTIFY Nachricht an alle Listener (z.B. laufende Server)"""
+    execute_query("SELECT pg_notify(%s, %s)", (channel, payload), fetch=False)
+
+
+def execute_query(
+    query: str,
+    params: tuple = None,
+    fetch: bool = True,
+    replica: bool = False
+) -> list[dict] | None:
+    """
+    Führt eine SQL-Query aus und gibt Ergebnisse als Liste von Dicts zurück.
+    Mit `replica=True` darf ein reiner SELECT von einer Read-Replica gelesen werden.
+    """
+    from psycopg2.extras import RealDictCursor
+
+    if replica and fetch:
+        rows = _execute_on_replica(query, params)
+        if rows is not None:
+            return rows
+
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -40,41 +325,207 @@ def execute_query(query: str, params: tuple = None, fetch: bool = True) -> list[
         raise e
 
 
-def execute_insert(table: str, data: dict) -> dict | None:
-    """Fügt einen Datensatz ein und gibt ihn zurück"""
-    columns = ", ".join(data.keys())
-    placeholders = ", ".join(["%s"] * len(data))
-    query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING *"
+def _run_compiled(conn, statement: CompiledStatement, params: tuple, fetch: bool) -> list[dict]:
+    """
+    Führt ein kompiliertes Statement aus (ab PREPARE_THRESHOLD als Prepared Statement).
+    Ändert sich das Ergebnis-Schema eines vorbereiteten SELECT *, wird es neu vorbereitet.
+    """
+    from psycopg2 import errors
+    from psycopg2.extras import RealDictCursor
+
+    text, prepare = statement.statement_for(conn, len(params))
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if prepare:
+            cur.execute(prepare)
+            mark_prepared(conn, statement)
+        try:
+            cur.execute(text, params)
+        except errors.FeatureNotSupported:
+            # "cached plan must not change result type" nach einer Schema-Änderung
+            if prepare is None and text == statement.text(conn):
+                raise
+            conn.rollback()
+            cur.execute(f"DEALLOCATE {statement.name}")
+            forget_prepared(conn, statement)
+            cur.execute(statement.text(conn), params)
+        return [dict(row) for row in cur.fetchall()] if fetch else []
+
+
+def execute_compiled(
+    statement: CompiledStatement,
+    params: tuple = (),
+    fetch: bool = True,
+    replica: bool = False
+) -> list[dict]:
+    """
+    Führt ein Statement aus query_compiler aus.
+    SELECTs mit `replica=True` dürfen von einer Read-Replica gelesen werden,
+    alles andere läuft auf dem Primary und wird committed.
+    """
+    import psycopg2
+
+    router = get_replica_router() if replica and not _force_primary.get() else None
+    conn = router.connection() if router else None
+    if conn is not None:
+        try:
+            return _run_compiled(conn, statement, params, fetch=True)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            router.mark_failed(conn, str(e))
 
     conn = get_connection()
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, tuple(data.values()))
-            result = cur.fetchone()
+        rows = _run_compiled(conn, statement, params, fetch)
+        if not replica:
             conn.commit()
-            return dict(result) if result else None
+        return rows
     except Exception as e:
         conn.rollback()
         raise e
 
 
-def execute_update(table: str, data: dict, where: str, where_params: tuple) -> dict | None:
-    """Aktualisiert einen Datensatz und gibt ihn zurück"""
-    set_clause = ", ".join([f"{k} = %s" for k in data.keys()])
-    query = f"UPDATE {table} SET {set_clause} WHERE {where} RETURNING *"
+def iter_query(
+    query: str,
+    params: tuple = None,
+    itersize: int | None = None,
+    replica: bool = True
+) -> Iterator[dict]:
+    """
+    Streamt die Ergebnisse eines SELECT zeilenweise über einen Server-Side Cursor.
+    Es werden nur `itersize` Zeilen auf einmal übertragen, der Speicher bleibt konstant.
+
+    Läuft auf einer eigenen read-only Connection (Replica wenn verfügbar), damit
+    lange Exporte weder die geteilte Connection blockieren noch von deren Commits
+    abgebrochen werden. Die Connection wird geschlossen sobald der Generator endet.
+    """
+    from psycopg2.extras import RealDictCursor
+
+    router = get_replica_router() if replica and not _force_primary.get() else None
+    conn = open_connection(router.url() if router else None)
+    try:
+        conn.set_session(readonly=True)
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = itersize or settings.db_stream_itersize
+            cur.execute(query, params)
+            for row in cur:
+                yield dict(row)
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def execute_bulk_insert(
+    table: str,
+    rows: list[dict],
+    returning: str | None = "*",
+    on_conflict: str | None = None,
+    ignore_duplicates: bool = False,
+    chunk_size: int = BULK_CHUNK_SIZE
+) -> list[dict]:
+    """
+    Fügt viele Datensätze als Multi-Row INSERT ein (execute_values, `chunk_size`
+    Zeilen pro Statement), alle Chunks in einer Transaktion.
+
+    Zeilen mit unterschiedlichen Keys laufen als getrennte Statements - fehlende Spalten
+    bekommen so ihren DEFAULT (bzw. bleiben beim Upsert unverändert) statt NULL.
+    `on_conflict` ("id" oder "a, b") macht daraus einen Upsert: die übrigen Spalten
+    werden aktualisiert, mit `ignore_duplicates` bleiben vorhandene Zeilen unverändert.
+    `returning` wählt die zurückgegebenen Spalten, None gibt nichts zurück (schneller).
+    Die Ergebnisse kommen in der Reihenfolge von `rows` (außer wenn Zeilen übersprungen werden).
+    """
+    from psycopg2.extras import RealDictCursor, execute_values
+
+    if not rows:
+        return []
+
+    # Spaltensatz -> (Spalten in Reihenfolge der ersten Zeile, Positionen in rows)
+    groups: dict[frozenset, tuple[tuple[str, ...], list[int]]] = {}
+    for position, row in enumerate(rows):
+        group = groups.get(frozenset(row))
+        if group is None:
+            group = groups[frozenset(row)] = (tuple(row), [])
+        group[1].append(position)
+
+    conflict_columns = tuple(column.strip() for column in on_conflict.split(",")) if on_conflict else ()
 
     conn = get_connection()
     try:
+        results: list = [None] * len(rows)
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, tuple(data.values()) + where_params)
-            result = cur.fetchone()
-            conn.commit()
-            return dict(result) if result else None
+            for columns, positions in groups.values():
+                statement = compile_bulk_insert(table, columns, returning, conflict_columns, ignore_duplicates)
+                fetched = execute_values(
+                    cur,
+                    statement.text(conn),
+                    [_adapt_params(rows[position][column] for column in columns) for position in positions],
+                    page_size=chunk_size,
+                    fetch=bool(returning)
+                )
+                if not returning:
+                    continue
+                if len(fetched) == len(positions):
+                    for position, row in zip(positions, fetched):
+                        results[position] = dict(row)
+                else:
+                    # DO NOTHING hat Zeilen übersprungen - Zuordnung nicht mehr eindeutig
+                    results.extend(dict(row) for row in fetched)
+        conn.commit()
+        return [row for row in results if row is not None]
     except Exception as e:
         conn.rollback()
         raise e
 
 
+# ============== Embedding Codec ==============
+#
+# Binärformat für Embeddings in BYTEA-Spalten (little-endian):
+#   magic "EMB1" | uint16 header_len | uint16 dtype (1 = float32) | uint32 dim | model (utf-8)
+#   | Padding auf 8 Byte | dim * float32
+# Der Header ist 8-Byte-aligned, damit np.frombuffer ohne Kopie direkt auf den Bytes arbeitet.
+
+EMBEDDING_MAGIC = b"EMB1"
+_EMBEDDING_HEADER = struct.Struct("<4sHHI")
+_DTYPE_FLOAT32 = 1
+
+
+def encode_embedding(vector, model: str = "") -> bytes:
+    """Kodiert ein Embedding als float32 BYTEA mit Modell/Dimension im Header"""
+    import numpy as np
+
+    payload = np.asarray(vector, dtype="<f4")
+    model_bytes = model.encode("utf-8")
+    header_len = _EMBEDDING_HEADER.size + len(model_bytes)
+    header_len += -header_len % 8
+    header = _EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, header_len, _DTYPE_FLOAT32, payload.shape[0]) + model_bytes
+    return header.ljust(header_len, b"\0") + payload.tobytes()
+
+
+def decode_embedding(raw):
+    """
+    Dekodiert ein Embedding zu (np.ndarray float32, model | None).
+    Unterstützt das Binärformat (ohne Kopie) und das alte Textformat "[0.1,0.2,...]".
+    Gibt (None, None) zurück wenn nichts Gültiges vorliegt.
+    """
+    import numpy as np
+
+    if raw is None:
+        return None, None
+    try:
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            magic, header_len, dtype, dim = _EMBEDDING_HEADER.unpack_from(raw)
+            if magic != EMBEDDING_MAGIC or dtype != _DTYPE_FLOAT32:
+                return None, None
+            model = bytes(raw[_EMBEDDING_HEADER.size:header_len]).rstrip(b"\0").decode("utf-8") or None
+            return np.frombuffer(raw, dtype="<f4", count=dim, offset=header_len), model
+        if isinstance(raw, str):
+            if not raw.strip("[] "):
+                return None, None
+            return np.array(raw.strip("[]").split(","), dtype=np.float32), None
+        vector = np.asarray(raw, dtype=np.float32)
+        return (vector, None) if vector.size else (None, None)
+    except (ValueError, TypeError, struct.error):
+        return None, None
+
+
 # Kompatibilitäts-Wrapper für bestehenden Code
 class SupabaseCompatTable:
     """Wrapper der Supabase-ähnliche Syntax auf psycopg2 mappt"""
@@ -82,19 +533,20 @@ class SupabaseCompatTable:
     def __init__(self, table_name: str):
         self.table_name = table_name
         self._select_columns = "*"
-        self._where_clauses = []
+        self._where_columns = []
         self._where_params = []
         self._order_by = None
         self._order_desc = False
         self._limit_val = None
         self._single = False
+        self._primary = False
 
     def select(self, columns: str = "*"):
         self._select_columns = columns
         return self
 
     def eq(self, column: str, value):
-        self._where_clauses.append(f"{column} = %s")
+        self._where_columns.append(column)
         self._where_params.append(value)
         return self
 
@@ -111,8 +563,35 @@ class SupabaseCompatTable:
         self._single = True
         return self
 
-    def insert(self, data: dict):
-        self._insert_data = data
+    def primary(self):
+        """Liest vom Primary statt von einer Replica (read-your-writes)"""
+        self._primary = True
+        return self
+
+    def insert(self, data: dict | list[dict], returning: str | None = "*", chunk_size: int = BULK_CHUNK_SIZE):
+        """
+        Einzelner Datensatz oder Liste (Multi-Row INSERT in einer Transaktion).
+        `returning` wählt die Spalten im Ergebnis, None liefert keine Daten zurück.
+        """
+        self._insert_data = [data] if isinstance(data, dict) else list(data)
+        self._returning = returning
+        self._chunk_size = chunk_size
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        return self
+
+    def upsert(
+        self,
+        data: dict | list[dict],
+        on_conflict: str = "id",
+        ignore_duplicates: bool = False,
+        returning: str | None = "*",
+        chunk_size: int = BULK_CHUNK_SIZE
+    ):
+        """INSERT ... ON CONFLICT (on_conflict) DO UPDATE bzw. DO NOTHING"""
+        self.insert(data, returning=returning, chunk_size=chunk_size)
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
         return self
 
     def update(self, data: dict):
@@ -120,34 +599,63 @@ class SupabaseCompatTable:
         return self
 
     def execute(self):
+        if not tracing.enabled():
+            return self._execute()
+
+        operation = "insert" if hasattr(self, '_insert_data') else "update" if hasattr(self, '_update_data') else "select"
+        with tracing.span(f"db.{operation} {self.table_name}", kind="client") as span:
+            span.set_attributes({
+                "db.system": "postgresql",
+                "db.operation": operation,
+                "db.sql.table": self.table_name,
+                "db.replica_allowed": operation == "select" and not self._primary,
+            })
+            result = self._execute()
+            data = result.data
+            span.set_attribute("db.rows", len(data) if isinstance(data, list) else int(data is not None))
+            return result
+
+    def _execute(self):
         # INSERT
         if hasattr(self, '_insert_data'):
-            result = execute_insert(self.table_name, self._insert_data)
-            return _SupabaseResult([result] if result else [])
+            if len(self._insert_data) == 1 and not self._on_conflict:
+                row = self._insert_data[0]
+                statement = compile_insert(self.table_name, tuple(row), self._returning)
+                results = execute_compiled(statement, _adapt_params(row.values()), fetch=bool(self._returning))
+                return _SupabaseResult(results)
+
+            results = execute_bulk_insert(
+                self.table_name,
+                self._insert_data,
+                returning=self._returning,
+                on_conflict=self._on_conflict,
+                ignore_duplicates=self._ignore_duplicates,
+                chunk_size=self._chunk_size
+            )
+            return _SupabaseResult(results)
 
         # UPDATE
         if hasattr(self, '_update_data'):
-            if not self._where_clauses:
+            if not self._where_columns:
                 raise ValueError("UPDATE ohne WHERE nicht erlaubt")
-            where = " AND ".join(self._where_clauses)
-            result = execute_update(self.table_name, self._update_data, where, tuple(self._where_params))
-            return _SupabaseResult([result] if result else [])
+            statement = compile_update(self.table_name, tuple(self._update_data), tuple(self._where_columns))
+            results = execute_compiled(
+                statement,
+                _adapt_params(self._update_data.values()) + tuple(self._where_params)
+            )
+            return _SupabaseResult(results[:1])
 
         # SELECT
-        query = f"SELECT {self._select_columns} FROM {self.table_name}"
-
-        if self._where_clauses:
-            query += " WHERE " + " AND ".join(self._where_clauses)
-
-        if self._order_by:
-            query += f" ORDER BY {self._order_by}"
-            if self._order_desc:
-                query += " DESC"
-
-        if self._limit_val:
-            query += f" LIMIT {self._limit_val}"
-
-        results = execute_query(query, tuple(self._where_params) if self._where_params else None)
+        statement = compile_select(
+            self.table_name,
+            self._select_columns,
+            where=tuple(self._where_columns),
+            order_by=self._order_by,
+            desc=self._order_desc,
+            limit=bool(self._limit_val)
+        )
+        params = tuple(self._where_params) + ((self._limit_val,) if self._limit_val else ())
+        results = execute_compiled(statement, params, replica=not self._primary)
 
         if self._single:
             return _SupabaseResult(results[:1] if results else [], single=True)
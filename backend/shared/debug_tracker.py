@@ -4,14 +4,16 @@ Trackt Timing, Tokens und Kosten für jeden Request
 """
 from __future__ import annotations
 
+import random
 import time
 import uuid
 from datetime import datetime
 from typing import Any
-from dataclasses import dataclass, field
 
 from .grounding_tracker import GroundingInfo
-from .config import PRICING
+from .config import PRICING, settings
+from .logger import bind_request_id
+from . import tracing
 
 
 def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
@@ -22,74 +24,124 @@ def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     return round(input_cost + output_cost, 6)
 
 
-@dataclass
 class DebugStep:
     """Ein einzelner Schritt im Debug-Flow"""
-    name: str
-    start_time: float = field(default_factory=time.time)
-    end_time: float | None = None
-    data: dict = field(default_factory=dict)
+    __slots__ = ("name", "start_ns", "end_ns", "data")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: int | None = None
+        self.data: dict | None = None
 
     def stop(self, data: dict | None = None):
-        self.end_time = time.time()
+        self.end_ns = time.perf_counter_ns()
         if data:
+            if self.data is None:
+                self.data = {}
             self.data.update(data)
+            # Schritt-Daten auch als Attribute am aktuellen Span (z.B. search_faqs)
+            tracing.current_span().set_attributes({
+                f"{self.name}.{key}": value for key, value in data.items()
+                if isinstance(value, (str, int, float, bool))
+            })
 
     @property
     def duration_ms(self) -> int:
-        if self.end_time:
-            return int((self.end_time - self.start_time) * 1000)
+        if self.end_ns:
+            return (self.end_ns - self.start_ns) // 1_000_000
         return 0
 
     def to_dict(self) -> dict:
-        return {
-            "name": self.name,
-            "duration_ms": self.duration_ms,
-            **self.data
-        }
+        result = {"name": self.name, "duration_ms": self.duration_ms}
+        if self.data:
+            result.update(self.data)
+        return result
 
 
-@dataclass
-class LLMCallInfo:
-    """Informationen zu einem LLM-Call"""
-    model: str = ""
-    system_prompt: str = ""
-    user_prompt: str = ""
-    response: str = ""
-    input_tokens: int = 0
-    output_tokens: int = 0
-    cost_usd: float = 0.0
-    response_time_ms: int = 0
+def _truncate(text: str, limit: int) -> str:
+    return text[:limit] + "..." if len(text) > limit else text
 
-    def to_dict(self) -> dict:
-        return {
-            "model": self.model,
-            "system_prompt": self.system_prompt[:500] + "..." if len(self.system_prompt) > 500 else self.system_prompt,
-            "user_prompt": self.user_prompt[:1000] + "..." if len(self.user_prompt) > 1000 else self.user_prompt,
+
+class LLMCallInfo:
+    """
+    Informationen zu einem LLM-Call.
+    Prompts werden nur als Referenz gehalten und erst beim Serialisieren gekürzt.
+    """
+    __slots__ = (
+        "model", "system_prompt", "user_prompt", "context", "response",
+        "input_tokens", "output_tokens", "cost_usd", "response_time_ms",
+    )
+
+    def __init__(
+        self,
+        model: str = "",
+        system_prompt: str = "",
+        user_prompt: str = "",
+        response: str = "",
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cost_usd: float = 0.0,
+        response_time_ms: int = 0,
+        context: str = ""
+    ):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.context = context
+        self.response = response
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cost_usd = cost_usd
+        self.response_time_ms = response_time_ms
+
+    def to_dict(self, include_prompts: bool = True) -> dict:
+        result = {"model": self.model}
+        if include_prompts:
+            result["system_prompt"] = _truncate(self.system_prompt, 500)
+            result["user_prompt"] = _truncate(self.user_prompt, 1000)
+        result.update({
             "input_tokens": self.input_tokens,
             "output_tokens": self.output_tokens,
             "cost_usd": self.cost_usd,
-            "response_time_ms": self.response_time_ms
-        }
+            "response_time_ms": self.response_time_ms,
+            "prompts_captured": include_prompts,
+        })
+        return result
 
 
 class DebugTracker:
-    """Trackt alle Schritte eines Agent-Requests für Debug-Zwecke."""
+    """
+    Trackt alle Schritte eines Agent-Requests für Debug-Zwecke.
+
+    Metriken (Timing, Tokens, Kosten, Grounding) werden immer erfasst.
+    Prompt-Payloads landen nur bei einem Teil der Requests im Ergebnis
+    (DEBUG_PROMPT_SAMPLE_RATE), bei Fehlern, Eskalationen und expliziten
+    Debug-Requests immer. Nach `finish()` ist das Ergebnis eingefroren und
+    `to_dict()` serialisiert nur einmal.
+    """
 
     def __init__(self, agent: str):
         self.request_id = f"req_{uuid.uuid4().hex[:8]}"
+        bind_request_id(self.request_id)
+        self.trace_id = tracing.current_span().trace_id
         self.agent = agent
         self.timestamp = datetime.utcnow().isoformat() + "Z"
-        self.start_time = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: int | None = None
         self.steps: list[DebugStep] = []
         self.llm_call: LLMCallInfo | None = None
         self.chat_history_used: list[dict] = []
         self.extra_data: dict[str, Any] = {}
         self.grounding = GroundingInfo()
+        self.capture_payloads = random.random() < settings.debug_prompt_sample_rate
+        self.profiler = None
+        self.profile: dict | None = None
+        self._serialized: dict | None = None
 
     def start_step(self, name: str) -> DebugStep:
         """Startet einen neuen Tracking-Schritt"""
-        step = DebugStep(name=name)
+        step = DebugStep(name)
         self.steps.append(step)
         return step
 
@@ -101,9 +153,13 @@ class DebugTracker:
         response: str,
         input_tokens: int,
         output_tokens: int,
-        response_time_ms: int
+        response_time_ms: int,
+        context: str = ""
     ):
-        """Trackt einen LLM-Call mit allen Details"""
+        """
+        Trackt einen LLM-Call mit allen Details.
+        `context` ist der Präfix des User-Prompts der sich über Requests wiederholt (FAQ-Kontext).
+        """
         self.llm_call = LLMCallInfo(
             model=model,
             system_prompt=system_prompt,
@@ -112,7 +168,8 @@ class DebugTracker:
             input_tokens=input_tokens,
             output_tokens=output_tokens,
             cost_usd=calculate_cost(model, input_tokens, output_tokens),
-            response_time_ms=response_time_ms
+            response_time_ms=response_time_ms,
+            context=context
         )
 
     def set_chat_history(self, history: list[dict]):
@@ -123,30 +180,65 @@ class DebugTracker:
         """Fügt zusätzliche Debug-Daten hinzu"""
         self.extra_data[key] = value
 
+    def start_profiling(self):
+        """Startet CPU-Sampling und tracemalloc bis finish() (siehe shared/profiling.py)"""
+        from .profiling import RequestProfiler
+
+        if self.profiler is None:
+            self.profiler = RequestProfiler().start()
+
+    def stop_profiling(self):
+        """Stoppt ein laufendes Profil (mehrfach aufrufbar, auch nach Abbruch des Requests)"""
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            self.profile = profiler.stop()
+
+    def force_capture(self):
+        """Erzwingt das Speichern der Prompts (Fehler, Eskalation, Debug-Request)"""
+        self.capture_payloads = True
+
+    def finish(self) -> dict:
+        """Stoppt die Zeitmessung und friert das serialisierte Ergebnis ein"""
+        if self._serialized is None:
+            self.end_ns = time.perf_counter_ns()
+            self.stop_profiling()
+            self._serialized = self._build_dict()
+        return self._serialized
+
     @property
     def total_time_ms(self) -> int:
         """Gesamtzeit des Requests in Millisekunden"""
-        return int((time.time() - self.start_time) * 1000)
+        end_ns = self.end_ns or time.perf_counter_ns()
+        return (end_ns - self.start_ns) // 1_000_000
 
     def to_dict(self) -> dict:
-        """Gibt alle Debug-Infos als Dictionary zurück"""
+        """Gibt alle Debug-Infos als Dictionary zurück (nach finish() gecacht)"""
+        if self._serialized is not None:
+            return self._serialized
+        return self._build_dict()
+
+    def _build_dict(self) -> dict:
         result = {
             "request_id": self.request_id,
             "timestamp": self.timestamp,
             "agent": self.agent,
             "processing_time_ms": self.total_time_ms,
         }
+        if self.trace_id:
+            result["trace_id"] = self.trace_id
 
         for step in self.steps:
             result[step.name] = step.to_dict()
 
         if self.llm_call:
-            result["llm_call"] = self.llm_call.to_dict()
+            result["llm_call"] = self.llm_call.to_dict(include_prompts=self.capture_payloads)
 
         if self.chat_history_used:
             result["chat_history_used"] = self.chat_history_used
 
         result["grounding"] = self.grounding.to_dict()
+        if self.profile:
+            result["profile"] = self.profile
         result.update(self.extra_data)
 
         return result
@@ -0,0 +1,73 @@
+"""
+Event Stream
+Verteilt Events (z.B. aus dem NOTIFY-Listener-Thread) im Prozess an alle
+verbundenen SSE-Clients. Jeder Client hat eine eigene begrenzte Queue; wer nicht
+hinterherkommt wird getrennt und holt sich nach dem Reconnect den aktuellen Stand.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+from typing import AsyncIterator
+
+CLIENT_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+# Markiert in der Queue, dass der Client getrennt werden soll
+_DISCONNECT = object()
+
+
+class EventBroadcaster:
+    """Fan-out von Events an asyncio-Subscriber, thread-safe publizierbar"""
+
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ids = itertools.count(1)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Event Loop des Servers (beim Startup setzen)"""
+        self._loop = loop
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, data: str) -> None:
+        """Aus beliebigem Thread aufrufbar (z.B. als pg_listener Callback)"""
+        if self._loop is None or not self._subscribers:
+            return
+        self._loop.call_soon_threadsafe(self._fanout, next(self._ids), data)
+
+    def _fanout(self, event_id: int, data: str) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event_id, data))
+            except asyncio.QueueFull:
+                # Langsamer Client: trennen statt Events still zu verlieren
+                self._subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(_DISCONNECT)
+
+    async def stream(self, event: str = "message", is_disconnected=None) -> AsyncIterator[str]:
+        """SSE-Frames für einen Client, mit Heartbeat-Kommentaren gegen Proxy-Timeouts"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if item is _DISCONNECT:
+                    return
+                event_id, data = item
+                yield f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+        finally:
+            self._subscribers.discard(queue)
@@ -0,0 +1,116 @@
+"""
+Streaming Export
+Exportiert Tabellen als NDJSON oder CSV in konstantem Speicher (Server-Side Cursor).
+"""
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from .database import iter_query
+from . import fast_json
+
+# Exportierbare Tabellen und ihre Spalten (Whitelist, auch für die CSV-Kopfzeile)
+EXPORT_COLUMNS = {
+    "agent_requests": [
+        "id", "request_id", "agent", "user_message", "response", "processing_time_ms",
+        "model", "input_tokens", "output_tokens", "cost_usd", "confidence",
+        "hallucination_risk", "data_points_count", "debug_info", "created_at",
+    ],
+    "message_feedback": [
+        "id", "agent_slug", "user_message", "assistant_response", "feedback_type",
+        "feedback_comment", "session_id", "created_at",
+    ],
+    "support_tickets": [
+        "id", "user_message", "chat_history", "status", "created_at", "resolved_at",
+    ],
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Ausgabe in Blöcken dieser Größe statt Zeile für Zeile
+CHUNK_BYTES = 64 * 1024
+
+
+def export_rows(
+    table: str,
+    since: datetime | None = None,
+    until: datetime | None = None
+) -> Iterator[dict]:
+    """Streamt die Zeilen einer Tabelle, optional gefiltert nach created_at (since <= x < until)"""
+    columns = EXPORT_COLUMNS[table]
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append("created_at >= %s")
+        params.append(since)
+    if until is not None:
+        clauses.append("created_at < %s")
+        params.append(until)
+
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY created_at, id"
+    return iter_query(query, tuple(params) or None)
+
+
+def _chunked(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Fasst Zeilen zu Blöcken von ~CHUNK_BYTES zusammen"""
+    buffer = bytearray()
+    for line in lines:
+        buffer += line
+        if len(buffer) >= CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def ndjson_stream(rows: Iterable[dict]) -> Iterator[bytes]:
+    """Eine JSON-Zeile pro Datensatz"""
+    return _chunked(fast_json.dumps_bytes(row) + b"\n" for row in rows)
+
+
+def csv_stream(rows: Iterable[dict], columns: list[str]) -> Iterator[bytes]:
+    """CSV mit Kopfzeile, JSON-Spalten (dict/list) werden als JSON-Text geschrieben"""
+    def lines() -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([
+                fast_json.dumps(value) if isinstance(value, (dict, list)) else value
+                for value in (row.get(column) for column in columns)
+            ])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    return _chunked(lines())
+
+
+def export_stream(
+    table: str,
+    fmt: str = "ndjson",
+    since: datetime | None = None,
+    until: datetime | None = None
+) -> Iterator[bytes]:
+    """
+    Export einer Tabelle als Byte-Stream im gewünschten Format.
+    close() schließt auch den Cursor-Generator (Server-Side Cursor und Connection).
+    """
+    rows = export_rows(table, since, until)
+    try:
+        if fmt == "csv":
+            yield from csv_stream(rows, EXPORT_COLUMNS[table])
+        else:
+            yield from ndjson_stream(rows)
+    finally:
+        rows.close()
@@ -0,0 +1,117 @@
+"""
+Schnelle JSON-Serialisierung
+Nutzt orjson wenn installiert, sonst die Standardbibliothek.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Typen die weder orjson noch json nativ kennen (z.B. NUMERIC aus Postgres)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialisiert nach UTF-8 JSON Bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def dumps(obj: Any) -> str:
+        """Serialisiert nach JSON String"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode()
+
+    def loads(data: str | bytes) -> Any:
+        """Parst JSON (wirft json.JSONDecodeError bei ungültigem Input)"""
+        return orjson.loads(data)
+
+else:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialisiert nach UTF-8 JSON Bytes"""
+        return dumps(obj).encode()
+
+    def dumps(obj: Any) -> str:
+        """Serialisiert nach JSON String"""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def loads(data: str | bytes) -> Any:
+        """Parst JSON (wirft json.JSONDecodeError bei ungültigem Input)"""
+        return json.loads(data)
+
+
+# Micro-Benchmark: python -m shared.fast_json
+if __name__ == "__main__":
+    import timeit
+
+    debug_info = {
+        "request_id": "req_1a2b3c4d",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "agent": "support",
+        "processing_time_ms": 1834,
+        "faq_search": {"name": "faq_search", "duration_ms": 212, "total_faqs": 180, "returned": 3},
+        "llm_call": {
+            "model": "gpt-4o",
+            "system_prompt": "Du bist der freundliche Support-Assistent. " * 12,
+            "user_prompt": "Relevante FAQs aus der Wissensbasis: Frage / Antwort / Quelle. " * 16,
+            "input_tokens": 1450,
+            "output_tokens": 180,
+            "cost_usd": 0.005425,
+            "response_time_ms": 1500,
+        },
+        "chat_history_used": [
+            {"role": "user" if i % 2 else "assistant", "content": "Wie ändere ich meine Watchlist? " * 5}
+            for i in range(4)
+        ],
+        "grounding": {
+            "data_used": ["FAQ Match: Passwort zurücksetzen...: 87%"] * 3,
+            "data_missing": [],
+            "confidence": 1.0,
+            "hallucination_risk": "low",
+            "ungrounded_claims": [],
+            "data_points_count": 3,
+            "missing_count": 0,
+        },
+    }
+    tickets = [
+        {
+            "id": i,
+            "user_message": "Mein Login funktioniert nicht mehr seit dem Update",
+            "chat_history": debug_info["chat_history_used"] * 2,
+            "status": "open",
+            "created_at": datetime.utcnow(),
+            "resolved_at": None,
+        }
+        for i in range(500)
+    ]
+    payloads = {"debug_info": debug_info, "tickets (500 rows)": {"tickets": tickets, "count": len(tickets)}}
+
+    def stdlib_dumps(obj):
+        return json.dumps(obj, default=_default, ensure_ascii=False).encode()
+
+    print(f"Backend: {'orjson' if orjson else 'stdlib json'}")
+    for name, payload in payloads.items():
+        number = 2000 if name == "debug_info" else 20
+        encoded = dumps_bytes(payload)
+        t_std = timeit.timeit(lambda: stdlib_dumps(payload), number=number) / number * 1e6
+        t_fast = timeit.timeit(lambda: dumps_bytes(payload), number=number) / number * 1e6
+        l_std = timeit.timeit(lambda: json.loads(encoded), number=number) / number * 1e6
+        l_fast = timeit.timeit(lambda: loads(encoded), number=number) / number * 1e6
+        print(f"{name} ({len(encoded)} bytes)")
+        print(f"  dumps: stdlib {t_std:9.1f} us | fast {t_fast:9.1f} us | x{t_std / t_fast:.1f}")
+        print(f"  loads: stdlib {l_std:9.1f} us | fast {l_fast:9.1f} us | x{l_std / l_fast:.1f}")
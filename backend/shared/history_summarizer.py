@@ -0,0 +1,131 @@
+"""
+History Summarizer
+Fasst ältere Chat-Nachrichten mit FAST_MODEL zu einer rollierenden Zusammenfassung
+begrenzter Länge zusammen - im Hintergrund, nie im Request-Pfad.
+
+Die Zusammenfassungen werden per Hash-Kette über die Nachrichten gecacht: Jeder
+Prefix des Verlaufs hat einen eigenen Hash. Der Request nimmt die Zusammenfassung
+zum längsten bekannten Prefix. Fehlt der aktuelle Stand, wird im Hintergrund aus
+alter Zusammenfassung + neu herausgefallenen Nachrichten die nächste erzeugt.
+Lange Gespräche kosten damit eine feste Anzahl Prompt-Tokens.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import settings, FAST_MODEL
+from .logger import agent_logger
+
+SUMMARY_PROMPT = """Du fasst den bisherigen Verlauf eines Support-Chats für den Support-Assistenten zusammen.
+Behalte: Anliegen des Nutzers, genannte Details (Geräte, Fehlermeldungen, Einstellungen),
+bereits gegebene Lösungsvorschläge und ob sie geholfen haben, offene Fragen.
+Antworte nur mit der Zusammenfassung in Stichpunkten, höchstens {max_words} Wörter."""
+
+# Zeichen pro Nachricht die in die Zusammenfassung eingehen
+MAX_MESSAGE_CHARS = 2000
+
+_summaries: OrderedDict[str, str] = OrderedDict()
+_pending: set[str] = set()
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+    return _executor
+
+
+def prefix_hashes(messages: list[dict]) -> list[str]:
+    """Hash-Kette: Eintrag i identifiziert die Nachrichten [0, i]"""
+    hashes = []
+    previous = b""
+    for msg in messages:
+        h = hashlib.blake2b(previous, digest_size=16)
+        h.update(f"\0{msg.get('role', '')}\0{msg.get('content', '')}".encode("utf-8"))
+        previous = h.digest()
+        hashes.append(previous.hex())
+    return hashes
+
+
+def lookup_summary(messages: list[dict]) -> tuple[str | None, int]:
+    """
+    Zusammenfassung zum längsten gecachten Prefix von `messages`.
+    Gibt (summary, Anzahl abgedeckter Nachrichten) zurück, (None, 0) wenn keine existiert.
+    """
+    hashes = prefix_hashes(messages)
+    with _lock:
+        for count in range(len(hashes), 0, -1):
+            summary = _summaries.get(hashes[count - 1])
+            if summary is not None:
+                _summaries.move_to_end(hashes[count - 1])
+                return summary, count
+    return None, 0
+
+
+def _store(key: str, summary: str) -> None:
+    with _lock:
+        _summaries[key] = summary
+        _summaries.move_to_end(key)
+        while len(_summaries) > settings.history_summary_cache_size:
+            _summaries.popitem(last=False)
+
+
+def summarize(previous: str | None, messages: list[dict]) -> str:
+    """Erzeugt die neue Zusammenfassung aus der alten und weiteren Nachrichten (blockierend)"""
+    from .llm_client import chat_completion
+
+    max_tokens = settings.history_summary_max_tokens
+    lines = []
+    if previous:
+        lines.append(f"Bisherige Zusammenfassung:\n{previous}\n")
+    lines.append("Neue Nachrichten:")
+    for msg in messages:
+        lines.append(f"{msg.get('role', 'user')}: {str(msg.get('content', ''))[:MAX_MESSAGE_CHARS]}")
+
+    return chat_completion(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=int(max_tokens * 0.6))},
+            {"role": "user", "content": "\n".join(lines)},
+        ],
+        model=FAST_MODEL,
+        max_tokens=max_tokens,
+        temperature=0.0
+    ).strip()
+
+
+def _run(key: str, previous: str | None, messages: list[dict]) -> None:
+    try:
+        _store(key, summarize(previous, messages))
+    except Exception as e:
+        agent_logger.warning("History summary failed: %s", e)
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def schedule_summary(messages: list[dict]) -> bool:
+    """
+    Startet im Hintergrund die Zusammenfassung von `messages`, sofern sie nicht
+    schon gecacht ist oder läuft. Baut auf der längsten vorhandenen Zusammenfassung auf.
+    """
+    if not messages:
+        return False
+    key = prefix_hashes(messages)[-1]
+    with _lock:
+        if key in _summaries or key in _pending:
+            return False
+        _pending.add(key)
+
+    previous, covered = lookup_summary(messages)
+    _get_executor().submit(_run, key, previous, messages[covered:])
+    return True
+
+
+def clear_cache() -> None:
+    with _lock:
+        _summaries.clear()
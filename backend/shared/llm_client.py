@@ -4,18 +4,20 @@ Abstraction Layer für OpenAI GPT
 """
 from __future__ import annotations
 
-import os
-import json
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING
 
-from .config import DEFAULT_MODEL, FAST_MODEL, LLM_TIMEOUT_SECONDS
+from .config import settings, DEFAULT_MODEL, FAST_MODEL, EMBEDDING_MODEL, LLM_TIMEOUT_SECONDS
 from .logger import llm_logger
+from . import fast_json
+from . import tracing
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import OpenAI
 
+# Das openai Paket wird erst beim ersten Call importiert (schnellerer Server-Start)
 _openai_client: OpenAI | None = None
 
 
@@ -23,18 +25,50 @@ def get_openai_client() -> OpenAI:
     """Gibt den OpenAI Client zurück (Singleton Pattern)"""
     global _openai_client
     if _openai_client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        from openai import OpenAI
+
+        if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY muss in .env gesetzt sein")
-        _openai_client = OpenAI(api_key=api_key)
+        _openai_client = OpenAI(api_key=settings.openai_api_key)
     return _openai_client
 
 
-def create_embedding(text: str, model: str = "text-embedding-3-small") -> list[float]:
-    """Erstellt ein Embedding für den gegebenen Text"""
+# LRU-Cache für Embeddings häufiger Fragen (model, text) -> Vektor
+_embedding_cache: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+
+
+def create_embedding(text: str, model: str = EMBEDDING_MODEL) -> list[float]:
+    """Erstellt ein Embedding für den gegebenen Text (mit LRU-Cache)"""
+    key = (model, text)
+    cached = _embedding_cache.get(key)
+    if cached is not None:
+        _embedding_cache.move_to_end(key)
+        tracing.current_span().set_attribute("embedding.cache_hit", True)
+        return cached
+
+    client = get_openai_client()
+    with tracing.span("llm.embedding", {"gen_ai.request.model": model}, kind="client") as span:
+        response = client.embeddings.create(model=model, input=text)
+        embedding = response.data[0].embedding
+        span.set_attribute("gen_ai.usage.input_tokens", getattr(response.usage, "prompt_tokens", None))
+
+    _embedding_cache[key] = embedding
+    if len(_embedding_cache) > settings.embedding_cache_size:
+        _embedding_cache.popitem(last=False)
+    return embedding
+
+
+def create_embeddings(texts: list[str], model: str = EMBEDDING_MODEL) -> list[list[float]]:
+    """Erstellt Embeddings für mehrere Texte in einem API-Call (ohne Cache)"""
+    client = get_openai_client()
+    response = client.embeddings.create(model=model, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def warm_up_client() -> None:
+    """Baut die HTTPS-Verbindung zur OpenAI API vorab auf (TLS-Handshake)"""
     client = get_openai_client()
-    response = client.embeddings.create(model=model, input=text)
-    return response.data[0].embedding
+    client.models.retrieve(DEFAULT_MODEL, timeout=LLM_TIMEOUT_SECONDS)
 
 
 @dataclass
@@ -82,7 +116,18 @@ def chat_completion_with_usage(
     kwargs["timeout"] = LLM_TIMEOUT_SECONDS
 
     start_time = time.time()
-    response = client.chat.completions.create(**kwargs)
+    with tracing.span("llm.chat", kind="client") as span:
+        span.set_attributes({
+            "gen_ai.request.model": model,
+            "gen_ai.request.max_tokens": max_tokens,
+            "gen_ai.request.temperature": temperature,
+            "llm.messages": len(messages),
+        })
+        response = client.chat.completions.create(**kwargs)
+        span.set_attributes({
+            "gen_ai.usage.input_tokens": response.usage.prompt_tokens,
+            "gen_ai.usage.output_tokens": response.usage.completion_tokens,
+        })
     response_time_ms = int((time.time() - start_time) * 1000)
 
     return LLMResponse(
@@ -100,8 +145,8 @@ def parse_json_response(content: str, default: dict | None = None) -> dict:
     Entfernt automatisch ```json Codeblöcke wenn vorhanden.
     """
     try:
-        return json.loads(content)
-    except json.JSONDecodeError:
+        return fast_json.loads(content)
+    except ValueError:
         pass
 
     cleaned = content.strip()
@@ -114,12 +159,9 @@ def parse_json_response(content: str, default: dict | None = None) -> dict:
     cleaned = cleaned.strip()
 
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError as e:
-        llm_logger.warning(
-            f"JSON parse failed after cleanup: {e}. "
-            f"Content preview: {content[:200]}..."
-        )
+        return fast_json.loads(cleaned)
+    except ValueError as e:
+        llm_logger.warning("JSON parse failed after cleanup: %s. Content preview: %.200s...", e, content)
         return default or {"response": content, "suggestions": None, "escalate": False}
 
 
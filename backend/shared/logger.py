@@ -1,46 +1,258 @@
 """
 Strukturiertes Logging
+
+Alle Logger schreiben über einen QueueHandler in eine gemeinsame, begrenzte Queue.
+Formatieren und Schreiben nach stdout übernimmt ein QueueListener-Thread - ein
+langsamer Log-Consumer blockiert so nie den Event Loop. Ist die Queue voll, werden
+Records verworfen und gezählt statt zu warten.
+
+Ausgabe als JSON (LOG_FORMAT=json) mit request_id und trace_id des aktuellen
+Requests oder als Text (LOG_FORMAT=text). Nachrichten bitte lazy loggen:
+`logger.warning("Flush failed: %s", e)` statt f-Strings.
 """
+from __future__ import annotations
+
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from typing import Optional
 
+from .config import settings
+
+LOG_QUEUE_SIZE = 10_000
+
+# request_id des laufenden Requests (gesetzt vom DebugTracker)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attribute die jeder LogRecord hat - alles andere kam über `extra=` und landet im JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def bind_request_id(request_id: str | None) -> None:
+    """Setzt die request_id für alle folgenden Logs im aktuellen Kontext"""
+    request_id_var.set(request_id)
+
+
+# ============== Formatter ==============
+
+class JSONFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Bisheriges Textformat, request_id/unterdrückte Records als Suffix"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            text += f" [{request_id}]"
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            text += f" (+{suppressed} unterdrückt)"
+        return text
+
+
+# ============== Queue ==============
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Übernimmt im aufrufenden Thread nur das Nötigste: Message auflösen, Exception
+    als Text, request_id/trace_id aus den Context-Variablen. JSON und I/O passieren
+    im Listener-Thread.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        from .tracing import current_span
+
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        if getattr(record, "trace_id", None) is None:
+            record.trace_id = current_span().trace_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _ContextQueueHandler.dropped += 1
+
+
+_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_queue_handler = _ContextQueueHandler(_queue)
+_listener: logging.handlers.QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+def _output_handler(format_string: Optional[str] = None) -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(TextFormatter(
+            format_string or "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
+    return handler
+
+
+def _start_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _output_handler(), respect_handler_level=False)
+            _listener.start()
+            atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Schreibt alle gepufferten Records und beendet den Listener (beim Shutdown)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+# ============== Rate Limits ==============
+
+class RateLimitFilter(logging.Filter):
+    """
+    Begrenzt WARNING-Records pro Nachrichten-Template (Token Bucket) und sampelt
+    optional INFO/DEBUG. ERROR und höher gehen immer durch. Unterdrückte Warnungen
+    werden gezählt und beim nächsten durchgelassenen Record als `suppressed` mitgeschickt.
+    """
+
+    def __init__(self, per_minute: float = 0, sample_rate: float = 1.0):
+        super().__init__()
+        self.per_minute = per_minute
+        self.sample_rate = sample_rate
+        self._buckets: dict[tuple, list] = {}
+        self._sampled = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        with self._lock:
+            if record.levelno < logging.WARNING:
+                if self.sample_rate >= 1.0:
+                    return True
+                # Deterministisch: durchlassen, wenn count * rate eine neue ganze Zahl erreicht
+                self._sampled += 1
+                return int(self._sampled * self.sample_rate) != int((self._sampled - 1) * self.sample_rate)
+
+            if self.per_minute <= 0:
+                return True
+
+            key = (record.levelno, str(record.msg))
+            now = time.monotonic()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # [Tokens, letzte Aktualisierung, unterdrückt]
+                bucket = self._buckets[key] = [self.per_minute, now, 0]
+            bucket[0] = min(self.per_minute, bucket[0] + (now - bucket[1]) * self.per_minute / 60)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+            return True
+
+
+# ============== Setup ==============
 
 def setup_logger(
     name: str,
     level: int = logging.INFO,
-    format_string: Optional[str] = None
+    format_string: Optional[str] = None,
+    rate_limit_per_minute: float = 0,
+    sample_rate: float = 1.0
 ) -> logging.Logger:
-    """Erstellt einen konfigurierten Logger."""
+    """
+    Erstellt einen konfigurierten Logger, der über die gemeinsame Queue schreibt.
+    `rate_limit_per_minute` begrenzt Warnungen pro Nachrichten-Template (0 = aus, nur
+    für bekannt laute Logger), `sample_rate` sampelt INFO/DEBUG.
+    Ein eigener `format_string` bekommt einen eigenen, synchronen Handler.
+    """
     logger = logging.getLogger(name)
 
     if logger.handlers:
         return logger
 
     logger.setLevel(level)
-
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(level)
+    logger.propagate = False
 
     if format_string is None:
-        format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-
-    formatter = logging.Formatter(format_string, datefmt="%Y-%m-%d %H:%M:%S")
-    handler.setFormatter(formatter)
+        _start_listener()
+        logger.addHandler(_queue_handler)
+    else:
+        logger.addHandler(_output_handler(format_string))
 
-    logger.addHandler(handler)
+    if rate_limit_per_minute > 0 or sample_rate < 1.0:
+        logger.addFilter(RateLimitFilter(rate_limit_per_minute, sample_rate))
 
     return logger
 
 
+def dropped_records() -> int:
+    """Anzahl Records die wegen voller Queue verworfen wurden"""
+    return _ContextQueueHandler.dropped
+
+
 # Pre-konfigurierte Logger
 api_logger = setup_logger("api", logging.INFO)
 agent_logger = setup_logger("agents", logging.INFO)
-llm_logger = setup_logger("llm", logging.INFO)
+# JSON-Parse-Fallbacks können bei einem kaputten Modell-Output pro Request auftreten
+llm_logger = setup_logger("llm", logging.INFO, rate_limit_per_minute=settings.log_rate_limit_per_minute)
 db_logger = setup_logger("database", logging.INFO)
 
 
 def log_api_error(endpoint: str, error: Exception, extra: Optional[dict] = None):
     """Loggt einen API-Fehler mit Kontext."""
-    msg = f"Error in {endpoint}: {error}"
-    api_logger.error(msg, exc_info=True, extra=extra or {})
+    api_logger.error("Error in %s: %s", endpoint, error, exc_info=True, extra=extra or {})
+
+
+# Für direktes Testen: LOG_FORMAT=json python -m shared.logger
+if __name__ == "__main__":
+    bind_request_id("req_test")
+    for i in range(15):
+        llm_logger.warning("JSON parse failed: %s", i)
+    try:
+        1 / 0
+    except ZeroDivisionError as e:
+        log_api_error("/test", e, {"user": "demo"})
+    stop_logging()
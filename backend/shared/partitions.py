@@ -0,0 +1,494 @@
+"""
+Partitionierung von agent_requests
+agent_requests ist nach created_at range-partitioniert (pro Tag oder Monat). Die App
+legt die aktuelle und REQUEST_PARTITIONS_AHEAD künftige Partitionen vorab an, Inserts
+landen ohne Änderung an log_request in der passenden Partition.
+
+Zeilen die mangels Partition in der DEFAULT-Partition gelandet sind, werden bei der
+nächsten Wartung in eine neu angelegte Partition ihres Zeitraums verschoben - sie
+blockieren so kein CREATE PARTITION und werden wie alle anderen archiviert.
+
+Retention ist opt-in: Partitionen die komplett älter als REQUEST_RETENTION_DAYS sind,
+werden als NDJSON (zstd wenn `zstandard` installiert ist, sonst gzip) nach
+REQUEST_ARCHIVE_DIR geschrieben und danach per DETACH + DROP entfernt - kein DELETE,
+kein Vacuum. Ohne absoluten REQUEST_ARCHIVE_DIR wird nichts gelöscht.
+Mehrere Worker koordinieren sich über ein Advisory Lock.
+
+Ist die Tabelle (noch) nicht partitioniert, verweigert die Wartung die Arbeit.
+Bestehende Installationen: python -m shared.partitions --migrate
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from .config import settings
+from .database import iter_query, open_connection
+from .export import ndjson_stream
+from .logger import db_logger
+
+INTERVALS = ("day", "month")
+
+# Beliebige, aber feste Lock-ID für pg_try_advisory_lock
+MAINTENANCE_LOCK_ID = 460_046
+
+_NAME_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+
+
+def _period_start(moment: datetime, interval: str) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    if interval == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_for(table: str, moment: datetime, interval: str) -> Partition:
+    """Partition (Name und Grenzen) die `moment` enthält"""
+    start = _period_start(moment, interval)
+    return Partition(
+        name=f"{table}_p{start.strftime(_NAME_FORMATS[interval])}",
+        start=start,
+        end=_next_period(start, interval)
+    )
+
+
+def parse_partition(table: str, name: str) -> Partition | None:
+    """Grenzen aus dem Namen (agent_requests_p20240131 / agent_requests_p202401), sonst None"""
+    match = re.fullmatch(re.escape(table) + r"_p(\d{6}|\d{8})", name)
+    if not match:
+        return None
+    interval = "day" if len(match.group(1)) == 8 else "month"
+    start = datetime.strptime(match.group(1), _NAME_FORMATS[interval]).replace(tzinfo=timezone.utc)
+    return Partition(name=name, start=start, end=_next_period(start, interval))
+
+
+class PartitionManager:
+    """Legt Partitionen vorab an und archiviert/entfernt abgelaufene"""
+
+    def __init__(
+        self,
+        table: str = "agent_requests",
+        interval: str = "month",
+        ahead: int = 2,
+        retention_days: int = 0,
+        archive_dir: str = "",
+        maintenance_seconds: float = 3600.0
+    ):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unbekanntes Partitions-Intervall: {interval}")
+        self.table = table
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.maintenance_seconds = maintenance_seconds
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ============== Partitionen ==============
+
+    def is_partitioned(self, conn) -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                (self.table,)
+            )
+            partitioned = cur.fetchone()[0]
+        conn.commit()
+        return partitioned
+
+    def _children(self, conn) -> list[tuple[str, bool]]:
+        """(Name, ist DEFAULT) aller angehängten Partitionen"""
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) = 'DEFAULT'
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = %s
+                """,
+                (self.table,)
+            )
+            children = cur.fetchall()
+        conn.commit()
+        return children
+
+    def list_partitions(self, conn) -> list[Partition]:
+        """Angehängte Partitionen mit bekanntem Namensschema (ohne DEFAULT), nach Start sortiert"""
+        partitions = [p for p in (parse_partition(self.table, name) for name, _ in self._children(conn)) if p]
+        return sorted(partitions, key=lambda p: p.start)
+
+    def default_partition(self, conn) -> str | None:
+        return next((name for name, is_default in self._children(conn) if is_default), None)
+
+    def _default_periods(self, conn, default: str) -> list[datetime]:
+        """Beginn der Zeiträume zu denen Zeilen in der DEFAULT-Partition liegen"""
+        from psycopg2 import sql
+
+        with conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("SELECT DISTINCT date_trunc(%s, created_at AT TIME ZONE 'UTC') FROM {}").format(
+                    sql.Identifier(default)
+                ),
+                (self.interval,)
+            )
+            periods = [row[0].replace(tzinfo=timezone.utc) for row in cur.fetchall()]
+        conn.commit()
+        return periods
+
+    def _planned(self, now: datetime, since: datetime | None = None) -> list[Partition]:
+        """Aktuelle und `ahead` folgende Partitionen, mit `since` auch alle ab diesem Zeitpunkt"""
+        last = partition_for(self.table, now, self.interval)
+        for _ in range(self.ahead):
+            last = partition_for(self.table, last.end, self.interval)
+
+        moment = min(since, now) if since else now
+        planned = []
+        while moment < last.end:
+            partition = partition_for(self.table, moment, self.interval)
+            planned.append(partition)
+            moment = partition.end
+        return planned
+
+    def _create_partition(self, cur, partition: Partition, default: str | None) -> int:
+        """
+        Legt eine Partition an. Liegen Zeilen ihres Zeitraums in der DEFAULT-Partition,
+        werden sie in derselben Transaktion umgezogen (sonst schlägt CREATE PARTITION fehl).
+        Gibt die Anzahl verschobener Zeilen zurück.
+        """
+        from psycopg2 import sql
+
+        bounds = (partition.start, partition.end)
+        if default is not None:
+            # Keine neuen Zeilen in DEFAULT bis zum Commit
+            cur.execute(sql.SQL("LOCK TABLE {} IN EXCLUSIVE MODE").format(sql.Identifier(default)))
+            cur.execute(
+                sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE created_at >= %s AND created_at < %s)").format(
+                    sql.Identifier(default)
+                ),
+                bounds
+            )
+            if cur.fetchone()[0]:
+                cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+                    sql.Identifier(partition.name), sql.Identifier(self.table)
+                ))
+                cur.execute(
+                    sql.SQL(
+                        "WITH moved AS (DELETE FROM {} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                        "INSERT INTO {} SELECT * FROM moved"
+                    ).format(sql.Identifier(default), sql.Identifier(partition.name)),
+                    bounds
+                )
+                moved = cur.rowcount
+                cur.execute(
+                    sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+                        sql.Identifier(self.table), sql.Identifier(partition.name)
+                    ),
+                    bounds
+                )
+                return moved
+
+        cur.execute(
+            sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+                sql.Identifier(partition.name), sql.Identifier(self.table)
+            ),
+            bounds
+        )
+        return 0
+
+    def ensure_partitions(
+        self,
+        conn,
+        now: datetime | None = None,
+        since: datetime | None = None
+    ) -> list[str]:
+        """
+        Legt die aktuelle und `ahead` folgende Partitionen an (mit `since` auch alle
+        ab diesem Zeitpunkt) sowie Partitionen für Zeilen in der DEFAULT-Partition.
+        Gibt die neuen Namen zurück, ein Fehler bricht die Wartung ab.
+        """
+        existing = self.list_partitions(conn)
+        default = self.default_partition(conn)
+        planned = self._planned(now or datetime.now(timezone.utc), since)
+        if default is not None:
+            planned += [partition_for(self.table, start, self.interval) for start in self._default_periods(conn, default)]
+
+        created = []
+        for partition in sorted({p.name: p for p in planned}.values(), key=lambda p: p.start):
+            # Nach einem Wechsel des Intervalls nicht mit alten Partitionen überlappen
+            if any(p.start < partition.end and partition.start < p.end for p in existing):
+                continue
+            try:
+                with conn.cursor() as cur:
+                    moved = self._create_partition(cur, partition, default)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            existing.append(partition)
+            created.append(partition.name)
+            if moved:
+                db_logger.info("Moved %d rows from %s into %s", moved, default, partition.name)
+        return created
+
+    def retention_error(self) -> str | None:
+        """Grund, warum trotz Retention nichts gelöscht werden darf (None = ok)"""
+        if self.retention_days > 0 and not os.path.isabs(self.archive_dir):
+            return "archive_dir_not_absolute"
+        return None
+
+    def expired_partitions(self, conn, now: datetime | None = None) -> list[Partition]:
+        """Partitionen deren Zeitraum komplett vor der Retention-Grenze liegt"""
+        if self.retention_days <= 0:
+            return []
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=self.retention_days)
+        return [p for p in self.list_partitions(conn) if p.end <= cutoff]
+
+    # ============== Archivierung ==============
+
+    def archive_partition(self, partition: Partition) -> str:
+        """Schreibt eine Partition als komprimiertes NDJSON, gibt den Dateipfad zurück"""
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{partition.name}.ndjson.{'zst' if zstandard else 'gz'}")
+        tmp_path = path + ".tmp"
+
+        # Name stammt aus pg_inherits und hat das feste Schema <table>_p<Datum>
+        rows = iter_query(f"SELECT * FROM {partition.name} ORDER BY created_at, id", replica=False)
+        with open(tmp_path, "wb") as raw:
+            if zstandard is not None:
+                writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+            else:
+                writer = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+            with writer:
+                for chunk in ndjson_stream(rows):
+                    writer.write(chunk)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def drop_partition(self, conn, partition: Partition) -> None:
+        """DETACH + DROP in einer Transaktion (sofort, ohne DELETE)"""
+        from psycopg2 import sql
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                    sql.Identifier(self.table), sql.Identifier(partition.name)
+                ))
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(partition.name)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # ============== Wartung ==============
+
+    def run_maintenance(self, dry_run: bool = False, since: datetime | None = None) -> dict:
+        """Partitionen anlegen und abgelaufene archivieren + entfernen (ein Worker gleichzeitig)"""
+        result = {"expired": [], "created": [], "archived": [], "dropped": [], "skipped": False}
+        conn = open_connection()
+        try:
+            if not self.is_partitioned(conn):
+                db_logger.error(
+                    "%s is not partitioned - partition maintenance disabled. "
+                    "Migrate with: python -m shared.partitions --migrate", self.table
+                )
+                result.update(skipped=True, error="not_partitioned")
+                return result
+
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (MAINTENANCE_LOCK_ID,))
+                locked = cur.fetchone()[0]
+            conn.commit()
+            if not locked:
+                result["skipped"] = True
+                return result
+
+            try:
+                if not dry_run:
+                    result["created"] = self.ensure_partitions(conn, since=since)
+                # Nach dem Anlegen, damit auch aus DEFAULT umgezogene Zeilen archiviert werden
+                expired = self.expired_partitions(conn)
+                result["expired"] = [p.name for p in expired]
+                if dry_run:
+                    return result
+                if expired and self.retention_error():
+                    # Archiv auf flüchtigem Container-Disk wäre mit dem DROP verloren
+                    db_logger.error(
+                        "REQUEST_RETENTION_DAYS=%d but REQUEST_ARCHIVE_DIR %r is not an absolute path - "
+                        "not dropping %d expired partitions", self.retention_days, self.archive_dir, len(expired)
+                    )
+                    result["error"] = self.retention_error()
+                    return result
+
+                for partition in expired:
+                    # Ohne erfolgreiches Archiv wird nicht gelöscht
+                    result["archived"].append(self.archive_partition(partition))
+                    self.drop_partition(conn, partition)
+                    result["dropped"].append(partition.name)
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK_ID,))
+                conn.commit()
+        finally:
+            conn.close()
+
+        if result["created"] or result["dropped"]:
+            db_logger.info("Partition maintenance: created %s, dropped %s", result["created"], result["dropped"])
+        return result
+
+    # ============== Migration ==============
+
+    def migrate(self) -> dict:
+        """
+        Wandelt eine bestehende, unpartitionierte Tabelle in einer Transaktion um:
+        alte Tabelle (inkl. Indizes) nach <table>_legacy umbenennen, partitionierte Tabelle
+        mit denselben Spalten, Defaults und Indizes anlegen (id als BIGINT), Partitionen ab der ältesten
+        Zeile anlegen und alle Zeilen kopieren. Die id-Sequenz wird weiterverwendet.
+        Zeilen ohne created_at bekommen NOW(). <table>_legacy bleibt zur Kontrolle stehen.
+        """
+        from psycopg2 import sql
+
+        table = sql.Identifier(self.table)
+        legacy_name = f"{self.table}_legacy"
+        legacy = sql.Identifier(legacy_name)
+        conn = open_connection()
+        try:
+            if self.is_partitioned(conn):
+                return {"migrated": False, "reason": f"{self.table} ist bereits partitioniert"}
+
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(table))
+                # Index-Definitionen sichern, bevor die Namen für die neue Tabelle frei werden
+                cur.execute(
+                    """
+                    SELECT index.relname, pg_get_indexdef(i.indexrelid), i.indisunique
+                    FROM pg_index i
+                    JOIN pg_class index ON index.oid = i.indexrelid
+                    WHERE i.indrelid = to_regclass(%s)
+                    """,
+                    (self.table,)
+                )
+                indexes = cur.fetchall()
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (self.table,))
+                sequence = cur.fetchone()[0]
+
+                cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(table, legacy))
+                for name, _, _ in indexes:
+                    cur.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                        sql.Identifier(name), sql.Identifier(f"{name}_legacy"[:63])
+                    ))
+                cur.execute(sql.SQL("UPDATE {} SET created_at = NOW() WHERE created_at IS NULL").format(legacy))
+
+                cur.execute(sql.SQL(
+                    "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+                ).format(table, legacy))
+                cur.execute(sql.SQL(
+                    "ALTER TABLE {} ALTER COLUMN id TYPE BIGINT, ALTER COLUMN created_at SET NOT NULL"
+                ).format(table))
+                cur.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY (id, created_at)").format(table))
+                cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+                    sql.Identifier(f"{self.table}_default"), table
+                ))
+                if sequence:
+                    # Sonst würde DROP TABLE <table>_legacy die Sequenz mitlöschen
+                    cur.execute(sql.SQL("ALTER SEQUENCE {} AS BIGINT OWNED BY {}.id").format(
+                        sql.Identifier(*sequence.split(".")), table
+                    ))
+                for _, definition, unique in indexes:
+                    # Unique-Indizes (z.B. der alte Primary Key) müssten created_at enthalten
+                    if not unique:
+                        cur.execute(definition)
+
+                cur.execute(sql.SQL("SELECT MIN(created_at) FROM {}").format(legacy))
+                oldest = cur.fetchone()[0]
+                partitions = self._planned(datetime.now(timezone.utc), since=oldest)
+                for partition in partitions:
+                    self._create_partition(cur, partition, default=None)
+                cur.execute(sql.SQL("INSERT INTO {} SELECT * FROM {}").format(table, legacy))
+                copied = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        db_logger.info("Migrated %s: %d rows copied, legacy table kept as %s", self.table, copied, legacy_name)
+        return {
+            "migrated": True,
+            "rows": copied,
+            "partitions": [p.name for p in partitions],
+            "legacy_table": legacy_name,
+        }
+
+    def start(self) -> None:
+        """Wartung sofort und danach alle `maintenance_seconds` in einem Hintergrund-Thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.run_maintenance().get("error") == "not_partitioned":
+                    return
+            except Exception as e:
+                db_logger.error("Partition maintenance failed: %s", e)
+            if self.maintenance_seconds <= 0 or self._stop.wait(self.maintenance_seconds):
+                return
+
+
+request_partitions = PartitionManager(
+    table="agent_requests",
+    interval=settings.request_partition_interval,
+    ahead=settings.request_partitions_ahead,
+    retention_days=settings.request_retention_days,
+    archive_dir=settings.request_archive_dir,
+    maintenance_seconds=settings.partition_maintenance_seconds
+)
+
+
+# Manuell ausführen: python -m shared.partitions [--dry-run] [--since 2024-01-01] [--migrate]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Partitionen von agent_requests warten")
+    parser.add_argument("--dry-run", action="store_true", help="Nur abgelaufene Partitionen anzeigen")
+    parser.add_argument("--since", help="Partitionen ab diesem Datum anlegen (ISO)")
+    parser.add_argument("--migrate", action="store_true", help="Unpartitionierte Tabelle umwandeln")
+    args = parser.parse_args()
+
+    if args.migrate:
+        print(request_partitions.migrate())
+        raise SystemExit(0)
+
+    since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc) if args.since else None
+    print(request_partitions.run_maintenance(dry_run=args.dry_run, since=since))
@@ -0,0 +1,77 @@
+"""
+Postgres LISTEN/NOTIFY Listener
+Eine eigene Connection pro Prozess, die in einem Hintergrund-Thread auf
+Notifications wartet und sie an registrierte Callbacks verteilt.
+"""
+from __future__ import annotations
+
+import select
+import threading
+from typing import Callable
+
+from .config import settings
+from .logger import db_logger
+
+RECONNECT_DELAY_SECONDS = 5
+POLL_TIMEOUT_SECONDS = 5
+
+
+class PgListener:
+    """LISTEN auf mehreren Channels mit Callback(payload) pro Channel"""
+
+    def __init__(self):
+        self._callbacks: dict[str, list[Callable[[str], None]]] = {}
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Registriert einen Callback (vor start() aufrufen)"""
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def start(self) -> None:
+        if self._thread is None and self._callbacks:
+            self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                db_logger.warning("LISTEN connection lost, reconnecting: %s", e)
+                self._stop.wait(RECONNECT_DELAY_SECONDS)
+
+    def _listen(self) -> None:
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        conn = psycopg2.connect(settings.database_url)
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                for channel in self._callbacks:
+                    cur.execute(f'LISTEN "{channel}"')
+            db_logger.info("Listening on %s", ", ".join(self._callbacks))
+
+            while not self._stop.is_set():
+                if select.select([conn], [], [], POLL_TIMEOUT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    self._dispatch(notification.channel, notification.payload)
+        finally:
+            conn.close()
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for callback in self._callbacks.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                db_logger.warning("Callback for '%s' failed: %s", channel, e)
+
+
+pg_listener = PgListener()
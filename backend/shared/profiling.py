@@ -0,0 +1,251 @@
+"""
+Profiling
+Sampling-Profiler auf Basis von sys._current_frames() - ohne Zusatzpaket und mit
+geringem Overhead, da der Code selbst nicht instrumentiert wird.
+
+Pro Request (debug=true + Admin-Header oder PROFILE_SAMPLE_RATE) wird der Thread
+des Requests gesampelt, für /chat also der Event Loop. Parallele Requests auf
+demselben Loop tauchen dabei mit auf - genau so wird sichtbar, wenn synchrone
+Arbeit den Loop blockiert. Optional kommen tracemalloc-Deltas dazu.
+
+Für Prozess-Profile werden alle Threads gesampelt und als "collapsed stacks"
+(flamegraph.pl, speedscope) in PROFILE_DIR geschrieben.
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from .config import settings
+
+MAX_STACK_DEPTH = 64
+TOP_FUNCTIONS = 10
+TOP_ALLOCATIONS = 10
+MAX_PROCESS_PROFILE_SECONDS = 60
+
+_labels: dict = {}
+
+
+def _short_path(filename: str) -> str:
+    """Nur Paket und Datei, z.B. `support/agent.py`"""
+    return "/".join(filename.replace("\\", "/").split("/")[-2:])
+
+
+def _label(code) -> str:
+    """Kurzer Funktionsname `paket/datei.py:funktion` (pro Code-Objekt gecacht)"""
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{_short_path(code.co_filename)}:{code.co_name}"
+    return label
+
+
+class StackSampler:
+    """Sammelt in einem Hintergrund-Thread alle `interval` Sekunden die Stacks der Ziel-Threads"""
+
+    def __init__(self, interval: float = 0.005, thread_ids: set[int] | None = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter[tuple] = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "StackSampler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                # Wurzel zuerst
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> list[dict]:
+        """Heißeste Funktionen: self = ganz oben auf dem Stack, total = irgendwo im Stack"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        stack_samples = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        if not stack_samples:
+            return []
+        return [
+            {
+                "function": _label(code),
+                "self_pct": round(100 * count / stack_samples, 1),
+                "total_pct": round(100 * total[code] / stack_samples, 1),
+            }
+            for code, count in own.most_common(limit)
+        ]
+
+    def collapsed(self) -> str:
+        """Stacks im collapsed-Format: `a;b;c <anzahl>` pro Zeile"""
+        return "".join(
+            ";".join(_label(code) for code in stack) + f" {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+
+# ============== tracemalloc ==============
+#
+# tracemalloc ist global und kostet spürbar - es läuft nur solange mindestens ein
+# Profil mit Allokationen aktiv ist (und nur wenn es nicht schon vorher lief).
+
+_trace_lock = threading.Lock()
+_trace_users = 0
+_trace_started_here = False
+
+
+def _acquire_tracemalloc() -> None:
+    global _trace_users, _trace_started_here
+    with _trace_lock:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _trace_started_here = True
+        _trace_users += 1
+
+
+def _release_tracemalloc() -> None:
+    global _trace_users, _trace_started_here
+    with _trace_lock:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_started_here:
+            tracemalloc.stop()
+            _trace_started_here = False
+
+
+def _allocation_delta(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> dict:
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return {
+        "net_kb": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+        "top": [
+            {
+                "location": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "size_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count_diff,
+            }
+            for stat in stats[:TOP_ALLOCATIONS]
+            if stat.size_diff
+        ],
+    }
+
+
+# ============== Request-Profile ==============
+
+def should_profile(requested: bool = False) -> bool:
+    """Explizit angefordert oder per PROFILE_SAMPLE_RATE ausgewählt"""
+    return requested or (settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate)
+
+
+class RequestProfiler:
+    """Profil eines einzelnen Requests (aktueller Thread), Ergebnis als kompaktes dict"""
+
+    def __init__(self, allocations: bool = True):
+        self.allocations = allocations
+        self._sampler = StackSampler(
+            interval=settings.profile_interval_ms / 1000,
+            thread_ids={threading.get_ident()}
+        )
+        self._snapshot: tracemalloc.Snapshot | None = None
+
+    def start(self) -> "RequestProfiler":
+        if self.allocations:
+            _acquire_tracemalloc()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._sampler.start()
+        return self
+
+    def stop(self) -> dict:
+        self._sampler.stop()
+        result = {
+            "samples": self._sampler.samples,
+            "interval_ms": settings.profile_interval_ms,
+            "top_functions": self._sampler.top_functions(),
+        }
+        if self._snapshot is not None:
+            try:
+                result["allocations"] = _allocation_delta(self._snapshot, tracemalloc.take_snapshot())
+            finally:
+                self._snapshot = None
+                _release_tracemalloc()
+        return result
+
+
+# ============== Prozess-Profile ==============
+
+_process_lock = threading.Lock()
+
+
+def capture_process_profile(seconds: float, stop: threading.Event | None = None) -> dict:
+    """
+    Sampelt alle Threads für `seconds` Sekunden und schreibt die Stacks nach PROFILE_DIR.
+    Blockiert - im Server über run_in_threadpool aufrufen. Nur ein Profil gleichzeitig.
+    """
+    if not _process_lock.acquire(blocking=False):
+        raise RuntimeError("Es läuft bereits ein Prozess-Profil")
+    try:
+        seconds = min(seconds, MAX_PROCESS_PROFILE_SECONDS)
+        sampler = StackSampler(interval=settings.profile_interval_ms / 1000).start()
+        (stop or threading.Event()).wait(seconds)
+        sampler.stop()
+
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        path = os.path.join(
+            settings.profile_dir,
+            f"profile_{datetime.utcnow():%Y%m%d_%H%M%S}_{os.getpid()}.folded"
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+
+        return {
+            "path": path,
+            "seconds": round(sampler.duration, 2),
+            "samples": sampler.samples,
+            "top_functions": sampler.top_functions(),
+        }
+    finally:
+        _process_lock.release()
+
+
+# Für direktes Testen
+if __name__ == "__main__":
+    def busy():
+        total = 0
+        for i in range(3_000_000):
+            total += i * i
+        return total
+
+    profiler = RequestProfiler().start()
+    data = [str(i) * 10 for i in range(50_000)]
+    busy()
+    print(profiler.stop())
@@ -0,0 +1,241 @@
+"""
+Query Compiler
+Baut die Statements von SupabaseCompatTable mit psycopg2.sql (Tabellen und Spalten
+als Identifier, Werte immer als Parameter) und cacht sie pro Statement-Form.
+
+Die Form (Tabelle, Spalten, WHERE-Spalten, ORDER BY, LIMIT ja/nein, ...) ist der
+Cache-Key - dieselbe Abfrage mit anderen Werten wird nicht neu gebaut. Wird eine
+Form auf einer Connection PREPARE_THRESHOLD mal ausgeführt, wird sie dort als
+Server-Side Prepared Statement angelegt und danach per EXECUTE ohne Planung ausgeführt.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+# Ausführungen einer Form bevor sie auf einer Connection vorbereitet wird
+PREPARE_THRESHOLD = 5
+STATEMENT_CACHE_SIZE = 512
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _select_list(columns: str):
+    """
+    Spaltenliste: besteht sie nur aus einfachen Namen, werden das Identifier. Sonst (`*`,
+    Ausdrücke wie "COALESCE(a, b) AS x") bleibt die ganze Liste unverändert SQL - Kommas
+    in Ausdrücken werden so nicht zerschnitten. Sie stammt aus dem Code, nie vom Client.
+    """
+    from psycopg2 import sql
+
+    names = [column.strip() for column in columns.split(",")]
+    if all(_IDENTIFIER.match(name) for name in names):
+        return sql.SQL(", ").join(map(sql.Identifier, names))
+    return sql.SQL(columns)
+
+
+def _placeholders(start: int, count: int, numbered: bool) -> list:
+    from psycopg2 import sql
+
+    if numbered:
+        return [sql.SQL(f"${i}") for i in range(start, start + count)]
+    return [sql.SQL("%s")] * count
+
+
+class CompiledStatement:
+    """Eine gecachte Statement-Form: SQL mit %s und als Prepared Statement mit $n"""
+
+    __slots__ = ("name", "_build", "_text", "_prepare_text", "_execute_text", "_uses", "__weakref__")
+
+    def __init__(self, name: str, build):
+        self.name = name
+        self._build = build
+        self._text: str | None = None
+        self._prepare_text: str | None = None
+        self._execute_text: str | None = None
+        self._uses: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def text(self, conn) -> str:
+        """SQL mit %s Platzhaltern"""
+        if self._text is None:
+            self._text = self._build(False).as_string(conn)
+        return self._text
+
+    def statement_for(self, conn, param_count: int) -> tuple[str, str | None]:
+        """
+        (SQL zum Ausführen, PREPARE-Statement oder None).
+        Ab PREPARE_THRESHOLD Ausführungen auf `conn` wird EXECUTE verwendet.
+        """
+        prepared = _prepared_names(conn)
+        if self.name in prepared:
+            return self._execute(param_count), None
+
+        uses = self._uses.get(conn, 0) + 1
+        self._uses[conn] = uses
+        if uses < PREPARE_THRESHOLD:
+            return self.text(conn), None
+
+        if self._prepare_text is None:
+            self._prepare_text = f"PREPARE {self.name} AS " + self._build(True).as_string(conn)
+        return self._execute(param_count), self._prepare_text
+
+    def _execute(self, param_count: int) -> str:
+        if self._execute_text is None:
+            args = ", ".join(["%s"] * param_count)
+            self._execute_text = f"EXECUTE {self.name} ({args})" if param_count else f"EXECUTE {self.name}"
+        return self._execute_text
+
+
+# Connection -> Namen der dort vorbereiteten Statements
+_prepared: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_statements: OrderedDict[tuple, CompiledStatement] = OrderedDict()
+_lock = threading.Lock()
+_counter = 0
+
+
+def _prepared_names(conn) -> set[str]:
+    names = _prepared.get(conn)
+    if names is None:
+        names = _prepared[conn] = set()
+    return names
+
+
+def mark_prepared(conn, statement: CompiledStatement) -> None:
+    _prepared_names(conn).add(statement.name)
+
+
+def forget_prepared(conn, statement: CompiledStatement) -> None:
+    """Statement auf `conn` wieder als nicht vorbereitet markieren (nach DEALLOCATE)"""
+    _prepared_names(conn).discard(statement.name)
+
+
+def _cached(key: tuple, build) -> CompiledStatement:
+    global _counter
+    with _lock:
+        statement = _statements.get(key)
+        if statement is not None:
+            _statements.move_to_end(key)
+            return statement
+        _counter += 1
+        statement = _statements[key] = CompiledStatement(f"compat_{_counter}", build)
+        if len(_statements) > STATEMENT_CACHE_SIZE:
+            _statements.popitem(last=False)
+        return statement
+
+
+def compile_select(
+    table: str,
+    columns: str = "*",
+    where: tuple[str, ...] = (),
+    order_by: str | None = None,
+    desc: bool = False,
+    limit: bool = False
+) -> CompiledStatement:
+    """SELECT columns FROM table WHERE a = ? AND ... ORDER BY x [DESC] [LIMIT ?]"""
+    key = ("select", table, columns, where, order_by, desc, limit)
+
+    def build(numbered: bool):
+        from psycopg2 import sql
+
+        query = sql.SQL("SELECT {} FROM {}").format(_select_list(columns), sql.Identifier(table))
+        params = _placeholders(1, len(where) + int(limit), numbered)
+        if where:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+                sql.SQL("{} = ").format(sql.Identifier(column)) + param
+                for column, param in zip(where, params)
+            )
+        if order_by:
+            query += sql.SQL(" ORDER BY {}").format(sql.Identifier(order_by))
+            if desc:
+                query += sql.SQL(" DESC")
+        if limit:
+            query += sql.SQL(" LIMIT ") + params[-1]
+        return query
+
+    return _cached(key, build)
+
+
+def compile_insert(table: str, columns: tuple[str, ...], returning: str | None = "*") -> CompiledStatement:
+    """INSERT INTO table (columns) VALUES (?, ...) [RETURNING ...] für einen Datensatz"""
+    key = ("insert", table, columns, returning)
+
+    def build(numbered: bool):
+        from psycopg2 import sql
+
+        query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(map(sql.Identifier, columns)),
+            sql.SQL(", ").join(_placeholders(1, len(columns), numbered))
+        )
+        if returning:
+            query += sql.SQL(" RETURNING ") + _select_list(returning)
+        return query
+
+    return _cached(key, build)
+
+
+def compile_bulk_insert(
+    table: str,
+    columns: tuple[str, ...],
+    returning: str | None = "*",
+    on_conflict: tuple[str, ...] = (),
+    ignore_duplicates: bool = False
+) -> CompiledStatement:
+    """
+    INSERT INTO table (columns) VALUES %s [ON CONFLICT ...] [RETURNING ...] für execute_values.
+    Wird nur über text() verwendet (execute_values setzt die Zeilen selbst ein, kein PREPARE).
+    Mit `on_conflict` werden die übrigen Spalten aktualisiert, mit `ignore_duplicates` nicht.
+    """
+    key = ("bulk_insert", table, columns, returning, on_conflict, ignore_duplicates)
+
+    def build(numbered: bool):
+        from psycopg2 import sql
+
+        query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        if on_conflict:
+            query += sql.SQL(" ON CONFLICT ({})").format(sql.SQL(", ").join(map(sql.Identifier, on_conflict)))
+            updates = [column for column in columns if column not in on_conflict]
+            if ignore_duplicates or not updates:
+                query += sql.SQL(" DO NOTHING")
+            else:
+                query += sql.SQL(" DO UPDATE SET ") + sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in updates
+                )
+        if returning:
+            query += sql.SQL(" RETURNING ") + _select_list(returning)
+        return query
+
+    return _cached(key, build)
+
+
+def compile_update(
+    table: str,
+    columns: tuple[str, ...],
+    where: tuple[str, ...],
+    returning: str | None = "*"
+) -> CompiledStatement:
+    """UPDATE table SET a = ?, ... WHERE b = ? AND ... [RETURNING ...]"""
+    key = ("update", table, columns, where, returning)
+
+    def build(numbered: bool):
+        from psycopg2 import sql
+
+        params = _placeholders(1, len(columns) + len(where), numbered)
+        query = sql.SQL("UPDATE {} SET ").format(sql.Identifier(table)) + sql.SQL(", ").join(
+            sql.SQL("{} = ").format(sql.Identifier(column)) + param
+            for column, param in zip(columns, params)
+        )
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+            sql.SQL("{} = ").format(sql.Identifier(column)) + param
+            for column, param in zip(where, params[len(columns):])
+        )
+        if returning:
+            query += sql.SQL(" RETURNING ") + _select_list(returning)
+        return query
+
+    return _cached(key, build)
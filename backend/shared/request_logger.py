@@ -4,18 +4,53 @@ Speichert alle Agent-Requests in der Datenbank für Monitoring.
 """
 from __future__ import annotations
 
-from .database import get_supabase
+from .analytics import rollups
+from .blob_store import store_blob, load_blobs
+from .database import get_supabase, execute_query
 from .debug_tracker import DebugTracker
 from .logger import db_logger
+from .tracing import traced
 
 
+def _dedupe_prompts(tracker: DebugTracker, debug_info: dict) -> dict:
+    """
+    Ersetzt die Prompts in debug_info durch Blob-Referenzen.
+    System-Prompt und FAQ-Kontext werden vollständig (ungekürzt) einmal gespeichert,
+    im Request bleibt nur der individuelle Rest des User-Prompts.
+    """
+    llm = tracker.llm_call
+    if llm is None or "system_prompt" not in debug_info.get("llm_call", {}):
+        return debug_info
+
+    try:
+        llm_call = {
+            k: v for k, v in debug_info["llm_call"].items()
+            if k not in ("system_prompt", "user_prompt")
+        }
+        llm_call["system_prompt_ref"] = store_blob(llm.system_prompt)
+
+        user_prompt = llm.user_prompt
+        if llm.context and user_prompt.startswith(llm.context):
+            llm_call["context_ref"] = store_blob(llm.context)
+            user_prompt = user_prompt[len(llm.context):]
+        llm_call["user_prompt"] = user_prompt
+
+        return {**debug_info, "llm_call": llm_call}
+    except Exception as e:
+        db_logger.warning("Prompt deduplication failed, storing inline: %s", e)
+        return debug_info
+
+
+@traced("log_request")
 async def log_request(
     tracker: DebugTracker,
     user_message: str,
-    response: str | None = None
+    response: str | None = None,
+    escalated: bool = False
 ) -> bool:
     """
-    Speichert einen Request in der agent_requests Tabelle.
+    Speichert einen Request in der agent_requests Tabelle
+    und zählt ihn in die Analytics-Rollups.
     """
     try:
         supabase = get_supabase()
@@ -24,6 +59,17 @@ async def log_request(
         llm_call = debug_info.get("llm_call", {})
         grounding = debug_info.get("grounding", {})
 
+        rollups.add_request(
+            agent=debug_info.get("agent"),
+            latency_ms=debug_info.get("processing_time_ms"),
+            input_tokens=llm_call.get("input_tokens"),
+            output_tokens=llm_call.get("output_tokens"),
+            cost_usd=llm_call.get("cost_usd"),
+            hallucination_risk=grounding.get("hallucination_risk"),
+            escalated=escalated,
+            error="error" in debug_info
+        )
+
         data = {
             "request_id": debug_info.get("request_id"),
             "agent": debug_info.get("agent"),
@@ -37,14 +83,59 @@ async def log_request(
             "confidence": grounding.get("confidence"),
             "hallucination_risk": grounding.get("hallucination_risk"),
             "data_points_count": grounding.get("data_points_count"),
-            "debug_info": debug_info
+            "debug_info": _dedupe_prompts(tracker, debug_info)
         }
 
         data = {k: v for k, v in data.items() if v is not None}
 
-        supabase.table("agent_requests").insert(data).execute()
+        supabase.table("agent_requests").insert(data, returning=None).execute()
         return True
 
     except Exception as e:
-        db_logger.warning(f"Error logging request to database: {e}")
+        db_logger.warning("Error logging request to database: %s", e)
         return False
+
+
+def get_frequent_questions(limit: int, days: int = 7) -> list[str]:
+    """Gibt die häufigsten Nutzerfragen der letzten `days` Tage zurück"""
+    rows = execute_query(
+        """
+        SELECT user_message, COUNT(*) AS hits
+        FROM agent_requests
+        WHERE user_message IS NOT NULL
+          AND created_at > NOW() - make_interval(days => %s)
+        GROUP BY user_message
+        ORDER BY hits DESC
+        LIMIT %s
+        """,
+        (days, limit)
+    )
+    return [row["user_message"] for row in rows or []]
+
+
+def hydrate_debug_info(debug_info: dict) -> dict:
+    """Setzt die vollständigen Prompts aus den Blob-Referenzen wieder ein"""
+    llm_call = (debug_info or {}).get("llm_call") or {}
+    system_ref = llm_call.get("system_prompt_ref")
+    context_ref = llm_call.get("context_ref")
+    if not system_ref and not context_ref:
+        return debug_info
+
+    blobs = load_blobs([system_ref, context_ref])
+    hydrated = {
+        k: v for k, v in llm_call.items()
+        if k not in ("system_prompt_ref", "context_ref")
+    }
+    hydrated["system_prompt"] = blobs.get(system_ref, "")
+    hydrated["user_prompt"] = blobs.get(context_ref, "") + llm_call.get("user_prompt", "")
+    return {**debug_info, "llm_call": hydrated}
+
+
+def get_request_record(request_id: str) -> dict | None:
+    """Lädt einen geloggten Request inkl. vollständiger Prompts (für die Debug-UI)"""
+    result = get_supabase().table("agent_requests").select("*").eq("request_id", request_id).single().execute()
+    if not result.data:
+        return None
+    record = result.data
+    record["debug_info"] = hydrate_debug_info(record.get("debug_info"))
+    return record
@@ -0,0 +1,94 @@
+"""
+Response Cache
+Read-through Cache für fertig serialisierte JSON-Responses mit ETag.
+
+Jede Invalidierung erhöht eine Generation. Ein Eintrag wird nur gespeichert, wenn
+sich die Generation seit Beginn des DB-Reads nicht geändert hat - ein Read der
+parallel zu einem Write lief, kann so keinen veralteten Stand in den Cache legen.
+Die TTL fängt Änderungen ab, von denen der Prozess nichts mitbekommt.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Serialisierter Body und sein ETag"""
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Prüft einen If-None-Match Header (Liste, Weak-ETags und `*`)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """LRU-Cache mit TTL, Generationen und gruppenweiser Invalidierung"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Vor dem DB-Read merken und an put() übergeben"""
+        return self._generation
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, body: bytes, generation: int) -> CachedResponse:
+        """Speichert den Body (wenn seit `generation` nichts invalidiert wurde)"""
+        entry = CachedResponse(body=body, etag=make_etag(body), stored_at=time.monotonic())
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *keys: Hashable, groups: tuple[str, ...] = ()) -> None:
+        """
+        Entfernt einzelne Keys und alle Keys deren erstes Element in `groups` liegt
+        (z.B. groups=("tickets",) für alle Listen-Varianten). Ohne Argumente: alles.
+        """
+        with self._lock:
+            self._generation += 1
+            if not keys and not groups:
+                self._entries.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+            if groups:
+                for key in [k for k in self._entries if isinstance(k, tuple) and k and k[0] in groups]:
+                    del self._entries[key]
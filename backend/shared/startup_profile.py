@@ -0,0 +1,99 @@
+"""
+Startup Profiling
+Misst die Import-Zeit des Servers mit `python -X importtime`.
+
+Aufruf aus dem backend/ Verzeichnis:
+    python -m shared.startup_profile --top 20
+    python -m shared.startup_profile --budget-ms 800   # Exit-Code 1 bei Überschreitung
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportTiming:
+    """Import-Zeit eines einzelnen Moduls (Mikrosekunden)"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str = "api_server") -> list[ImportTiming]:
+    """Importiert `module` in einem frischen Interpreter und parst die -X importtime Ausgabe"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import von {module} fehlgeschlagen:\n{proc.stderr[-2000:]}")
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings.append(ImportTiming(
+            module=name.strip(),
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=(len(name) - len(name.lstrip())) // 2,
+        ))
+    return timings
+
+
+def total_import_ms(timings: list[ImportTiming], module: str = "api_server") -> float:
+    """Kumulierte Import-Zeit des Root-Moduls in Millisekunden"""
+    for timing in timings:
+        if timing.module == module:
+            return timing.cumulative_us / 1000
+    return sum(t.self_us for t in timings) / 1000
+
+
+def by_package(timings: list[ImportTiming]) -> dict[str, int]:
+    """Summiert die Self-Time pro Top-Level-Package"""
+    totals: dict[str, int] = {}
+    for timing in timings:
+        package = timing.module.split(".")[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-Zeit Profil des API Servers")
+    parser.add_argument("--module", default="api_server")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=settings.startup_import_budget_ms)
+    args = parser.parse_args(argv)
+
+    timings = profile_imports(args.module)
+    total_ms = total_import_ms(timings, args.module)
+
+    print(f"Import {args.module}: {total_ms:.1f} ms (Budget: {args.budget_ms:.0f} ms)\n")
+    print("Pro Package (self):")
+    for package, self_us in list(by_package(timings).items())[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    print("\nModule (kumulativ):")
+    for timing in sorted(timings, key=lambda t: t.cumulative_us, reverse=True)[:args.top]:
+        print(f"  {timing.cumulative_us / 1000:8.1f} ms  {timing.module}")
+
+    if total_ms > args.budget_ms:
+        print(f"\nFEHLER: Import-Budget überschritten ({total_ms:.1f} ms > {args.budget_ms:.0f} ms)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Text Chunking
+Zerlegt längere Texte (z.B. FAQ-Antworten) in Passagen für einen Passage-Index.
+
+Tokens werden grob mit ~4 Zeichen pro Token geschätzt - genau genug für Budgets,
+ohne tiktoken als Dependency.
+"""
+from __future__ import annotations
+
+import re
+
+CHARS_PER_TOKEN = 4
+
+# Passagen zwischen MIN und MAX Tokens (kurze Absätze werden zusammengefasst)
+PASSAGE_MAX_TOKENS = 120
+PASSAGE_MIN_TOKENS = 30
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n|\n(?=\s*(?:[-*•]|\d+[.)])\s)")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Grobe Token-Schätzung (aufgerundet)"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _split_long(paragraph: str, max_tokens: int) -> list[str]:
+    """Zu lange Absätze an Satzgrenzen teilen"""
+    parts: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_SPLIT.split(paragraph):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            parts.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_passages(
+    text: str,
+    max_tokens: int = PASSAGE_MAX_TOKENS,
+    min_tokens: int = PASSAGE_MIN_TOKENS
+) -> list[str]:
+    """
+    Teilt einen Text an Absätzen bzw. Listenpunkten in Passagen.
+    Kurze Absätze werden mit dem nächsten zusammengefasst, lange an Satzgrenzen geteilt.
+    """
+    pieces: list[str] = []
+    for paragraph in _PARAGRAPH_SPLIT.split(text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            pieces.extend(_split_long(paragraph, max_tokens))
+        else:
+            pieces.append(paragraph)
+
+    passages: list[str] = []
+    for piece in pieces:
+        if (
+            passages
+            and estimate_tokens(passages[-1]) < min_tokens
+            and estimate_tokens(passages[-1]) + estimate_tokens(piece) <= max_tokens
+        ):
+            passages[-1] = f"{passages[-1]}\n{piece}"
+        else:
+            passages.append(piece)
+    return passages
+
+
+# Für direktes Testen
+if __name__ == "__main__":
+    sample = (
+        "Du kannst dein Passwort in der App zurücksetzen.\n\n"
+        "1. Öffne die Einstellungen.\n"
+        "2. Tippe auf 'Passwort vergessen'.\n"
+        "3. Folge dem Link in der E-Mail.\n\n"
+        + "Falls keine E-Mail ankommt, prüfe deinen Spam-Ordner. " * 12
+    )
+    for i, passage in enumerate(split_passages(sample), 1):
+        print(f"--- Passage {i} ({estimate_tokens(passage)} Tokens) ---\n{passage}\n")
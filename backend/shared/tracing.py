@@ -0,0 +1,346 @@
+"""
+Tracing
+Verschachtelte Spans pro Request, W3C `traceparent` für eingehende Trace-Kontexte
+und Batch-Export im OTLP/JSON Format - per HTTP an einen Collector
+(z.B. http://localhost:4318/v1/traces) oder als NDJSON in eine Datei.
+
+Ohne TRACING_EXPORTER ist alles ein No-op: `span()` gibt einen geteilten leeren
+Span zurück, es werden weder IDs erzeugt noch Context-Variablen gesetzt.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from .config import settings
+from .logger import api_logger
+
+EXPORTERS = ("otlp", "file")
+
+# Spans pro Export-Batch und maximal gepufferte Spans (ältere werden verworfen)
+EXPORT_BATCH_SIZE = 512
+MAX_QUEUED_SPANS = 4096
+EXPORT_INTERVAL_SECONDS = 5.0
+
+# OTLP SpanKind / StatusCode
+_KINDS = {"internal": 1, "server": 2, "client": 3}
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+class Span:
+    """Ein Abschnitt eines Traces mit Attributen (nur gesampelte Spans werden exportiert)"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind", "sampled",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        kind: str = "internal",
+        sampled: bool = True
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes: dict[str, Any] = {}
+        self.status = _STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = _STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                _processor.enqueue(self)
+
+
+class _NoopSpan:
+    """Ersatz wenn Tracing aus ist - alle Methoden tun nichts"""
+
+    trace_id = None
+    span_id = None
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def enabled() -> bool:
+    return settings.tracing_exporter in EXPORTERS
+
+
+def current_span() -> Span | _NoopSpan:
+    return _current.get() or NOOP_SPAN
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace_id, parent_span_id, sampled) aus einem W3C traceparent Header"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+@contextmanager
+def span(
+    name: str,
+    attributes: dict[str, Any] | None = None,
+    kind: str = "internal",
+    traceparent: str | None = None
+) -> Iterator[Span | _NoopSpan]:
+    """
+    Öffnet einen Span als Kind des aktuellen Spans. Ohne aktuellen Span beginnt ein
+    neuer Trace - mit `traceparent` (eingehender Header) als Fortsetzung des Aufrufers.
+    """
+    if not enabled():
+        yield NOOP_SPAN
+        return
+
+    parent = _current.get()
+    if parent is not None:
+        current = Span(name, parent.trace_id, parent.span_id, kind, parent.sampled)
+    else:
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            current = Span(name, remote[0], remote[1], kind, sampled=remote[2])
+        else:
+            sampled = random.random() < settings.trace_sample_rate
+            current = Span(name, f"{random.getrandbits(128):032x}", None, kind, sampled)
+
+    if attributes:
+        current.set_attributes(attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(name: str | None = None, kind: str = "internal"):
+    """Decorator: die ganze Funktion (sync oder async) läuft in einem Span"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled():
+                    return await func(*args, **kwargs)
+                with span(span_name, kind=kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with span(span_name, kind=kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# ============== Export ==============
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: Span) -> dict:
+    result = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": _KINDS.get(s.kind, 1),
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+        "status": {"code": s.status},
+    }
+    if s.parent_id:
+        result["parentSpanId"] = s.parent_id
+    if s.status_message:
+        result["status"]["message"] = s.status_message
+    return result
+
+
+def to_otlp(spans: list[Span]) -> dict:
+    """ExportTraceServiceRequest im OTLP/JSON Format"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.tracing_service_name}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "shared.tracing"},
+                "spans": [_otlp_span(s) for s in spans],
+            }],
+        }]
+    }
+
+
+class BatchSpanProcessor:
+    """Puffert beendete Spans und exportiert sie gesammelt aus einem Hintergrund-Thread"""
+
+    def __init__(self, max_queued: int = MAX_QUEUED_SPANS, batch_size: int = EXPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: deque[Span] = deque(maxlen=max_queued)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._client = None
+
+    def enqueue(self, s: Span) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(s)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        if self._thread is None:
+            self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None and enabled():
+                self._thread = threading.Thread(target=self._run, name="span-export", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Exportiert den Rest und beendet den Thread"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def flush(self) -> int:
+        exported = 0
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            try:
+                self._export(batch)
+                exported += len(batch)
+            except Exception as e:
+                # Tracing darf den Server nie stören - Batch verwerfen
+                self.dropped += len(batch)
+                api_logger.warning("Span export failed (%d spans dropped): %s", len(batch), e)
+                break
+        return exported
+
+    def _export(self, batch: list[Span]) -> None:
+        from . import fast_json
+
+        payload = fast_json.dumps_bytes(to_otlp(batch))
+        if settings.tracing_exporter == "file":
+            with open(settings.tracing_file, "ab") as f:
+                f.write(payload + b"\n")
+            return
+
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.Client(timeout=5.0)
+        response = self._client.post(
+            settings.otlp_endpoint,
+            content=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(EXPORT_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            self.flush()
+
+
+_processor = BatchSpanProcessor()
+
+
+def shutdown() -> None:
+    """Beim Server-Shutdown aufrufen, damit keine Spans verloren gehen"""
+    if enabled():
+        _processor.stop()
+
+
+# Für direktes Testen: TRACING_EXPORTER=file python -m shared.tracing
+if __name__ == "__main__":
+    @traced()
+    def inner():
+        current_span().set_attribute("rows", 3)
+        time.sleep(0.01)
+
+    with span("request", kind="server", traceparent="00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01") as root:
+        inner()
+    shutdown()
+    print(root.traceparent, f"-> {settings.tracing_exporter or 'disabled'}")
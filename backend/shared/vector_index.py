@@ -0,0 +1,324 @@
+"""
+Vector Index
+Vektorisierte Kosinus-Suche über eine Embedding-Matrix.
+
+Die Matrix für den Scan kann kompakt gehalten werden:
+- "float32": exakt, 4 Byte pro Dimension
+- "float16": 2 Byte pro Dimension
+- "int8":    1 Byte pro Dimension + ein float32 Skalierungsfaktor pro Vektor
+
+Optional läuft der Scan nur über die ersten `coarse_dim` Dimensionen (renormalisiert).
+Das funktioniert bei text-embedding-3 Modellen, deren Embeddings sich wie beim
+`dimensions` Parameter der API kürzen lassen.
+
+Ist die Scan-Matrix nicht die float32-Vollmatrix, werden die besten
+`k * rescore_factor` Kandidaten anschließend mit den vollen float32 Vektoren
+exakt nachbewertet - die zurückgegebenen Scores sind also exakt. Die Vollmatrix
+liegt dann nicht im Heap, sondern als memmap auf Disk (Snapshot bzw. temporäre
+Datei): pro Suche werden nur die Zeilen der Kandidaten gelesen.
+
+Der int8-Scan rechnet mit int8-Codes und quantisierter Query (int32-Akkumulator).
+NumPy hat keine float16-Kernel, float16 wird daher blockweise nach float32
+umgewandelt - es spart Speicher, aber keine Rechenzeit.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+# Zeilen pro Block beim float16-Scan (begrenzt die temporäre float32-Kopie)
+SCAN_BLOCK_ROWS = 256
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalisiert jede Zeile (Nullvektoren bleiben Null)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetrische int8-Quantisierung mit einem Skalierungsfaktor pro Vektor"""
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = (max_abs / 127.0).astype(np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def spill_to_disk(array: np.ndarray) -> np.memmap:
+    """Schreibt ein Array in eine anonyme temporäre Datei und mappt es read-only (Page Cache statt Heap)"""
+    import tempfile
+
+    if array.size == 0:
+        return array
+    with tempfile.TemporaryFile() as f:
+        np.ascontiguousarray(array).tofile(f)
+        f.flush()
+        # Das Mapping bleibt nach dem Schließen gültig, die Datei verschwindet mit ihm
+        return np.memmap(f, dtype=array.dtype, mode="r", shape=array.shape)
+
+
+@dataclass
+class SearchResult:
+    """Treffer einer Suche: (Zeile, Score) absteigend sortiert"""
+    hits: list[tuple[int, float]] = field(default_factory=list)
+    above_threshold: int = 0
+
+
+class VectorIndex:
+    """Kosinus-Suche über normalisierte Vektoren (exakter bzw. quantisierter Flat-Scan)"""
+
+    kind = "flat"
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        precision: str = "float32",
+        rescore_factor: int = 4,
+        normalized: bool = False,
+        coarse_dim: int | None = None
+    ):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unbekannte Precision '{precision}', erlaubt: {', '.join(PRECISIONS)}")
+
+        self.precision = precision
+        self.rescore_factor = max(1, rescore_factor)
+        self.full = vectors if normalized else normalize_rows(vectors)
+        self.coarse_dim = coarse_dim if coarse_dim and coarse_dim < self.full.shape[1] else None
+        self.scales: np.ndarray | None = None
+
+        scan = normalize_rows(self.full[:, :self.coarse_dim]) if self.coarse_dim else self.full
+        if precision == "float32":
+            self.codes = scan
+        elif precision == "float16":
+            self.codes = scan.astype(np.float16)
+        else:
+            self.codes, self.scales = quantize_int8(scan)
+
+        if self.rescores:
+            # Nur für das Nachbewerten weniger Kandidaten - muss nicht im Speicher liegen
+            self.full = spill_to_disk(self.full)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        full: np.ndarray,
+        codes: np.ndarray | None = None,
+        scales: np.ndarray | None = None,
+        precision: str = "float32",
+        rescore_factor: int = 4,
+        coarse_dim: int | None = None
+    ) -> "VectorIndex":
+        """Baut einen Index aus bereits normalisierten/quantisierten Arrays (z.B. np.memmap)"""
+        index = cls.__new__(cls)
+        index.precision = precision
+        index.rescore_factor = max(1, rescore_factor)
+        index.coarse_dim = coarse_dim
+        index.full = full
+        index.codes = full if codes is None else codes
+        index.scales = scales
+        return index
+
+    def state(self) -> tuple[dict, dict[str, np.ndarray]]:
+        """Parameter und Arrays zum Speichern (siehe vector_snapshot)"""
+        arrays = {"full": self.full}
+        if self.rescores:
+            arrays["codes"] = self.codes
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        params = {
+            "kind": self.kind,
+            "precision": self.precision,
+            "coarse_dim": self.coarse_dim,
+            "dim": self.dim,
+        }
+        return params, arrays
+
+    @classmethod
+    def from_state(cls, params: dict, arrays: dict[str, np.ndarray], rescore_factor: int = 4) -> "VectorIndex":
+        return cls.from_arrays(
+            arrays["full"],
+            codes=arrays.get("codes"),
+            scales=arrays.get("scales"),
+            precision=params["precision"],
+            rescore_factor=rescore_factor,
+            coarse_dim=params.get("coarse_dim")
+        )
+
+    def __len__(self) -> int:
+        return self.full.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.full.shape[1]
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Speicher der Scan-Matrix in Bytes"""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @property
+    def rescore_nbytes(self) -> int:
+        """Größe der float32-Matrix für das Nachbewerten (memmap, 0 wenn identisch mit dem Scan)"""
+        return self.full.nbytes if self.rescores else 0
+
+    @property
+    def rescores(self) -> bool:
+        """True wenn der Scan approximativ ist und exakt nachbewertet wird"""
+        return self.codes is not self.full
+
+    def _scan(self, query: np.ndarray) -> np.ndarray:
+        """Approximative Scores für alle Zeilen, blockweise berechnet"""
+        if self.coarse_dim:
+            query = query[:self.coarse_dim]
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+
+        if self.precision == "float32":
+            return self.codes @ query
+
+        if self.precision == "int8":
+            query_codes, query_scale = quantize_int8(query[None, :])
+            dots = np.einsum("ij,j->i", self.codes, query_codes[0], dtype=np.int32)
+            return dots.astype(np.float32) * (self.scales * query_scale[0])
+
+        scores = np.empty(len(self), dtype=np.float32)
+        block = np.empty((SCAN_BLOCK_ROWS, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), SCAN_BLOCK_ROWS):
+            rows = self.codes[start:start + SCAN_BLOCK_ROWS]
+            np.copyto(block[:len(rows)], rows)
+            scores[start:start + len(rows)] = block[:len(rows)] @ query
+        return scores
+
+    def search(self, query, k: int, threshold: float | None = None) -> SearchResult:
+        """Findet die k ähnlichsten Vektoren (optional nur Scores >= threshold)"""
+        if len(self) == 0 or k <= 0:
+            return SearchResult()
+
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return SearchResult()
+        query = query / norm
+
+        scores = self._scan(query)
+
+        # Kandidaten grob auswählen, dann exakt nachbewerten
+        n_candidates = k * self.rescore_factor if self.rescores else k
+        n_candidates = min(n_candidates, len(self))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        if self.rescores:
+            exact = self.full[candidates] @ query
+        else:
+            exact = scores[candidates]
+
+        order = np.argsort(-exact)[:k]
+        hits = [(int(candidates[i]), float(exact[i])) for i in order]
+
+        if threshold is not None:
+            hits = [(row, score) for row, score in hits if score >= threshold]
+            above = int(np.count_nonzero(scores >= threshold))
+        else:
+            above = len(self)
+
+        return SearchResult(hits=hits, above_threshold=above)
+
+
+def synthetic_embeddings(n: int, dim: int = 1536, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Geclusterte Zufallsvektoren die grob wie Text-Embeddings verteilt sind"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * 0.6
+    return normalize_rows(centers[labels] + noise)
+
+
+def synthetic_embeddings_spectrum(n: int, dim: int = 1536, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Wie synthetic_embeddings, aber die Varianz fällt über die Dimensionen ab - wie bei
+    den kürzbaren text-embedding-3 Vektoren (Szenario für den zweistufigen Scan).
+    """
+    rng = np.random.default_rng(seed)
+    spectrum = (1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32) * spectrum
+    labels = rng.integers(0, clusters, size=n)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors *= 0.6 * spectrum
+    vectors += centers[labels]
+    return normalize_rows(vectors)
+
+
+def recall_at_k(index, vectors: np.ndarray, queries: np.ndarray, k: int) -> float:
+    """Anteil der exakten Top-k Treffer die der Index findet"""
+    found = 0
+    exact_scores = queries @ vectors.T
+    for query, row_scores in zip(queries, exact_scores):
+        truth = set(np.argpartition(-row_scores, k - 1)[:k].tolist())
+        found += len(truth & {row for row, _ in index.search(query, k).hits})
+    return found / (len(queries) * k)
+
+
+def _benchmark(name: str, index, vectors: np.ndarray, queries: np.ndarray, k: int) -> None:
+    import time
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, k)
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = recall_at_k(index, vectors, queries, k)
+    print(
+        f"  {name:24s} scan: {index.scan_nbytes / 1e6:7.1f} MB "
+        f"(+ {index.rescore_nbytes / 1e6:6.1f} MB rescore auf Disk) | "
+        f"{latency_ms:7.2f} ms/query | recall@{k} {recall:.3f}"
+    )
+
+
+# Benchmark:
+#   python -m shared.vector_index                      Precision-Vergleich bei 10k FAQs
+#   python -m shared.vector_index --two-stage --sizes 10000,50000,100000
+# Mit --spectrum stammen die Daten aus synthetic_embeddings_spectrum (abfallende Varianz
+# über die Dimensionen wie bei text-embedding-3, Queries mit weniger Rauschen).
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vector Index Benchmark")
+    parser.add_argument("--sizes", default="10000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--two-stage", action="store_true")
+    parser.add_argument("--spectrum", action="store_true", help="Szenario mit abfallendem Spektrum")
+    parser.add_argument("--coarse-dim", type=int, default=256)
+    parser.add_argument("--rescore-factor", type=int, default=10)
+    args = parser.parse_args()
+
+    generate = synthetic_embeddings_spectrum if args.spectrum else synthetic_embeddings
+    query_noise = 0.03 if args.spectrum else 0.3
+    scenario = "Spektrum" if args.spectrum else "Cluster"
+
+    for n in [int(size) for size in args.sizes.split(",")]:
+        vectors = generate(n, dim=args.dim)
+        noise = np.random.default_rng(1).standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries = normalize_rows(vectors[:args.queries] + noise * query_noise)
+
+        print(f"{n} Vektoren x {args.dim} dim, k={args.k} (Szenario: {scenario}, Query-Rauschen {query_noise})")
+        if not args.two_stage:
+            print(f"  Python list[float] (bisher): ~{n * (args.dim * 32 + 56) / 1e6:.1f} MB")
+            for precision in PRECISIONS:
+                _benchmark(precision, VectorIndex(vectors, precision=precision, normalized=True),
+                           vectors, queries, args.k)
+            continue
+
+        _benchmark("exakt float32", VectorIndex(vectors, normalized=True), vectors, queries, args.k)
+        for precision in ("float32", "int8"):
+            index = VectorIndex(
+                vectors, precision=precision, normalized=True,
+                coarse_dim=args.coarse_dim, rescore_factor=args.rescore_factor
+            )
+            _benchmark(f"{args.coarse_dim}d {precision} -> {args.dim}d", index, vectors, queries, args.k)
@@ -0,0 +1,205 @@
+"""
+Vector Snapshots
+Versionierte, read-only memory-mapped Snapshots eines Index inkl. Metadaten.
+
+Alle uvicorn-Worker mappen dieselben Dateien und teilen sich damit die Pages
+im Page Cache. Layout:
+
+    <dir>/CURRENT                  Name der aktiven Version
+    <dir>/v-<version>/manifest.json
+    <dir>/v-<version>/<array>.npy  Arrays aus index.state() (z.B. full, codes, scales)
+    <dir>/v-<version>/ids.npy      int64
+    <dir>/v-<version>/offsets.npy  int64 (n, fields, 2) Start/Ende in text.bin, -1 = None
+    <dir>/v-<version>/text.bin     UTF-8 Texte aller Felder
+
+Eine neue Version wird in ein temporäres Verzeichnis geschrieben, umbenannt und
+erst dann per os.replace() in CURRENT aktiviert - Leser sehen nie einen halben Snapshot.
+
+Das Manifest trägt FORMAT_VERSION. Snapshots in einem anderen Format werden beim
+Öffnen mit SnapshotFormatError abgelehnt und beim Veröffentlichen überschrieben.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from .ann_index import IVFIndex
+from .vector_index import VectorIndex
+
+INDEX_CLASSES = {VectorIndex.kind: VectorIndex, IVFIndex.kind: IVFIndex}
+
+# Bei jeder inkompatiblen Änderung an Manifest oder Arrays erhöhen
+FORMAT_VERSION = 3
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_VERSIONS = 2
+
+
+class SnapshotFormatError(ValueError):
+    """Snapshot wurde mit einem anderen FORMAT_VERSION geschrieben"""
+
+
+def _read_manifest(path: Path) -> dict:
+    manifest = json.loads((path / "manifest.json").read_text())
+    if manifest.get("format") != FORMAT_VERSION:
+        raise SnapshotFormatError(
+            f"Snapshot {path.name} hat Format {manifest.get('format')}, erwartet {FORMAT_VERSION}"
+        )
+    return manifest
+
+
+class SnapshotRecords:
+    """Lazy Zugriff auf die Metadaten eines Snapshots (dekodiert erst beim Lesen)"""
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, text: np.ndarray, fields: list[str]):
+        self._ids = ids
+        self._offsets = offsets
+        self._text = text
+        self._fields = fields
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, row: int) -> dict:
+        record = {"id": int(self._ids[row])}
+        for i, name in enumerate(self._fields):
+            start, end = self._offsets[row, i]
+            record[name] = None if start < 0 else self._text[start:end].tobytes().decode("utf-8")
+        return record
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class VectorSnapshotStore:
+    """Schreibt und öffnet Snapshots in einem Verzeichnis"""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    def current_version(self) -> str | None:
+        try:
+            return (self.directory / CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def lock(self):
+        """Exklusiver Lock über Prozesse hinweg (nur ein Worker baut neu)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / LOCK_FILE, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, version: str, index: VectorIndex | IVFIndex, records: list[dict], fields: list[str]) -> None:
+        """Schreibt eine neue Version und aktiviert sie atomar"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        final_dir = self.directory / f"v-{version}"
+        if final_dir.exists() and not self._readable(final_dir):
+            shutil.rmtree(final_dir, ignore_errors=True)
+        if not final_dir.exists():
+            tmp_dir = self.directory / f"tmp-{version}-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir()
+            self._write(tmp_dir, version, index, records, fields)
+            os.replace(tmp_dir, final_dir)
+
+        tmp_current = self.directory / f"{CURRENT_FILE}.{os.getpid()}"
+        tmp_current.write_text(version)
+        os.replace(tmp_current, self.directory / CURRENT_FILE)
+        self._cleanup(version)
+
+    def open(
+        self,
+        version: str | None = None,
+        rescore_factor: int = 4
+    ) -> tuple[VectorIndex | IVFIndex, SnapshotRecords, dict]:
+        """Mappt eine Version read-only (Default: CURRENT)"""
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"Kein Snapshot in {self.directory}")
+        path = self.directory / f"v-{version}"
+        manifest = _read_manifest(path)
+
+        params = manifest["index"]
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in manifest["arrays"]}
+        index = INDEX_CLASSES[params["kind"]].from_state(params, arrays, rescore_factor=rescore_factor)
+
+        records = SnapshotRecords(
+            ids=np.load(path / "ids.npy", mmap_mode="r"),
+            offsets=np.load(path / "offsets.npy", mmap_mode="r"),
+            text=np.memmap(path / "text.bin", dtype=np.uint8, mode="r")
+            if manifest["text_bytes"] else np.zeros(0, dtype=np.uint8),
+            fields=manifest["fields"],
+        )
+        return index, records, manifest
+
+    def _write(
+        self,
+        path: Path,
+        version: str,
+        index: VectorIndex | IVFIndex,
+        records: list[dict],
+        fields: list[str]
+    ):
+        params, arrays = index.state()
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", np.ascontiguousarray(array))
+
+        ids = np.array([int(record["id"]) for record in records], dtype=np.int64)
+        offsets = np.full((len(records), len(fields), 2), -1, dtype=np.int64)
+        position = 0
+        with open(path / "text.bin", "wb") as text_file:
+            for row, record in enumerate(records):
+                for i, name in enumerate(fields):
+                    value = record.get(name)
+                    if value is None:
+                        continue
+                    encoded = str(value).encode("utf-8")
+                    text_file.write(encoded)
+                    offsets[row, i] = (position, position + len(encoded))
+                    position += len(encoded)
+        np.save(path / "ids.npy", ids)
+        np.save(path / "offsets.npy", offsets)
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "count": len(records),
+            "index": params,
+            "arrays": sorted(arrays),
+            "fields": fields,
+            "text_bytes": position,
+            "created_at": time.time(),
+        }
+        (path / "manifest.json").write_text(json.dumps(manifest))
+
+    @staticmethod
+    def _readable(path: Path) -> bool:
+        try:
+            _read_manifest(path)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _cleanup(self, current: str) -> None:
+        """Entfernt alte Versionen (bereits gemappte Dateien bleiben unter Linux gültig)"""
+        versions = sorted(
+            (p for p in self.directory.glob("v-*") if p.name != f"v-{current}"),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+        for old in versions[KEEP_VERSIONS - 1:]:
+            shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,56 @@
+"""
+Startup Warm-up
+Baut Verbindungen und Caches vor dem ersten Request auf.
+Bis der Warm-up fertig ist, meldet /health "not ready" (503).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable
+
+from .logger import api_logger
+
+
+class WarmupState:
+    """Readiness-Status des Servers"""
+
+    def __init__(self):
+        self.ready = False
+        self.duration_ms: int | None = None
+        self.steps: dict[str, dict] = {}
+        self.task: asyncio.Task | None = None
+
+    def mark_ready(self):
+        self.ready = True
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "duration_ms": self.duration_ms,
+            "steps": self.steps,
+        }
+
+
+async def run_warmup(steps: list[tuple[str, Callable[[], Any]]], state: WarmupState) -> None:
+    """
+    Führt die Warm-up Schritte nacheinander in einem Worker-Thread aus.
+    Fehlgeschlagene Schritte werden geloggt, blockieren die Readiness aber nicht -
+    der Request-Pfad funktioniert auch kalt.
+    """
+    start = time.perf_counter()
+    for name, func in steps:
+        step_start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(func)
+            state.steps[name] = {
+                "duration_ms": int((time.perf_counter() - step_start) * 1000),
+                **(result if isinstance(result, dict) else {}),
+            }
+        except Exception as e:
+            api_logger.warning("Warm-up step '%s' failed: %s", name, e)
+            state.steps[name] = {"error": str(e)}
+
+    state.duration_ms = int((time.perf_counter() - start) * 1000)
+    state.mark_ready()
+    api_logger.info("Warm-up finished in %d ms - Server ready", state.duration_ms)